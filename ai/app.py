@@ -9,10 +9,12 @@ import threading
 import pandas as pd
 import datetime
 import time
+from typing import Optional
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, HTMLResponse
-from main import fetch_tokens_data, run_anomaly_detection, generate_main_scatter_payload, detect_rule_based_anomalies, _anomaly_type_bar, _token_vs_aadhaar_scatter, _data_url, interpret_graph
+import main
+from main import fetch_tokens_data, run_anomaly_detection, generate_main_scatter_payload, detect_rule_based_anomalies, render_reasons, _anomaly_type_bar, _token_vs_aadhaar_scatter, _data_url, interpret_graph
 
 # Create a new FastAPI app that will be exposed through Gradio
 api_app = FastAPI(title="Blockchain Ration Anomaly API")
@@ -26,10 +28,17 @@ api_app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global storage for caching
+# Global storage for caching (falls back to main's cache: warm start / background startup task)
 latest_df = None
 latest_results = None
 
+def _cached():
+    """Return the app cache, adopting main's results once they exist"""
+    global latest_df, latest_results
+    if latest_df is None and main.latest_df is not None:
+        latest_df, latest_results = main.latest_df, main.latest_results
+    return latest_df, latest_results
+
 def update_cache():
     """Update the global cache with latest data"""
     global latest_df, latest_results
@@ -43,6 +52,7 @@ def update_cache():
 def get_graph():
     """Main anomaly scatter plot"""
     global latest_df
+    _cached()
     if latest_df is None:
         df, _ = update_cache()
     else:
@@ -51,20 +61,26 @@ def get_graph():
     return payload
 
 @api_app.get("/anomalies")
-def get_anomalies(limit: int = 10):
-    """Detailed anomaly list"""
+def get_anomalies(limit: int = 10, min_score: Optional[float] = None, show_full_aadhaar: bool = False):
+    """Detailed anomaly list + highest ML scores (see main.anomalies)"""
     df, result = update_cache()
-    return {
+    body = {
         "total_records": len(df),
         "ml_anomalies": result["ml_detected"],
+        "ml_threshold": result.get("ml_threshold"),
         "rule_based_anomalies": result["rule_detected"],
-        "anomaly_details": result["details"][:limit],
+        "anomaly_details": render_reasons(result["details"][:limit]),
+        "top_ml_tokens": main._ranked_tokens(df, limit, min_score, show_full_aadhaar),
     }
+    if min_score is not None and not df.empty:
+        body["ml_tokens_above_min_score"] = main.score_index.count_above(min_score)
+    return body
 
 @api_app.get("/graphs/patterns")
 def get_patterns(show_full_aadhaar: bool = False):
     """Pattern analysis charts"""
     global latest_df
+    _cached()
     if latest_df is None:
         df, _ = update_cache()
     else:
@@ -80,10 +96,29 @@ def get_patterns(show_full_aadhaar: bool = False):
         "anomaly_type_counts": counts,
     }
 
+@api_app.get("/health")
+def get_health():
+    """Startup readiness (see main.health)"""
+    return main.health()
+
+@api_app.get("/rules")
+def get_rules():
+    """Rule registry and per-rule cost of the last evaluation (see main.rules)"""
+    return main.rules()
+
+@api_app.get("/aadhaar/{aadhaar_id}")
+def get_aadhaar(aadhaar_id: str):
+    """Single-beneficiary drill-down (no global refresh)"""
+    global latest_df
+    result = main.get_aadhaar(aadhaar_id)
+    latest_df = main.latest_df
+    return result
+
 @api_app.get("/latest")
 def get_latest():
     """Latest analysis results"""
     global latest_df, latest_results
+    _cached()
     if latest_results is None or latest_df is None:
         df, results = update_cache()
     else:
@@ -92,6 +127,7 @@ def get_latest():
     interp = interpret_graph(df)
     return {
         **results,
+        "reason_codes": main.rule_engine.legend(),
         "graph_interpretation": {
             "insights": interp["insights"],
             "stats": interp["stats"],
@@ -131,7 +167,7 @@ def get_anomaly_analysis():
         
         # Format anomaly details
         anomaly_details = []
-        for anomaly in rule_anomalies[:10]:  # Show top 10
+        for anomaly in render_reasons(rule_anomalies[:10]):  # Show top 10
             details = f"**Token {anomaly['tokenId']}** (Aadhaar: {anomaly['aadhaar']})\n"
             details += f"Issued: {anomaly['issuedAt']}\n"
             if anomaly['claimAt']:
@@ -409,7 +445,7 @@ def get_anomaly_analysis():
         
         # Format anomaly details
         anomaly_details = []
-        for anomaly in rule_anomalies[:10]:  # Show top 10
+        for anomaly in render_reasons(rule_anomalies[:10]):  # Show top 10
             details = f"**Token {anomaly['tokenId']}** (Aadhaar: {anomaly['aadhaar']})\n"
             details += f"Issued: {anomaly['issuedAt']}\n"
             if anomaly['claimAt']:
@@ -0,0 +1,733 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the anomaly detection pipeline.
+
+    python benchmark.py ingest --rpc-url http://127.0.0.1:8545 --contract 0x...
+    python benchmark.py ingest --replay fixture.json --latency-ms 40 --error-rate 0.02
+    python benchmark.py ingest --synth 5000 --latency-ms 40
+    python benchmark.py rules --sizes 100000 1000000
+    python benchmark.py rules-incremental --sizes 100000 1000000 --mints 100
+    python benchmark.py schema --sizes 1000000
+    python benchmark.py features --sizes 100000 1000000
+    python benchmark.py index --sizes 100000 1000000
+    python benchmark.py linkage --sizes 100000 1000000
+    python benchmark.py rules-sharded --sizes 1000000 --workers 1 2 4 8
+    python benchmark.py model-cache --sizes 100000 1000000
+    python benchmark.py model-lifecycle --sizes 100000 1000000 --mints 100
+    python benchmark.py streaming --sizes 100000 1000000 --stream 2000
+    python benchmark.py ensemble --sizes 1000000 --workers 1 2 4 --n-jobs 1
+    python benchmark.py scores --sizes 100000 1000000
+
+`ingest` times the per-token getTokenData loop against the batched and async modes in
+ingestion.py on the same token ids, and checks that every mode returns the same data.
+Point it at a local stand-in node (e.g. `anvil` with DCVToken deployed and minted via
+the forge scripts in ../blockchain), or replay a recorded / synthetic fixture with
+injected latency and faults (see rpc_replay.py), so the numbers are not dominated by
+remote quota.
+
+`rules` checks that the columnar rule engine (rules.py) returns exactly what the original
+row loop returned on synthetic frames (incl. None/empty fields and duplicate token ids),
+and the sliding-window rules against their per-key loop (windows.py), then times the full
+default rule set at the given sizes.
+
+`schema` reports bytes per token of the loose object-dtype frame against the compact
+schema (schema.py) and checks that rules and model features see the same values.
+
+`features` checks featurize_raw (getTokenData tuples -> features, vectorized) and a
+FeatureCache refresh against the original per-row conversion, timing both.
+
+`index` compares secondary-index lookups (token_index.py) with the boolean masks they
+replace, per key column, and times the index build and an append-only refresh.
+
+`linkage` checks the identity clusters (linkage.py) against a plain union-find over the
+same graph, then times them and scores them against planted identity rings.
+
+`rules-sharded` checks the process-pool evaluation over Aadhaar-hash shards
+(sharded_rules.py) against the single-process engine, then times it for each worker count
+(scaling from 1 to N cores; the in-process run is the baseline).
+
+`model-cache` checks that the cached IForest labels (model_cache.py) equal a fresh fit +
+predict, then times `--calls` scorings of the same table (one dashboard load hitting
+/anomalies, /graph and /graphs/patterns) uncached against cached, and a changed table.
+
+`model-lifecycle` fits the frozen detector (model_lifecycle.py) on its rolling window,
+round-trips it through a token store, and times a refresh with `--mints` new tokens
+(only those are scored) against the old refit-and-predict of the whole table; it checks
+labels against the frozen model's predict() and that old tokens keep their verdicts.
+
+`streaming` seeds the half-space trees (streaming.py) on a table and scores `--stream`
+arriving tokens one at a time and as one batch (same scores), reporting per-token latency
+at each table size (it should not grow with it), memory, and agreement with the batch
+IForest verdicts on the same tokens.
+
+`ensemble` runs the PyOD detector ensemble (ensemble.py) with 1..N pool processes and
+scores every detector and the combined score against the planted anomalies the model
+features can see (ROC AUC), per CPU second, to pick detectors for the hardware.
+
+`scores` checks ScoreIndex (score_index.py) top-K and score-threshold lookups against
+sorting / filtering the frame, and times both per query plus the per-refresh build.
+
+`rules-incremental` replays refreshes (new mints, claims, burns and edits) through
+incremental_rules.IncrementalRuleEvaluator and checks each result against a full
+evaluation of the same frame, timing both.
+"""
+import argparse
+import json
+import sys
+import time
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - start
+
+
+def bench_ingest(args) -> int:
+    from web3 import Web3
+    from ingestion import (_fetch_sequential, fetch_token_data_async, fetch_token_data_multicall,
+                           fetch_token_data_rpc_batch)
+    from rpc_pool import PooledHTTPProvider, RPCPool
+    from rpc_replay import MULTICALL3_ADDRESS, ReplayNode, load_fixture, synthetic_fixture
+
+    with open("DCVToken.json") as f:
+        token_abi = json.load(f)
+
+    node = None
+    if args.replay or args.synth:
+        fixture = load_fixture(args.replay) if args.replay else synthetic_fixture(args.synth)
+        node = ReplayNode(fixture, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                          error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, seed=0).start()
+        args.rpc_url, args.contract = node.url, fixture["contract"]
+        args.multicall = args.multicall or MULTICALL3_ADDRESS
+        print(f"🔁 Replay node on {node.url}: latency {args.latency_ms}+{args.jitter_ms}ms, "
+              f"{args.error_rate:.0%} HTTP 500, {args.rate_limit_rate:.0%} HTTP 429")
+    elif not args.contract:
+        print("❌ --contract is required unless --replay/--synth is used")
+        return 2
+
+    # the service's RPC client: pooled keep-alive session, retries on injected 429/5xx
+    w3 = Web3(PooledHTTPProvider(RPCPool([args.rpc_url], backoff=0.05)))
+    contract = w3.eth.contract(address=Web3.to_checksum_address(args.contract), abi=token_abi)
+    token_ids = contract.functions.getAllTokens().call()
+    if args.limit:
+        token_ids = token_ids[:args.limit]
+    block = w3.eth.block_number  # pin one block so every mode reads the same state
+    print(f"🔍 Benchmarking ingestion of {len(token_ids)} tokens at block {block}")
+
+    modes = {
+        "sequential": lambda: _fetch_sequential(contract, token_ids, block),
+        "rpc_batch": lambda: fetch_token_data_rpc_batch(
+            args.rpc_url, w3, contract, token_ids, args.chunk_size, block_identifier=block),
+        "async": lambda: fetch_token_data_async(
+            args.rpc_url, contract, token_ids, args.concurrency, block_identifier=block),
+    }
+    if args.multicall:
+        modes["multicall"] = lambda: fetch_token_data_multicall(
+            w3, contract, token_ids, args.chunk_size, args.multicall, block_identifier=block)
+
+    baseline = None
+    ok = True
+    for name, run in modes.items():
+        rows, secs = _timed(run)
+        rate = len(rows) / secs if secs else float("inf")
+        if baseline is None:
+            baseline, base_secs = rows, secs
+        same = rows == baseline
+        ok &= same
+        print(f"{'✅' if same else '❌'} {name:<12} {secs:8.3f}s  {rate:10.1f} tokens/s  "
+              f"x{base_secs / secs if secs else float('inf'):.1f} vs sequential")
+    if node is not None:
+        print(f"📊 Replay node: {node.stats}")
+        node.stop()
+    return 0 if ok else 1
+
+
+def _rule_parity_frames(n: int, seed: int):
+    """
+    Synthetic frames that exercise every rule, plus a copy with missing fields, missing claim
+    times and duplicate ids (tests/test_rules_parity.py runs the same checks on small frames).
+    Loose object dtypes (as the row loop saw them); bench_rules also runs the compact schema.
+    """
+    import numpy as np
+    import pandas as pd
+    from features import engineer_features
+    from synthetic import generate_tokens
+
+    rates = [{}, {"issuer_concentration": 0.95}, {"odd_hour": 0.3, "spike_days": 0.2, "instant_claim": 0.1}]
+    df = generate_tokens(n, seed=seed, anomaly_rates=rates[seed % len(rates)], tokens_per_aadhaar=1.5,
+                         featurize=False)
+    df = engineer_features(df, compact=False)
+    yield "clean", df
+
+    rng = np.random.default_rng(seed)
+    edge = df.copy()
+    for col in ["familyId", "location", "issuedBy", "category"]:
+        edge.loc[rng.choice(n, n // 20, replace=False), col] = None
+        edge.loc[rng.choice(n, n // 50, replace=False), col] = ""
+    edge.loc[rng.choice(n, n // 20, replace=False), "claimTime"] = pd.NaT
+    yield "edge", pd.concat([edge, edge.sample(n // 30, random_state=seed)], ignore_index=True)
+
+
+def _texts(anomalies):
+    """Rendered anomalies in the row loop's shape (reason text instead of codes / params)."""
+    from rules import render_reasons
+
+    keep = ("tokenId", "aadhaar", "issuedAt", "claimAt", "reasons")
+    return [{k: a[k] for k in keep} for a in render_reasons(anomalies)]
+
+
+def bench_rules(args) -> int:
+    from rules import (DEFAULT_RULES, LEGACY_RULES, RuleEngine, WindowRule, _detect_rule_based_anomalies_loop,
+                       detect_rule_based_anomalies, engine)
+    from schema import compact_tokens
+    from synthetic import generate_tokens
+    from token_index import TokenIndex
+    from windows import _window_peaks_loop, epoch_seconds, key_codes
+
+    legacy = RuleEngine([r for r in DEFAULT_RULES if r.name in LEGACY_RULES])  # what the row loop implements
+    ok = True
+    for seed, n in enumerate(args.parity_sizes):
+        for label, df in _rule_parity_frames(n, seed):
+            ref, loop_secs = _timed(_detect_rule_based_anomalies_loop, df)
+            out, secs = _timed(legacy.evaluate, df)
+            subset = df["tokenId"].sample(min(25, len(df)), random_state=seed).tolist()
+            compact = compact_tokens(df.copy())
+            same = _texts(out) == ref and (_texts(legacy.evaluate(df, subset)) ==
+                                           _detect_rule_based_anomalies_loop(df, subset))
+            same &= _texts(legacy.evaluate(compact)) == ref
+            same &= legacy.evaluate(compact, index=TokenIndex().refresh(compact)) == legacy.evaluate(compact)
+            # window rules against their per-key loop definition
+            for rule in (r for r in DEFAULT_RULES if isinstance(r, WindowRule)):
+                loop = _window_peaks_loop(key_codes(compact[rule.key]), epoch_seconds(compact[rule.time_column]),
+                                          rule.window, rule.min_count, rule.factor)
+                same &= bool((rule.peaks(compact) == loop).all())
+            ok &= same
+            print(f"{'✅' if same else '❌'} parity {label:<5} n={len(df):<7,} {len(ref):6,} flagged  "
+                  f"loop {loop_secs:7.2f}s  columnar {secs:6.3f}s  x{loop_secs / secs:,.0f}")
+
+    for n in args.sizes:
+        df = generate_tokens(n, seed=0)
+        out, secs = _timed(detect_rule_based_anomalies, df)
+        index, index_secs = _timed(TokenIndex().refresh, df)
+        indexed, indexed_secs = _timed(engine.evaluate, df, index=index)
+        same = indexed == out
+        ok &= same
+        print(f"⚡ columnar n={n:<10,} {secs:7.2f}s  {n / secs:12,.0f} tokens/s  {len(out):,} flagged  |  "
+              f"{'✅' if same else '❌'} with index {indexed_secs:.2f}s (+ build {index_secs:.2f}s)")
+        stats = engine.last_stats
+        for name, agg in sorted(stats["aggregates"].items(), key=lambda kv: -kv[1]["ms"]):
+            print(f"     aggregate {name:<22} {agg['ms']:9.1f} ms  {agg['bytes'] / 2**20:8.1f} MiB")
+        for name, rule in sorted(stats["rules"].items(), key=lambda kv: -kv[1].get("ms", 0)):
+            print(f"     rule      {name:<22} {rule.get('ms', 0):9.1f} ms  {rule.get('bytes', 0) / 2**20:8.1f} MiB  "
+                  f"{rule.get('hits', 0):10,} hits")
+    return 0 if ok else 1
+
+
+def _refreshes(n: int, mints: int, claims: int, seed: int):
+    """A base frame, then refreshes as the chain would produce them: new mints, claims, burns / edits."""
+    import numpy as np
+    import pandas as pd
+    from schema import compact_tokens
+    from synthetic import generate_tokens
+
+    rng = np.random.default_rng(seed)
+    full = generate_tokens(n + 2 * mints, seed=seed, tokens_per_aadhaar=1.5, anomaly_rates={"identity_ring": 0.002})
+    df = full.iloc[:n].reset_index(drop=True)
+    yield "base", df
+
+    df = full.iloc[:n + mints].reset_index(drop=True)
+    yield f"+{mints} mints", df
+
+    df = df.copy()
+    pick = rng.choice(np.flatnonzero(~df["isClaimed"].to_numpy()), min(claims, int((~df["isClaimed"]).sum())),
+                      replace=False)
+    df.loc[pick, "isClaimed"] = True
+    df.loc[pick, "claimTime"] = df.loc[pick, "issuedTime"] + pd.to_timedelta(rng.integers(1, 7200, len(pick)), "s")
+    df.loc[pick, "claimDelay"] = (df.loc[pick, "claimTime"] - df.loc[pick, "issuedTime"]).dt.total_seconds()
+    yield f"{len(pick)} claims", df
+
+    df = pd.concat([df.drop(index=rng.choice(len(df), mints // 2, replace=False)),
+                    full.iloc[n + mints:]], ignore_index=True)
+    df = df.astype({"category": object, "location": object, "rationAmount": np.int64})
+    df.loc[rng.choice(len(df), 5, replace=False), "category"] = "UNKNOWN"
+    df.loc[rng.choice(len(df), 5, replace=False), "location"] = None
+    df.loc[rng.choice(len(df), 5, replace=False), "rationAmount"] = 400  # moves the average
+    yield f"-{mints // 2} burns, +{mints} mints, edits", compact_tokens(df)
+
+
+def bench_rules_incremental(args) -> int:
+    from incremental_rules import IncrementalRuleEvaluator
+    from rules import DEFAULT_RULES, RuleEngine
+    from token_index import TokenIndex
+
+    ok = True
+    for n in args.sizes:
+        full_engine = RuleEngine(DEFAULT_RULES)
+        evaluator = IncrementalRuleEvaluator(RuleEngine(DEFAULT_RULES))
+        index = TokenIndex()
+        for label, df in _refreshes(n, args.mints, args.claims, seed=n % 97):
+            ref, full_secs = _timed(full_engine.evaluate, df)
+            out, secs = _timed(lambda: evaluator.evaluate(df, index=index.refresh(df)))  # as main.py: index per refresh
+            same = out == ref
+            ok &= same
+            stats = evaluator.last_stats
+            print(f"{'✅' if same else '❌'} n={len(df):<10,} {label:<34} full {full_secs:7.3f}s  "
+                  f"{stats['mode']:<11} {secs:7.3f}s  x{full_secs / secs:6.1f}  "
+                  f"rescored {stats['rescored']:,}  {len(ref):,} flagged")
+    return 0 if ok else 1
+
+
+def bench_schema(args) -> int:
+    import numpy as np
+    from features import engineer_features
+    from rules import detect_rule_based_anomalies
+    from schema import memory_report
+    from synthetic import generate_tokens
+
+    ok = True
+    model_columns = ["rationAmount", "claimDelay", "oddHour", "expiredUsage"]
+    for n in args.sizes:
+        raw = generate_tokens(n, seed=0, featurize=False)
+        loose = engineer_features(raw.copy(), compact=False)
+        compact, secs = _timed(engineer_features, raw.copy())
+        before, after = memory_report(loose), memory_report(compact)
+        same = (_texts(detect_rule_based_anomalies(compact)) == _texts(detect_rule_based_anomalies(loose))
+                and np.array_equal(compact[model_columns].values, loose[model_columns].values))
+        ok &= same
+        print(f"{'✅' if same else '❌'} n={n:<10,} {before['bytes_per_token']:7.1f} -> {after['bytes_per_token']:6.1f} "
+              f"bytes/token  x{before['bytes'] / after['bytes']:4.1f}  (features + compact {secs:.2f}s)")
+        for col, info in after["columns"].items():
+            was = before["columns"][col]
+            print(f"     {col:<14} {was['dtype']:>16} {was['bytes'] / n:7.1f}  ->  {info['dtype']:>14} {info['bytes'] / n:6.1f}")
+    return 0 if ok else 1
+
+
+def bench_index(args) -> int:
+    import numpy as np
+    from synthetic import generate_tokens
+    from token_index import TokenIndex
+
+    ok = True
+    for n in args.sizes:
+        full = generate_tokens(n + args.mints, seed=0)
+        df = full.iloc[:n].reset_index(drop=True)
+        index, build_secs = _timed(TokenIndex().refresh, df)
+        _, append_secs = _timed(index.refresh, full)
+        mode = index.last_stats["mode"]
+        day = full["issuedTime"].dt.normalize()
+        rng = np.random.default_rng(n)
+        for column, values in (("aadhaar", full["aadhaar"]), ("familyId", full["familyId"]),
+                               ("location", full["location"]), ("issuedBy", full["issuedBy"]), ("issueDay", day)):
+            keys = values.dropna().iloc[rng.integers(0, len(full), args.lookups)].tolist()
+            rows, lookup_secs = _timed(lambda: [index.rows(column, k) for k in keys])
+            masks, mask_secs = _timed(lambda: [np.flatnonzero((values == k).to_numpy()) for k in keys])
+            same = all(np.array_equal(np.sort(r), m) for r, m in zip(rows, masks))
+            ok &= same
+            print(f"{'✅' if same else '❌'} n={len(full):<10,} {column:<9} index {lookup_secs / len(keys) * 1e6:9.1f} µs  "
+                  f"mask {mask_secs / len(keys) * 1e3:8.2f} ms  per lookup")
+        print(f"     build {build_secs * 1e3:.0f} ms, refresh with +{args.mints} mints ({mode}) {append_secs * 1e3:.0f} ms")
+    return 0 if ok else 1
+
+
+def bench_rules_sharded(args) -> int:
+    import os
+    from rules import DEFAULT_RULES, RuleEngine
+    from sharded_rules import ShardedRuleEvaluator
+    from synthetic import generate_tokens
+
+    ok = True
+    engine = RuleEngine(DEFAULT_RULES)
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    workers = sorted(set(args.workers or [1, 2, 4, cores]))
+    print(f"🖥  {cores} cores available, workers {workers}")
+    evaluators = {w: ShardedRuleEvaluator(engine, w, min_rows=0).start() for w in workers}
+    try:
+        for seed, n in enumerate(args.parity_sizes):
+            for label, df in _rule_parity_frames(n, seed):
+                ref = engine.evaluate(df)
+                same = all(ev.evaluate(df) == ref for ev in evaluators.values())
+                ok &= same
+                print(f"{'✅' if same else '❌'} parity {label:<5} n={len(df):<7,} {len(ref):6,} flagged")
+        for n in args.sizes:
+            df = generate_tokens(n, seed=0, anomaly_rates={"identity_ring": 0.003})
+            ref, base_secs = _timed(engine.evaluate, df)
+            print(f"⚡ n={n:<10,} in-process {base_secs:7.2f}s")
+            for w, ev in evaluators.items():
+                out, secs = _timed(ev.evaluate, df)
+                same = out == ref
+                ok &= same
+                stats = ev.last_stats
+                detail = "" if stats["mode"] != "sharded" else (
+                    f"  shards {max(stats['shard_ms']) / 1000:5.2f}s (slowest)  global {stats['global_ms'] / 1000:5.2f}s  "
+                    f"reduce {stats['reduce_ms'] / 1000:5.2f}s  share {stats['share_ms'] / 1000:5.2f}s")
+                print(f"{'✅' if same else '❌'}   workers {w:<3} {secs:7.2f}s  x{base_secs / secs:5.2f}{detail}")
+    finally:
+        for ev in evaluators.values():
+            ev.shutdown()
+    return 0 if ok else 1
+
+
+def bench_linkage(args) -> int:
+    import numpy as np
+    import pandas as pd
+    from linkage import _link_identities_unionfind, link_identities
+    from synthetic import generate_tokens
+    from token_index import TokenIndex
+
+    ok = True
+    rates = {"identity_ring": args.ring_rate}
+    for seed, n in enumerate(args.parity_sizes):
+        df = generate_tokens(n, seed=seed, anomaly_rates=rates)
+        edge = df.astype({c: object for c in ("familyId", "location", "issuedBy")})
+        rng = np.random.default_rng(seed)
+        for col in ("familyId", "location", "issuedBy"):
+            edge.loc[rng.choice(n, n // 20, replace=False), col] = None
+        for label, frame in (("clean", df), ("edge", edge)):
+            ref, loop_secs = _timed(_link_identities_unionfind, frame)
+            linkage, secs = _timed(link_identities, frame)
+            clusters = linkage.rows["cluster"].tolist()
+            same = dict(zip(frame["tokenId"].tolist(), (c if c >= 0 else None for c in clusters))) == ref
+            ok &= same
+            print(f"{'✅' if same else '❌'} parity {label:<5} n={n:<8,} {len(linkage.clusters):4} clusters  "
+                  f"union-find {loop_secs:6.2f}s  columnar {secs:6.3f}s  x{loop_secs / secs:,.0f}")
+
+    for n in args.sizes:
+        df, labels = generate_tokens(n, seed=0, anomaly_rates=rates, return_labels=True)
+        linkage, secs = _timed(link_identities, df)
+        index = TokenIndex().refresh(df)
+        indexed, indexed_secs = _timed(link_identities, df, index=index)
+        same = indexed.rows.equals(linkage.rows)
+        ok &= same
+        flagged, planted = linkage.rows["cluster"].to_numpy() >= 0, labels["identity_ring"].to_numpy()
+        clean = generate_tokens(n, seed=0, anomaly_rates={"identity_ring": 0.0})
+        false_clusters = len(link_identities(clean).clusters)
+        print(f"⚡ linkage n={n:<10,} {secs:6.3f}s  {'✅' if same else '❌'} with index {indexed_secs:6.3f}s  "
+              f"{len(linkage.clusters):,} clusters  recall {(flagged & planted).sum() / max(1, planted.sum()):.3f}  "
+              f"precision {(flagged & planted).sum() / max(1, flagged.sum()):.3f}  "
+              f"(no rings planted: {false_clusters} clusters)")
+        print(f"     {linkage.stats}")
+    return 0 if ok else 1
+
+
+def _raw_tuples(df):
+    """getTokenData-shaped tuples (epoch-second ints) from a synthetic token frame."""
+    import numpy as np
+
+    def epoch(col):
+        return (df[col].to_numpy().astype("datetime64[s]").astype(np.int64)).tolist()
+
+    claim = np.where(df["isClaimed"].to_numpy(), np.array(epoch("claimTime"), dtype=object), 0).tolist()
+    return list(zip(
+        df["tokenId"].tolist(), [int(a) for a in df["aadhaar"].tolist()], ["0x" + "00" * 20] * len(df),
+        df["rationAmount"].tolist(), epoch("issuedTime"), epoch("expiryTime"), claim,
+        df["isClaimed"].tolist(), df["isExpired"].tolist(), df["category"].tolist(),
+        df["familyId"].tolist(), df["location"].tolist(), df["issuedBy"].tolist(),
+    ))
+
+
+def bench_features(args) -> int:
+    import pandas as pd
+    from features import FeatureCache, _records_frame_loop, featurize_raw
+    from synthetic import generate_tokens
+
+    ok = True
+    for n in args.sizes:
+        raw = _raw_tuples(generate_tokens(n + args.changes, seed=0, featurize=False))
+        base, extra = raw[:n], raw[n:]
+        ref, loop_secs = _timed(_records_frame_loop, base)
+        out, secs = _timed(featurize_raw, base)
+        same = _frames_equal(out, ref)
+
+        cache = FeatureCache()
+        cache.frame(base)
+        # a refresh: `changes` new mints plus as many claims of previously unclaimed tokens
+        claimed = [i for i, r in enumerate(base) if not r[7]][:args.changes]
+        refreshed = list(base)
+        for i in claimed:
+            r = refreshed[i]
+            refreshed[i] = r[:6] + (r[4] + 3600, True) + r[8:]
+        refreshed += extra
+        cached, cache_secs = _timed(cache.frame, refreshed)
+        same &= _frames_equal(cached, featurize_raw(refreshed))
+        ok &= same
+        print(f"{'✅' if same else '❌'} n={n:<10,} per-row {loop_secs:6.2f}s  vectorized {secs:6.2f}s  "
+              f"x{loop_secs / secs:5.1f}  |  refresh (+{len(extra)} mints, {len(claimed)} claims) "
+              f"cached {cache_secs:6.2f}s, featurized {cache.last_stats['featurized']:,}")
+    return 0 if ok else 1
+
+
+def _frames_equal(a, b) -> bool:
+    import pandas as pd
+    try:
+        pd.testing.assert_frame_equal(a, b, check_categorical=False)
+        return True
+    except AssertionError as e:
+        print(f"     {str(e).splitlines()[0]}")
+        return False
+
+
+def bench_model_cache(args) -> int:
+    import numpy as np
+    from pyod.models.iforest import IForest
+    from model_cache import MODEL_CONFIG, ModelCache, feature_matrix
+    from synthetic import generate_tokens
+
+    def uncached(features):
+        model = IForest(**MODEL_CONFIG)
+        model.fit(features)
+        return model.predict(features)
+
+    ok = True
+    for n in args.sizes:
+        df = generate_tokens(n, seed=0)
+        features = feature_matrix(df)
+        cache = ModelCache()
+        ref, ref_secs = _timed(lambda: [uncached(features) for _ in range(args.calls)])
+        got, cached_secs = _timed(lambda: [cache.fit_predict(feature_matrix(df))[1] for _ in range(args.calls)])
+        same = all(np.array_equal(r, g) for r, g in zip(ref, got))
+        changed = df.copy()
+        changed.loc[0, "rationAmount"] = changed["rationAmount"].max()
+        _, miss_secs = _timed(cache.fit_predict, feature_matrix(changed))
+        stats = cache.stats()
+        ok &= same and stats["misses"] == 2
+        print(f"{'✅' if same else '❌'} n={n:<10,} {args.calls} calls: fit+predict {ref_secs:6.2f}s  cached {cached_secs:6.2f}s  "
+              f"x{ref_secs / cached_secs:5.1f}   changed table {miss_secs:5.2f}s  "
+              f"(hits {stats['hits']}, misses {stats['misses']})")
+    return 0 if ok else 1
+
+
+def bench_model_lifecycle(args) -> int:
+    import os
+    import tempfile
+    import numpy as np
+    from pyod.models.iforest import IForest
+    from model_cache import MODEL_CONFIG, ModelCache, feature_matrix
+    from model_lifecycle import ModelLifecycle
+    from synthetic import generate_tokens
+    from token_store import TokenStore
+
+    ok = True
+    for n in args.sizes:
+        full = generate_tokens(n + args.mints, seed=0)
+        df = full.iloc[:n].reset_index(drop=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            store = TokenStore(os.path.join(tmp, "store.sqlite"))
+            lifecycle = ModelLifecycle(ModelCache(), store)
+            artifact, fit_secs = _timed(lifecycle.fit, df)
+            (scores, labels), cold_secs = _timed(lifecycle.score, df)
+            (_, refreshed), refresh_secs = _timed(lifecycle.score, full)
+            reloaded = ModelLifecycle(ModelCache(), store)
+            loaded = reloaded.load() and np.array_equal(reloaded.score(full)[1], refreshed)
+
+        def refit():
+            model = IForest(**MODEL_CONFIG)
+            model.fit(feature_matrix(full))
+            return model.predict(feature_matrix(full))
+        _, refit_secs = _timed(refit)
+        same = (np.array_equal(labels, artifact.model.predict(feature_matrix(df)))
+                and np.array_equal(refreshed[:n], labels))
+        ok &= same and loaded
+        stats = lifecycle.last_score
+        print(f"{'✅' if same and loaded else '❌'} n={n:<10,} fit v{artifact.version} on {artifact.meta['window']['rows']:,} "
+              f"rows {fit_secs:5.2f}s   score all {cold_secs:5.2f}s ({cold_secs / n * 1e6:.1f} µs/token)   "
+              f"+{args.mints} mints: {refresh_secs * 1e3:7.1f} ms ({stats['scored']} scored, model "
+              f"{stats['model_ms']:.1f} ms)   vs refit+predict {refit_secs:5.2f}s   "
+              f"persisted {'ok' if loaded else 'MISMATCH'}")
+    return 0 if ok else 1
+
+
+def bench_streaming(args) -> int:
+    import numpy as np
+    from model_cache import ModelCache, feature_matrix
+    from model_lifecycle import ModelLifecycle
+    from streaming import OnlineScorer
+    from synthetic import generate_tokens
+
+    ok = True
+    for n in args.sizes:
+        full = generate_tokens(n + args.stream, seed=0)
+        x, tids = feature_matrix(full), full["tokenId"].to_numpy()
+        one, batch = OnlineScorer(), OnlineScorer()
+        _, seed_secs = _timed(one.seed, x[:n])
+        batch.seed(x[:n])
+        times, single = [], []
+        for i in range(n, n + args.stream):
+            (score, _), secs = _timed(one.score, tids[i:i + 1], x[i:i + 1])
+            single.append(score[0])
+            times.append(secs)
+        (scores, labels), batch_secs = _timed(batch.score, tids[n:], x[n:])
+        same = np.allclose(single, scores)
+        ok &= same
+        lifecycle = ModelLifecycle(ModelCache())
+        lifecycle.fit(full.iloc[:n])
+        _, batch_labels = lifecycle.score(full.iloc[n:])
+        p50, p99 = np.percentile(times, [50, 99]) * 1e6
+        print(f"{'✅' if same else '❌'} n={n:<10,} seed {seed_secs:5.2f}s   {args.stream} tokens one at a time: "
+              f"p50 {p50:6.0f} µs  p99 {p99:6.0f} µs   batch {batch_secs / args.stream * 1e6:5.1f} µs/token   "
+              f"memory {one.stats()['memory_bytes'] / 2 ** 20:.1f} MiB   flagged {labels.mean():.3f}  "
+              f"agrees with IForest {(labels == batch_labels).mean():.3f}")
+    return 0 if ok else 1
+
+
+MODEL_VISIBLE = ["odd_hour", "instant_claim", "expired_claim", "high_ration", "low_ration"]
+
+
+def bench_ensemble(args) -> int:
+    import os
+    from sklearn.metrics import roc_auc_score
+    from ensemble import DETECTORS, EnsembleRunner
+    from synthetic import generate_tokens
+
+    detectors = args.detectors or list(DETECTORS)
+    for n in args.sizes:
+        df, labels = generate_tokens(n, seed=0, return_labels=True)
+        planted = labels[MODEL_VISIBLE].any(axis=1).to_numpy()
+        walls = {}
+        result = None
+        for workers in args.workers or [1, 2, 4, os.cpu_count()]:
+            runner = EnsembleRunner(workers, args.n_jobs, args.sample)
+            runner.warm()
+            runner.start()
+            result, walls[workers] = _timed(runner.run, df, detectors)
+            runner.shutdown()
+        print(f"⚡ n={n:<10,} train {result.stats['train_rows']:,} rows, n_jobs={args.n_jobs}   wall: "
+              + "   ".join(f"{w} proc {secs:6.2f}s" for w, secs in walls.items()))
+        for name in detectors + ["ensemble"]:
+            auc = roc_auc_score(planted, result.scores[name])
+            st = result.stats["detectors"].get(name)
+            cpu = (sum(d["cpu_ms"] for d in result.stats["detectors"].values()) if st is None else st["cpu_ms"]) / 1000
+            timing = (f"fit {st['fit_ms'] / 1000:6.2f}s  score {st['score_ms'] / 1000:6.2f}s" if st
+                      else "(sum of detectors)          ")
+            print(f"     {name:<9} AUC {auc:.3f}  {timing}  cpu {cpu:6.2f}s  "
+                  f"(AUC - 0.5) / cpu-s {(auc - 0.5) / max(cpu, 1e-9):7.3f}")
+    return 0
+
+
+def bench_scores(args) -> int:
+    import numpy as np
+    from model_cache import ModelCache
+    from model_lifecycle import ModelLifecycle
+    from score_index import ScoreIndex
+    from synthetic import generate_tokens
+
+    ok = True
+    for n in args.sizes:
+        df = generate_tokens(n, seed=0)
+        lifecycle = ModelLifecycle(ModelCache())
+        df["ml_score"] = lifecycle.score(df)[0].astype(np.float32)
+        index, build_secs = _timed(ScoreIndex().refresh, df)
+        thresholds = np.quantile(df["ml_score"], [0.9, 0.99, 0.999])
+        for k in args.k:
+            top, top_secs = _timed(lambda: [index.top(k) for _ in range(args.queries)])
+            ref, ref_secs = _timed(lambda: [df["ml_score"].to_numpy().argsort(kind="stable")[::-1][:k]
+                                            for _ in range(args.queries)])
+            same = np.array_equal(df["ml_score"].to_numpy()[top[0]], df["ml_score"].to_numpy()[ref[0]])
+            ok &= same
+            print(f"{'✅' if same else '❌'} n={n:<10,} top {k:<6} index {top_secs / args.queries * 1e6:9.1f} µs   "
+                  f"sort {ref_secs / args.queries * 1e3:8.2f} ms   per query")
+        for t in thresholds:
+            hits, hit_secs = _timed(lambda: [index.above(t, args.k[0]) for _ in range(args.queries)])
+            mask, mask_secs = _timed(lambda: [df.loc[df["ml_score"] >= t, "ml_score"].nlargest(args.k[0])
+                                              for _ in range(args.queries)])
+            same = (index.count_above(t) == int((df["ml_score"] >= t).sum())
+                    and np.array_equal(df["ml_score"].to_numpy()[hits[0]], mask[0].to_numpy()))
+            ok &= same
+            print(f"{'✅' if same else '❌'} n={n:<10,} score >= {t:8.4f} ({index.count_above(t):,} tokens)  "
+                  f"index {hit_secs / args.queries * 1e6:9.1f} µs   filter {mask_secs / args.queries * 1e3:8.2f} ms")
+        print(f"     index build per refresh {build_secs * 1e3:.0f} ms")
+    return 0 if ok else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("ingest", help="per-token loop vs batched getTokenData ingestion")
+    p.add_argument("--rpc-url", default="http://127.0.0.1:8545")
+    p.add_argument("--contract", default="", help="DCVToken address on that node")
+    p.add_argument("--chunk-size", type=int, default=200)
+    p.add_argument("--concurrency", type=int, default=16, help="in-flight requests for async mode")
+    p.add_argument("--limit", type=int, default=0, help="only use the first N token ids")
+    p.add_argument("--multicall", default="", help="Multicall3 address (skip multicall mode if empty)")
+    p.add_argument("--replay", default="", help="serve this rpc_replay.py fixture locally instead of --rpc-url")
+    p.add_argument("--synth", type=int, default=0, help="replay a synthetic fixture with N tokens")
+    p.add_argument("--latency-ms", type=float, default=0, help="replay: added latency per HTTP request")
+    p.add_argument("--jitter-ms", type=float, default=0, help="replay: extra uniform random latency")
+    p.add_argument("--error-rate", type=float, default=0, help="replay: fraction of requests failing with HTTP 500")
+    p.add_argument("--rate-limit-rate", type=float, default=0, help="replay: fraction of requests failing with HTTP 429")
+    p.set_defaults(func=bench_ingest)
+
+    p = sub.add_parser("rules", help="columnar rule engine: parity with the row loop + timing")
+    p.add_argument("--parity-sizes", type=int, nargs="*", default=[300, 1500], help="row-loop parity checks (O(n²))")
+    p.add_argument("--sizes", type=int, nargs="*", default=[100_000, 1_000_000])
+    p.set_defaults(func=bench_rules)
+
+    p = sub.add_parser("rules-incremental", help="incremental rule re-scoring vs full evaluation per refresh")
+    p.add_argument("--sizes", type=int, nargs="*", default=[100_000, 1_000_000])
+    p.add_argument("--mints", type=int, default=100, help="new tokens per refresh")
+    p.add_argument("--claims", type=int, default=100, help="tokens claimed in the claim refresh")
+    p.set_defaults(func=bench_rules_incremental)
+
+    p = sub.add_parser("schema", help="token table memory: loose object dtypes vs the compact schema")
+    p.add_argument("--sizes", type=int, nargs="*", default=[1_000_000])
+    p.set_defaults(func=bench_schema)
+
+    p = sub.add_parser("index", help="secondary index lookups vs boolean masks, build and append cost")
+    p.add_argument("--sizes", type=int, nargs="*", default=[100_000, 1_000_000])
+    p.add_argument("--mints", type=int, default=100, help="tokens appended for the incremental refresh")
+    p.add_argument("--lookups", type=int, default=50, help="random keys looked up per column")
+    p.set_defaults(func=bench_index)
+
+    p = sub.add_parser("features", help="per-row token conversion vs vectorized featurize_raw + FeatureCache")
+    p.add_argument("--sizes", type=int, nargs="*", default=[100_000, 1_000_000])
+    p.add_argument("--changes", type=int, default=100, help="new mints and claims in the cached refresh")
+    p.set_defaults(func=bench_features)
+
+    p = sub.add_parser("rules-sharded", help="rule evaluation over Aadhaar-hash shards in a process pool, 1..N cores")
+    p.add_argument("--parity-sizes", type=int, nargs="*", default=[300, 1500])
+    p.add_argument("--sizes", type=int, nargs="*", default=[1_000_000])
+    p.add_argument("--workers", type=int, nargs="*", default=[], help="process counts (default 1 2 4 and all cores)")
+    p.set_defaults(func=bench_rules_sharded)
+
+    p = sub.add_parser("linkage", help="identity-linkage clusters: parity with union-find, timing, planted rings")
+    p.add_argument("--parity-sizes", type=int, nargs="*", default=[2000, 20000], help="union-find parity checks")
+    p.add_argument("--sizes", type=int, nargs="*", default=[100_000, 1_000_000])
+    p.add_argument("--ring-rate", type=float, default=0.003, help="share of tokens whose owner joins a ring")
+    p.set_defaults(func=bench_linkage)
+
+    p = sub.add_parser("model-cache", help="IForest fit + predict per call vs the fingerprinted model cache")
+    p.add_argument("--sizes", type=int, nargs="*", default=[100_000, 1_000_000])
+    p.add_argument("--calls", type=int, default=3, help="scorings of the same table (one dashboard load)")
+    p.set_defaults(func=bench_model_cache)
+
+    p = sub.add_parser("model-lifecycle", help="frozen rolling-window detector: per-refresh scoring vs full refit")
+    p.add_argument("--sizes", type=int, nargs="*", default=[100_000, 1_000_000])
+    p.add_argument("--mints", type=int, default=100, help="new tokens in the refresh")
+    p.set_defaults(func=bench_model_lifecycle)
+
+    p = sub.add_parser("streaming", help="online half-space-tree scoring: per-token latency, memory, agreement")
+    p.add_argument("--sizes", type=int, nargs="*", default=[100_000, 1_000_000])
+    p.add_argument("--stream", type=int, default=2000, help="tokens arriving after the seed table")
+    p.set_defaults(func=bench_streaming)
+
+    p = sub.add_parser("ensemble", help="PyOD detector ensemble: AUC on planted anomalies per detector per CPU second")
+    p.add_argument("--sizes", type=int, nargs="*", default=[100_000, 1_000_000])
+    p.add_argument("--workers", type=int, nargs="*", default=[], help="process counts (default 1 2 4 and all cores)")
+    p.add_argument("--n-jobs", type=int, default=1, help="n_jobs per detector")
+    p.add_argument("--sample", type=int, default=20_000, help="training rows per detector")
+    p.add_argument("--detectors", nargs="*", default=[], help="subset of iforest hbos copod ecod lof")
+    p.set_defaults(func=bench_ensemble)
+
+    p = sub.add_parser("scores", help="top-K / score-threshold lookups: ScoreIndex vs sorting the frame")
+    p.add_argument("--sizes", type=int, nargs="*", default=[100_000, 1_000_000])
+    p.add_argument("--k", type=int, nargs="*", default=[10, 100, 1000])
+    p.add_argument("--queries", type=int, default=20)
+    p.set_defaults(func=bench_scores)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,3 +4,56 @@ import os
 RPC_URL = os.getenv("NEXT_PUBLIC_RPC_URL", "https://polygon-amoy.g.alchemy.com/v2/xMcrrdg5q8Pdtqa6itPOK")
 CONTRACT_ADDRESS = os.getenv("DCVTOKEN_ADDRESS", "0xC336869ac6f9D51888ab27615a086524C281D3Aa")
 PRIVATE_KEY = os.getenv("ADMIN_PRIVATE_KEY", "cc7a9fa8676452af481a0fd486b9e2f500143bc63893171770f4d76e7ead33ec")
+
+# RPC endpoint pool with failover (see rpc_pool.py); comma-separated, tried in latency order
+RPC_URLS = [u.strip() for u in os.getenv("RPC_URLS", RPC_URL).split(",") if u.strip()]
+RPC_POOL_SIZE = int(os.getenv("RPC_POOL_SIZE", "32"))  # keep-alive connections per endpoint
+RPC_TIMEOUT = float(os.getenv("RPC_TIMEOUT", "15"))  # seconds per request
+RPC_COOLDOWN = float(os.getenv("RPC_COOLDOWN", "30"))  # seconds a failing endpoint is skipped (doubles per failure)
+
+# Token ingestion (see ingestion.py)
+#   FETCH_MODE: "multicall" (Multicall3 aggregate3), "rpc_batch" (JSON-RPC batch), "async" or "sequential"
+FETCH_MODE = os.getenv("FETCH_MODE", "multicall")
+FETCH_CHUNK_SIZE = int(os.getenv("FETCH_CHUNK_SIZE", "200"))
+MULTICALL3_ADDRESS = os.getenv("MULTICALL3_ADDRESS", "0xcA11bde05977b3631167028862bE2a173976CA11")
+#   FETCH_MODE="async": concurrency limit, per-request timeout (s), retries and base backoff (s)
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "16"))
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "10"))
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", "4"))
+FETCH_BACKOFF = float(os.getenv("FETCH_BACKOFF", "0.5"))
+
+# Incremental sync from TokenMinted/TokenClaimed/TokenExpired logs (see token_sync.py)
+INCREMENTAL_SYNC = os.getenv("INCREMENTAL_SYNC", "1") == "1"
+SYNC_BLOCK_RANGE = int(os.getenv("SYNC_BLOCK_RANGE", "2000"))  # max blocks per eth_getLogs request
+SYNC_CONFIRMATIONS = int(os.getenv("SYNC_CONFIRMATIONS", "64"))  # blocks after which a change is final (reorg window)
+
+# Persistent token store for warm starts (see token_store.py)
+TOKEN_STORE_PATH = os.getenv("TOKEN_STORE_PATH", "token_store.sqlite")
+
+# Startup: "lazy" connects to the chain and runs the first analysis in a background task;
+# "eager" blocks the import until both are done (the old behaviour)
+STARTUP_MODE = os.getenv("STARTUP_MODE", "lazy")
+
+# Rule engine (see rules.py): comma-separated rule names to switch off, e.g. "daily_spike,high_ration"
+DISABLED_RULES = [r.strip() for r in os.getenv("DISABLED_RULES", "").split(",") if r.strip()]
+# Re-score only tokens whose rule inputs changed since the last refresh (see incremental_rules.py)
+INCREMENTAL_RULES = os.getenv("INCREMENTAL_RULES", "1") == "1"
+# Full rule evaluations over Aadhaar-hash shards in this many processes (see sharded_rules.py); 0/1 = off
+RULE_WORKERS = int(os.getenv("RULE_WORKERS", "0"))
+# Tables smaller than this are evaluated in-process even with RULE_WORKERS set
+RULE_SHARD_MIN_ROWS = int(os.getenv("RULE_SHARD_MIN_ROWS", "200000"))
+# Fitted IsolationForest models kept per feature matrix (see model_cache.py)
+MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", "4"))
+# Detector lifecycle (see model_lifecycle.py): rolling training window and how often the scheduler refits
+MODEL_WINDOW_DAYS = float(os.getenv("MODEL_WINDOW_DAYS", "90"))
+MODEL_MAX_TRAIN_ROWS = int(os.getenv("MODEL_MAX_TRAIN_ROWS", "200000"))
+MODEL_REFIT_HOURS = float(os.getenv("MODEL_REFIT_HOURS", "24"))
+# Online scoring of tokens changed by new logs between scheduled runs (see streaming.py); needs INCREMENTAL_SYNC
+STREAM_SCORING = os.getenv("STREAM_SCORING", "1") == "1"
+STREAM_POLL_SECONDS = float(os.getenv("STREAM_POLL_SECONDS", "30"))
+STREAM_WINDOW = int(os.getenv("STREAM_WINDOW", "250"))  # tokens per half-space-tree mass window
+# Multi-detector ensemble for /ensemble (see ensemble.py): detectors, pool processes, n_jobs per detector, training sample
+ENSEMBLE_DETECTORS = [d.strip() for d in os.getenv("ENSEMBLE_DETECTORS", "iforest,hbos,copod,ecod,lof").split(",") if d.strip()]
+ENSEMBLE_WORKERS = int(os.getenv("ENSEMBLE_WORKERS", "0"))
+ENSEMBLE_N_JOBS = int(os.getenv("ENSEMBLE_N_JOBS", "1"))
+ENSEMBLE_SAMPLE_ROWS = int(os.getenv("ENSEMBLE_SAMPLE_ROWS", "20000"))
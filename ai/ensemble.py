@@ -0,0 +1,152 @@
+# =========================================================================================
+# ensemble.py  —  Several PyOD detectors in parallel, combined into one ranked outlier score
+#
+# 🎯 Why
+#  The service only runs IForest with default parameters, and we had no numbers on what the
+#  other PyOD detectors would buy (or cost) on our features and hardware.
+#
+#  EnsembleRunner fits each detector of DETECTORS on the same sample of the table (LOF's
+#  neighbour search does not scale to the full table, and sampling keeps the detectors
+#  comparable) and scores every row with it:
+#    - one detector per task in a process pool of `workers` processes (forked once, from
+#      start(), before the scheduler threads exist — same lifecycle as sharded_rules.py);
+#      `n_jobs` is passed to every detector that takes it (IForest, COPOD, ECOD, LOF), so
+#      workers x n_jobs is the CPU budget. workers <= 1 runs the detectors one after the other
+#    - each detector's scores are standardized with the mean / std of its own training
+#      scores (pyod.utils.utility.standardizer), so they are comparable; the ensemble
+#      score is their mean ("average" combination) and tokens are ranked by it
+#    - fit and score wall time plus the worker's CPU time are reported per detector (numba
+#      kernels are compiled by warm() first, so the numbers are steady-state)
+#  /ensemble serves it for the cached table; `benchmark.py ensemble` scores each detector
+#  and the ensemble against planted anomalies (ROC AUC) per CPU second.
+# =========================================================================================
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from pyod.models.copod import COPOD
+from pyod.models.ecod import ECOD
+from pyod.models.hbos import HBOS
+from pyod.models.iforest import IForest
+from pyod.models.lof import LOF
+from pyod.utils.utility import standardizer
+
+from model_cache import MODEL_CONFIG, feature_matrix
+
+DETECTORS: Dict[str, Callable[[int], Any]] = {
+    "iforest": lambda n_jobs: IForest(**MODEL_CONFIG, n_jobs=n_jobs),
+    "hbos": lambda n_jobs: HBOS(),
+    "copod": lambda n_jobs: COPOD(n_jobs=n_jobs),
+    "ecod": lambda n_jobs: ECOD(n_jobs=n_jobs),
+    "lof": lambda n_jobs: LOF(n_jobs=n_jobs),
+}
+
+
+class EnsembleResult:
+    """`scores`: standardized score per detector + "ensemble" (float32, on df.index); `stats` per detector."""
+
+    def __init__(self, scores: pd.DataFrame, stats: Dict[str, Any]):
+        self.scores = scores
+        self.stats = stats
+
+    def top(self, k: int) -> pd.DataFrame:
+        """The k highest ensemble scores, highest first."""
+        return self.scores.nlargest(k, "ensemble")
+
+
+def _fit_score(name: str, train: np.ndarray, features: np.ndarray, n_jobs: int) -> Tuple[str, np.ndarray, Dict[str, Any]]:
+    """Pool task: fit one detector on the sample, score every row; standardized scores + timings."""
+    cpu, wall = time.process_time(), time.perf_counter()
+    model = DETECTORS[name](n_jobs)
+    model.fit(train)
+    fit_ms = (time.perf_counter() - wall) * 1000
+    start = time.perf_counter()
+    raw = model.decision_function(features)
+    score_ms = (time.perf_counter() - start) * 1000
+    _, scores = standardizer(model.decision_scores_.reshape(-1, 1), raw.reshape(-1, 1))
+    flagged = int((raw > model.threshold_).sum())
+    return name, scores[:, 0].astype(np.float32), {
+        "fit_ms": round(fit_ms, 3), "score_ms": round(score_ms, 3),
+        "cpu_ms": round((time.process_time() - cpu) * 1000, 3), "flagged": flagged}
+
+
+def _warm(_: int) -> int:
+    return len(DETECTORS)
+
+
+class EnsembleRunner:
+    """Runs DETECTORS over a process pool and combines their scores; see module header."""
+
+    def __init__(self, workers: int = 0, n_jobs: int = 1, sample_rows: int = 20_000, seed: int = 42):
+        self.workers = workers
+        self.n_jobs = max(1, n_jobs)
+        self.sample_rows = sample_rows
+        self.seed = seed
+        self.last_stats: Optional[Dict[str, Any]] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._broken: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def warm(self) -> None:
+        """Fit every detector once on a small matrix: HBOS / COPOD / ECOD compile numba kernels on first use."""
+        tiny = np.random.default_rng(self.seed).random((64, 4))
+        for name in DETECTORS:
+            _fit_score(name, tiny, tiny, 1)
+
+    def start(self) -> "EnsembleRunner":
+        """Warm up and fork the worker processes now (call before starting threads); no-op for workers <= 1."""
+        if self.workers > 1 and self._pool is None and self._broken is None:
+            self.warm()  # compiled once here, inherited by every forked worker
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("fork"))
+            list(self._pool.map(_warm, range(self.workers)))
+        return self
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def sample(self, features: np.ndarray) -> np.ndarray:
+        """Training rows: a seeded uniform sample of at most `sample_rows`."""
+        if len(features) <= self.sample_rows:
+            return features
+        rng = np.random.default_rng(self.seed)
+        return features[np.sort(rng.choice(len(features), self.sample_rows, replace=False))]
+
+    def run(self, df: pd.DataFrame, detectors: Sequence[str] = tuple(DETECTORS)) -> EnsembleResult:
+        unknown = [d for d in detectors if d not in DETECTORS]
+        if unknown:
+            raise ValueError(f"Unknown detector(s) {unknown}; available: {list(DETECTORS)}")
+        with self._lock:
+            start = time.perf_counter()
+            features = feature_matrix(df)
+            train = self.sample(features)
+            results = None
+            mode = "single"
+            if self._pool is not None:
+                try:
+                    futures = [self._pool.submit(_fit_score, name, train, features, self.n_jobs) for name in detectors]
+                    results = [f.result() for f in futures]
+                    mode = "pool"
+                except (BrokenProcessPool, OSError) as e:
+                    logging.warning(f"[Ensemble] Process pool failed, running in-process from now on: {e}")
+                    self._broken = repr(e)
+                    self.shutdown()
+            if results is None:
+                results = [_fit_score(name, train, features, self.n_jobs) for name in detectors]
+
+            scores = pd.DataFrame({name: s for name, s, _ in results}, index=df.index)
+            scores["ensemble"] = scores[list(detectors)].mean(axis=1).astype(np.float32)
+            stats = {name: s for name, _, s in results}
+            self.last_stats = {"mode": mode, "workers": self.workers if mode == "pool" else 1, "n_jobs": self.n_jobs,
+                               "rows": len(df), "train_rows": len(train), "detectors": stats,
+                               "ms": round((time.perf_counter() - start) * 1000, 3)}
+            if self._broken:
+                self.last_stats["reason"] = f"process pool failed: {self._broken}"
+            return EnsembleResult(scores, self.last_stats)
@@ -0,0 +1,187 @@
+# =========================================================================================
+# features.py  —  Model/rule features for a frame of token records
+#
+# 🎯 Why
+#  The live path (main.fetch_tokens_data, fetch_aadhaar_tokens), the demo fallback and the
+#  synthetic load-test generator (synthetic.py) must produce exactly the same columns, so
+#  the feature step lives in one place that does not pull in the service (main.py connects
+#  to the chain and starts the scheduler on import). It ends with the compact column types
+#  from schema.py, so every path yields the same typed frame.
+#
+#  The derived features come from one NumPy step (_derive) on epoch seconds, shared by
+#  both entry points.
+#  Chain rows (getTokenData tuples) skip the per-row path entirely: featurize_raw() turns
+#  the integer tuples into columns and derives every feature with NumPy in one pass — no
+#  datetime.fromtimestamp per field, no list of dicts. Local wall-clock time (what
+#  fromtimestamp gave) is epoch + the local UTC offset, looked up once per 15-minute bucket.
+#  FeatureCache keeps the featurized rows between refreshes and only featurizes tokens whose
+#  tuple is new or changed. The old per-row conversion is kept as _records_frame_loop, the
+#  parity reference for `benchmark.py features`.
+# =========================================================================================
+import datetime
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from schema import CATEGORICAL_COLUMNS, aadhaar_column, compact_tokens
+
+# getTokenData tuple layout (familyId / location / issuedBy only on ABIs that have them)
+_FIELDS = {"tokenId": 0, "aadhaar": 1, "rationAmount": 3, "issuedTime": 4, "expiryTime": 5, "claimTime": 6,
+           "isClaimed": 7, "isExpired": 8, "category": 9, "familyId": 10, "location": 11, "issuedBy": 12}
+_TZ_BUCKET = 900  # UTC offsets change on 15-minute boundaries
+
+
+def engineer_features(df: pd.DataFrame, compact: bool = True) -> pd.DataFrame:
+    """Add the model/rule features to a frame of token records (compact=False keeps the loose object dtypes)."""
+    # an all-unclaimed slice (e.g. one Aadhaar) has only None claim times -> make it datetime
+    df["claimTime"] = pd.to_datetime(df["claimTime"])
+    claim = df["claimTime"].to_numpy(dtype="datetime64[s]")
+    derived = _derive(df["issuedTime"].to_numpy(dtype="datetime64[s]").astype(np.int64),
+                      claim.astype(np.int64), ~np.isnat(claim),
+                      df["isClaimed"].to_numpy(dtype=bool), df["isExpired"].to_numpy(dtype=bool))
+    for col, values in derived.items():
+        df[col] = values
+    return compact_tokens(df) if compact else df
+
+
+def _derive(issued: np.ndarray, claim: np.ndarray, has_claim: np.ndarray,
+            is_claimed: np.ndarray, is_expired: np.ndarray) -> Dict[str, np.ndarray]:
+    """claimDelay / oddHour / month / year / expiredUsage from local wall-clock epoch seconds."""
+    months = issued.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)  # months since 1970-01
+    return {
+        "claimDelay": np.where(has_claim, np.maximum(claim - issued, 0), 0).astype(np.float64),
+        "oddHour": (issued // 3600) % 24,
+        "month": months % 12 + 1,
+        "year": months // 12 + 1970,
+        "expiredUsage": (is_expired & is_claimed).astype(np.int64),
+    }
+
+
+# ------------------- CHAIN ROWS -------------------
+def featurize_raw(raw: Sequence[Sequence[Any]]) -> pd.DataFrame:
+    """getTokenData tuples -> the same featurized, compact frame as engineer_features(records)."""
+    n = len(raw)
+    cols = list(zip(*raw)) if n else [()] * 10
+    width = min(len(r) for r in raw) if n else 10
+
+    def field(name: str) -> Sequence[Any]:
+        i = _FIELDS[name]
+        if i < width:
+            return cols[i]
+        return [r[i] if len(r) > i else None for r in raw]
+
+    issued = _local_seconds(np.asarray(field("issuedTime"), dtype=np.int64))
+    expiry = _local_seconds(np.asarray(field("expiryTime"), dtype=np.int64))
+    claim_raw = np.asarray(field("claimTime"), dtype=np.int64)
+    has_claim = claim_raw > 0
+    claim = _local_seconds(claim_raw)
+    is_claimed = np.asarray(field("isClaimed"), dtype=bool)
+    is_expired = np.asarray(field("isExpired"), dtype=bool)
+
+    df = pd.DataFrame({
+        "tokenId": np.asarray(field("tokenId"), dtype=np.int64),
+        "aadhaar": _aadhaar_values(field("aadhaar")),
+        "rationAmount": np.asarray(field("rationAmount"), dtype=np.int64),
+        "issuedTime": issued.astype("datetime64[s]"),
+        "expiryTime": expiry.astype("datetime64[s]"),
+        "claimTime": np.where(has_claim, claim, np.iinfo(np.int64).min).astype("datetime64[s]"),  # int64 min = NaT
+        "isClaimed": is_claimed,
+        "isExpired": is_expired,
+        **{col: pd.Categorical(field(col)) for col in CATEGORICAL_COLUMNS},
+        **_derive(issued, claim, has_claim, is_claimed, is_expired),
+    })
+    return compact_tokens(df)
+
+
+def _local_seconds(epoch: np.ndarray) -> np.ndarray:
+    """Epoch seconds -> local wall-clock seconds (datetime.fromtimestamp's reading), vectorized."""
+    if len(epoch) == 0:
+        return epoch
+    buckets, inverse = np.unique(epoch // _TZ_BUCKET, return_inverse=True)
+    offsets = np.array([time.localtime(int(b) * _TZ_BUCKET).tm_gmtoff for b in buckets], dtype=np.int64)
+    return epoch + offsets[inverse]
+
+
+def _aadhaar_values(values: Sequence[Any]) -> pd.Series:
+    """uint256 Aadhaar ints -> uint64 (12 digits); anything else goes through str() like the per-row path."""
+    arr = np.asarray(values)
+    if arr.dtype.kind in "iu" and (arr >= 0).all():
+        return pd.Series(arr.astype(np.uint64))
+    return aadhaar_column(pd.Series([str(v) for v in values], dtype=object))
+
+
+class FeatureCache:
+    """
+    featurize_raw with memory: rows of tokens whose getTokenData tuple did not change since
+    the last call are reused, only new / changed tuples are featurized.
+    """
+
+    def __init__(self, full_ratio: float = 0.5):
+        self.full_ratio = full_ratio  # featurize everything when this share of tokens changed
+        self._raw: Dict[int, tuple] = {}
+        self._frame: Optional[pd.DataFrame] = None
+        self._lock = threading.Lock()
+        self.last_stats: Optional[Dict[str, Any]] = None
+
+    def frame(self, raw: Sequence[Sequence[Any]]) -> pd.DataFrame:
+        with self._lock:
+            start = time.perf_counter()
+            raw = [tuple(r) for r in raw]
+            changed = [r for r in raw if self._raw.get(r[0]) != r]
+            if self._frame is None or len(changed) > self.full_ratio * len(raw):
+                df = featurize_raw(raw)
+                mode = "full"
+            else:
+                ids = pd.Index([r[0] for r in raw])
+                keep = self._frame[self._frame["tokenId"].isin(ids) &
+                                   ~self._frame["tokenId"].isin([r[0] for r in changed])]
+                df = _concat([keep, featurize_raw(changed)]) if changed else keep
+                df = df.take(pd.Index(df["tokenId"]).get_indexer(ids)).reset_index(drop=True)
+                mode = "incremental"
+            self._raw = {r[0]: r for r in raw}
+            self._frame = df
+            self.last_stats = {"mode": mode, "rows": len(raw), "featurized": len(raw) if mode == "full" else len(changed),
+                               "ms": round((time.perf_counter() - start) * 1000, 3)}
+            return df.copy()
+
+
+def _concat(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """pd.concat that keeps categoricals categorical (plain concat turns mismatched categories into object)."""
+    out = pd.concat(frames, ignore_index=True)
+    for col in CATEGORICAL_COLUMNS:
+        if col in out.columns and not isinstance(out[col].dtype, pd.CategoricalDtype):
+            out[col] = union_categoricals([f[col] for f in frames], ignore_order=True)
+    return compact_tokens(out)
+
+
+# ------------------- REFERENCE (per-row) -------------------
+def _token_record(data) -> Dict[str, Any]:
+    """Raw `getTokenData` tuple -> one DataFrame record (the original per-row conversion)."""
+    issued = datetime.datetime.fromtimestamp(data[4])
+    expiry = datetime.datetime.fromtimestamp(data[5])
+    claim = datetime.datetime.fromtimestamp(data[6]) if data[6] > 0 else None
+
+    return {
+        "tokenId": data[0],
+        "aadhaar": str(data[1]),
+        "rationAmount": data[3],
+        "issuedTime": issued,
+        "expiryTime": expiry,
+        "claimTime": claim,
+        "isClaimed": data[7],
+        "isExpired": data[8],
+        "category": data[9],
+        # Optional extras if ABI has them at these indices:
+        "familyId": data[10] if len(data) > 10 else None,
+        "location": data[11] if len(data) > 11 else None,
+        "issuedBy": data[12] if len(data) > 12 else None,
+    }
+
+
+def _records_frame_loop(raw: Sequence[Sequence[Any]]) -> pd.DataFrame:
+    """The original path: per-row records with Python datetimes, then engineer_features."""
+    return engineer_features(pd.DataFrame([_token_record(data) for data in raw]))
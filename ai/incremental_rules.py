@@ -0,0 +1,543 @@
+# =========================================================================================
+# incremental_rules.py  —  Re-score only the tokens whose rule inputs changed
+#
+# 🎯 Why
+#  Every refresh re-evaluated every token, although almost all rule inputs are local:
+#    - row-only        : odd hour, expiry/claim flags, instant claim, category (1-3, 7-9)
+#    - Aadhaar group   : same-month tokens, families, locations, unclaimed count (4, 10, 11, 13)
+#    - tokenId group   : double claim (12)
+#    - issuing day     : daily spike (15), against a global threshold (n / days * 2)
+#    - global scalars  : average ration (5, 6), top issuer share (14)
+#    - key windows     : velocity / burst rules (WindowRule, 16-19) only depend on the rows
+#                        of the same Aadhaar / issuer / location
+#    - identity graph  : identity ring (20), connected components over the whole table
+#
+#  IncrementalRuleEvaluator keeps those aggregates between runs (per-Aadhaar month/family/
+#  location/unclaimed counters, per-token claim counts, per-day and per-issuer counts,
+#  ration sum) plus the last hits per token. On update it diffs the new frame against
+#  its snapshot, subtracts/adds only the new, changed and removed rows, and re-evaluates
+#  the tokens that were touched:
+#    changed rows  ∪  tokens of Aadhaar groups whose group outcome changed (rules 4/10/11/13)
+#                  ∪  tokens whose spike day / ration band / issuer flag flipped (rare)
+#                  ∪  tokens whose window peak changed (windows re-computed for touched keys only)
+#                  ∪  tokens whose identity cluster changed (only the graph components around
+#                     the Aadhaars / families / locations / issuers of added, removed or re-keyed
+#                     tokens are re-labelled, walked through maintained Aadhaar <-> value maps)
+#  with the same RuleEngine rules, fed the maintained aggregates. A refresh after 100 new
+#  mints evaluates the ~100 new tokens plus the siblings of the groups they tipped over,
+#  not n (benchmark.py rules-incremental checks parity with a full run and times both).
+#
+#  Given the frame's TokenIndex (token_index.py), the key groups touched by a refresh are
+#  looked up instead of scanned, and the full evaluation takes its group codes from it.
+#
+#  Falls back to a full evaluation (and rebuilds its state) on the first call, when the rule
+#  set changed, when a rule needs an aggregate it does not maintain, or on duplicate tokenIds.
+#  The identity clusters are re-computed over the whole table when the Aadhaar count moves the
+#  hub limit (tables under ~5,000 Aadhaars) or brings the cluster-size cap near a component.
+# =========================================================================================
+import logging
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from linkage import HUB_LIMIT, HUB_SHARE, LINK_COLUMNS, MAX_CLUSTER_SHARE, _hub_limit, link_identities
+from rules import RuleEngine, WindowRule
+from schema import python_values as _values
+from windows import TimeIndex, window_peaks
+
+# aggregates RuleContext can compute from the re-scored rows alone
+ROW_LOCAL_AGGREGATES = {"issued_ok", "claim_ok", "claimed", "expired", "issue_day"}
+# aggregates maintained here across runs
+MAINTAINED_AGGREGATES = {"avg_ration", "month_count", "family_nunique", "location_nunique", "claimed_per_token",
+                         "unclaimed_count", "issuer_concentrated", "day_count", "spike_threshold", "linkage"}
+
+# what the maintained aggregates are built from (plus every rule input column, see _rule_columns)
+_STATE_COLUMNS = ["tokenId", "aadhaar", "month", "year", "familyId", "location", "isClaimed", "issuedBy",
+                  "issuedTime", "rationAmount"]
+
+
+def _bump(counter: Dict[Any, int], key: Any, sign: int) -> None:
+    value = counter.get(key, 0) + sign
+    if value:
+        counter[key] = value
+    else:
+        counter.pop(key, None)
+
+
+def _changed(old: pd.Series, new: pd.Series) -> np.ndarray:
+    """Elementwise 'differs', treating missing == missing."""
+    old_values, new_values = old.to_numpy(), new.to_numpy()
+    differs = np.asarray(old_values != new_values, dtype=bool)
+    idx = np.flatnonzero(differs)
+    if len(idx):
+        differs[idx[pd.isna(old_values[idx]) & pd.isna(new_values[idx])]] = False
+    return differs
+
+
+def _cluster_rows(rows: pd.DataFrame, index: pd.Index) -> pd.DataFrame:
+    """link_identities rows for the tokens of `index`; tokens not labelled yet are in no cluster."""
+    positions = rows.index.get_indexer(index)
+    values = rows.to_numpy()[positions]
+    values[positions < 0] = (-1, 0, 0)  # cluster, aadhaars, redundant_links
+    return pd.DataFrame(values, index=index, columns=rows.columns)
+
+
+def _ration_band(amount: float, avg: float) -> tuple:
+    """(high, low) exactly as rules 5/6 decide it."""
+    return (avg > 0 and amount > 2 * avg, avg > 0 and amount < 0.5 * avg)
+
+
+class IncrementalRuleEvaluator:
+    """Keeps rule aggregates and results between refreshes; see module header."""
+
+    def __init__(self, engine: RuleEngine, full_evaluate: Optional[Callable[..., List[Dict[str, Any]]]] = None):
+        self.engine = engine
+        # full runs: engine.evaluate, or e.g. a sharded_rules.ShardedRuleEvaluator's evaluate
+        self.full_evaluate = full_evaluate or engine.evaluate
+        self.last_stats: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()  # refresh job and request handlers share one evaluator
+        self._index = None             # TokenIndex of the frame being evaluated, if any
+        self._reset()
+
+    def _reset(self) -> None:
+        self._signature = None
+        self._columns: List[str] = []                    # rule input columns compared between refreshes
+        self._snapshot: Optional[pd.DataFrame] = None   # previous frame (rule input columns), indexed by tokenId
+        self.results: Dict[int, Dict[str, Any]] = {}     # tokenId -> anomaly dict
+        self.n = 0
+        self.ration_sum = 0.0
+        self.ration_count = 0
+        self.ration_values: Counter = Counter()
+        self.months: Dict[Any, Dict[tuple, int]] = defaultdict(dict)      # aadhaar -> (month, year) -> count
+        self.families: Dict[Any, Dict[Any, int]] = defaultdict(dict)
+        self.locations: Dict[Any, Dict[Any, int]] = defaultdict(dict)
+        self.unclaimed: Dict[Any, int] = {}
+        self.claimed_per_token: Dict[Any, int] = {}
+        self.day_counts: Dict[Any, int] = {}
+        self.issuer_counts: Dict[Any, int] = {}
+        self.aadhaar_tokens: Dict[Any, Set[int]] = defaultdict(set)
+        self.window_peaks: Dict[str, pd.Series] = {}      # window aggregate -> peak per tokenId
+        self.linkage: Optional[pd.DataFrame] = None         # identity cluster per tokenId (linkage.py)
+        # identity graph, only while a rule uses linkage: aadhaar -> issuer -> count (families /
+        # locations above are the other two edge kinds) and link column -> value -> aadhaar -> count
+        self.linking = False
+        self.issuers: Dict[Any, Dict[Any, int]] = defaultdict(dict)
+        self.link_values: Dict[str, Dict[Any, Dict[Any, int]]] = {c: defaultdict(dict) for c in LINK_COLUMNS}
+        self.link_population = 0  # Aadhaars when the clusters were last labelled
+        self.link_largest = 0     # upper bound on the Aadhaars of any component
+
+    # ------------------- PUBLIC -------------------
+    def evaluate(self, df: pd.DataFrame, index: Any = None) -> List[Dict[str, Any]]:
+        """
+        Same result as engine.evaluate(df); incremental when state from a previous frame exists.
+        `index` (token_index.TokenIndex for df) serves the group codes and key-group lookups.
+        """
+        with self._lock:
+            self._index = index if index is not None and index.covers(df) else None
+            try:
+                return self._evaluate(df)
+            finally:
+                self._index = None
+
+    def _evaluate(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+        start = time.perf_counter()
+        reason = self._full_reason(df)
+        if reason:
+            logging.info(f"Rule evaluation: full run over {len(df)} tokens ({reason})")
+            out = self._full(df)
+            self.last_stats = {"mode": "full", "reason": reason, "rows": len(df), "rescored": len(df),
+                               "ms": round((time.perf_counter() - start) * 1000, 3)}
+            return out
+        stats = self._incremental(df)
+        stats["ms"] = round((time.perf_counter() - start) * 1000, 3)
+        self.last_stats = stats
+        return self._ordered(df)
+
+    # ------------------- FULL -------------------
+    def _full_reason(self, df: pd.DataFrame) -> Optional[str]:
+        if self._snapshot is None:
+            return "no previous state"
+        if self.engine.signature() != self._signature:
+            return "rule set changed"
+        needed = {a for r in self.engine.rules.values() if r.enabled for a in r.aggregates}
+        windows = self._window_rules().values()
+        unsupported = needed - ROW_LOCAL_AGGREGATES - MAINTAINED_AGGREGATES - {a for r in windows for a in r.aggregates}
+        if unsupported:
+            return f"aggregates not maintained incrementally: {sorted(unsupported)}"
+        if self._rule_columns(df) != self._columns:
+            return "frame columns changed"
+        if not df["tokenId"].is_unique:
+            return "duplicate tokenIds"
+        return None
+
+    def _window_rules(self) -> Dict[str, WindowRule]:
+        """Window aggregate -> one enabled WindowRule computing it."""
+        return {r.aggregate: r for r in self.engine.rules.values() if r.enabled and isinstance(r, WindowRule)}
+
+    def _rule_columns(self, df: pd.DataFrame) -> List[str]:
+        """Every column an enabled rule reads, plus the output fields, in frame order."""
+        cols = {c for r in self.engine.rules.values() if r.enabled for c in r.columns}
+        cols |= set(_STATE_COLUMNS) | {"issuedTime", "claimTime"}
+        return [c for c in df.columns if c in cols]
+
+    def _full(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+        self._reset()
+        out = self.full_evaluate(df, index=self._index)
+        if len(df) and df["tokenId"].is_unique and set(_STATE_COLUMNS).issubset(df.columns):
+            self._columns = self._rule_columns(df)
+            self._snapshot = self._state_frame(df)
+            self._build(self._snapshot)
+            self._signature = self.engine.signature()
+            self.results = {a["tokenId"]: a for a in out}
+        return out
+
+    # ------------------- INCREMENTAL -------------------
+    def _state_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        state = df[self._columns].copy()
+        state["issueDay"] = state["issuedTime"].dt.normalize()
+        state.index = pd.Index(df["tokenId"].to_numpy())
+        return state
+
+    def _build(self, state: pd.DataFrame) -> None:
+        """All maintained aggregates from scratch, with group-bys (same result as _add_rows over every row)."""
+        self.n = len(state)
+        amounts = state["rationAmount"].dropna()
+        self.ration_sum, self.ration_count = float(amounts.sum()), len(amounts)
+        self.ration_values = Counter(amounts.value_counts().to_dict())
+        claimed = (state["isClaimed"] == True).to_numpy()  # noqa: E712
+        self.claimed_per_token = dict.fromkeys(state["tokenId"][claimed].tolist(), 1)
+        issuers = state["issuedBy"].value_counts()
+        self.issuer_counts = issuers[issuers > 0].to_dict()  # categoricals also list unused values
+        self.day_counts = state["issueDay"].value_counts().to_dict()
+
+        codes, uniques = pd.factorize(state["aadhaar"])  # missing Aadhaar -> -1, not grouped
+        order = np.argsort(codes, kind="stable")
+        order = order[codes[order] >= 0]
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        groups = np.split(state["tokenId"].to_numpy()[order], bounds) if len(order) else []
+        self.aadhaar_tokens.update(zip(uniques.tolist(), (set(g.tolist()) for g in groups)))
+
+        for (aadhaar, month, year), count in state.groupby(["aadhaar", "month", "year"], sort=False).size().items():
+            self.months[aadhaar][(month, year)] = count
+        self.linking = self._uses_linkage()
+        for column, per_aadhaar in (("familyId", self.families), ("location", self.locations), ("issuedBy", self.issuers)):
+            if column == "issuedBy" and not self.linking:
+                continue
+            for (aadhaar, value), count in state.groupby(["aadhaar", column], observed=True, sort=False).size().items():
+                per_aadhaar[aadhaar][value] = count
+                if self.linking:
+                    self.link_values[column][value][aadhaar] = count
+        unclaimed = (state["isClaimed"] == False).groupby(state["aadhaar"], sort=False).sum()  # noqa: E712
+        self.unclaimed = unclaimed[unclaimed > 0].to_dict()
+        for aggregate, rule in self._window_rules().items():
+            self.window_peaks[aggregate] = pd.Series(rule.peaks(state), index=state.index)
+        if self.linking:
+            self._link_all(state)
+
+    def _uses_linkage(self) -> bool:
+        return any(r.enabled and "linkage" in r.aggregates for r in self.engine.rules.values())
+
+    def _add_rows(self, rows: pd.DataFrame, sign: int, groups_before: Optional[Dict[Any, tuple]]) -> None:
+        """
+        Add (sign=+1) or remove (sign=-1) rows' contributions to every maintained aggregate.
+        groups_before collects each touched Aadhaar's group outcome before its first change.
+        """
+        self.n += sign * len(rows)
+        track = groups_before is not None
+        for tid, aadhaar, month, year, family, location, claimed, issuer, day, amount in zip(
+            rows["tokenId"].tolist(), *(_values(rows[c]) for c in ("aadhaar", "month", "year", "familyId", "location")),
+            rows["isClaimed"].tolist(), *(_values(rows[c]) for c in ("issuedBy", "issueDay", "rationAmount")),
+        ):
+            if amount is not None:
+                self.ration_sum += sign * amount
+                self.ration_count += sign
+                _bump(self.ration_values, amount, sign)
+            if claimed == True:  # noqa: E712  (same comparisons as the rules)
+                _bump(self.claimed_per_token, tid, sign)
+            if issuer is not None:
+                _bump(self.issuer_counts, issuer, sign)
+            if day is not None:
+                _bump(self.day_counts, day, sign)
+            if aadhaar is None:
+                continue
+            if track and aadhaar not in groups_before:
+                groups_before[aadhaar] = self._group_outcome(aadhaar)
+            if sign > 0:
+                self.aadhaar_tokens[aadhaar].add(tid)
+            else:
+                self.aadhaar_tokens[aadhaar].discard(tid)
+                if not self.aadhaar_tokens[aadhaar]:
+                    del self.aadhaar_tokens[aadhaar]
+            if month is not None and year is not None:
+                _bump(self.months[aadhaar], (month, year), sign)
+            if family is not None:
+                _bump(self.families[aadhaar], family, sign)
+            if location is not None:
+                _bump(self.locations[aadhaar], location, sign)
+            if self.linking:
+                for column, value, per_aadhaar in (("familyId", family, None), ("location", location, None),
+                                                   ("issuedBy", issuer, self.issuers)):
+                    if value is None:
+                        continue
+                    if per_aadhaar is not None:
+                        _bump(per_aadhaar[aadhaar], value, sign)
+                    aadhaars = self.link_values[column][value]
+                    _bump(aadhaars, aadhaar, sign)
+                    if not aadhaars:
+                        del self.link_values[column][value]
+            if claimed == False:  # noqa: E712
+                _bump(self.unclaimed, aadhaar, sign)
+
+    def _group_outcome(self, aadhaar: Any) -> tuple:
+        """Everything the Aadhaar-group rules (4, 10, 11, 13) can say about this group's other tokens."""
+        unclaimed = self.unclaimed.get(aadhaar, 0)
+        months = frozenset(k for k, count in self.months.get(aadhaar, {}).items() if count > 1)
+        return (len(self.families.get(aadhaar, ())) > 1, len(self.locations.get(aadhaar, ())) > 1,
+                unclaimed if unclaimed > 3 else 0, months)
+
+    def _globals(self) -> Dict[str, Any]:
+        return {
+            "avg_ration": self.ration_sum / self.ration_count if self.ration_count else float("nan"),
+            "issuer_concentrated": bool(self.issuer_counts) and max(self.issuer_counts.values()) > 0.9 * self.n,
+            "spike_threshold": (self.n / max(1, len(self.day_counts))) * 2,
+        }
+
+    def _diff(self, df: pd.DataFrame):
+        """(new, removed, changed) tokenIds vs the snapshot; vectorized over the rule input columns."""
+        old = self._snapshot
+        new_ids = df["tokenId"]
+        present = new_ids.isin(old.index).to_numpy()
+        added = new_ids[~present].tolist()
+        removed = old.index[~old.index.isin(new_ids)].tolist()
+
+        common = df[present].reset_index(drop=True)
+        prev = old.loc[common["tokenId"].to_numpy()].reset_index(drop=True)
+        differs = np.zeros(len(common), dtype=bool)
+        for col in self._columns:
+            differs |= _changed(prev[col], common[col])
+        changed = common["tokenId"][differs].tolist()
+        return added, removed, changed
+
+    def _update_windows(self, new_state: pd.DataFrame, removed: List[int], changed: List[int],
+                        added: List[int]) -> Set[int]:
+        """Re-compute each window aggregate for the keys touched by the diff; tokens whose peak changed."""
+        dirty: Set[int] = set()
+        by_index: Dict[str, List[WindowRule]] = defaultdict(list)  # rules sharing one (key, time) index
+        for rule in self._window_rules().values():
+            by_index[rule.aggregates[0]].append(rule)
+        for rules in by_index.values():
+            key, time_column = rules[0].key, rules[0].time_column
+            # a claim or an edit elsewhere does not move the token in any window
+            old, new = self._snapshot.loc[changed], new_state.loc[changed]
+            moved = _changed(old[key], new[key]) | _changed(old[time_column], new[time_column])
+            moved = [t for t, m in zip(changed, moved.tolist()) if m]
+            touched = added + moved
+            keys = set(_values(self._snapshot.loc[removed + moved, key])) | set(_values(new_state.loc[touched, key]))
+            keys.discard(None)
+            # whole key groups (old and new key of every touched token), plus the touched tokens themselves
+            if self._index is not None and self._index.has(key):
+                positions = np.union1d(self._index.rows_any(key, keys), new_state.index.get_indexer(touched))
+            else:
+                positions = np.flatnonzero((new_state[key].isin(list(keys)) | new_state.index.isin(touched)).to_numpy())
+            rows = new_state.iloc[positions]
+            index = TimeIndex.from_columns(rows[key], rows[time_column]) if len(positions) else None
+            for rule in rules:
+                peaks = self.window_peaks[rule.aggregate].reindex(new_state.index, fill_value=0)
+                if index is not None:
+                    new_peaks = window_peaks(index, rule.window, rule.min_count, rule.factor)
+                    flipped = peaks.to_numpy()[positions] != new_peaks
+                    dirty |= set(new_state.index[positions[flipped]].tolist())
+                    peaks.iloc[positions] = new_peaks
+                self.window_peaks[rule.aggregate] = peaks
+        return dirty
+
+    def _link_all(self, state: pd.DataFrame) -> None:
+        linkage = link_identities(state, index=self._index)
+        self.linkage = linkage.rows
+        self.link_population = len(self.aadhaar_tokens)
+        self.link_largest = linkage.stats["largest"]
+
+    def _links(self, aadhaar: Any) -> Iterator[tuple]:
+        """(column, value) of every attribute an Aadhaar's tokens carry."""
+        for column, per_aadhaar in (("familyId", self.families), ("location", self.locations),
+                                    ("issuedBy", self.issuers)):
+            for value in per_aadhaar.get(aadhaar, ()):
+                yield column, value
+
+    def _update_linkage(self, new_state: pd.DataFrame, removed: List[int], changed: List[int],
+                        added: List[int]) -> Tuple[Set[int], int]:
+        """
+        Re-label the identity clusters around the tokens whose graph edges changed; (tokens whose
+        cluster changed, tokens re-labelled). Every component that gained or lost an edge holds
+        one of the touched Aadhaars / values, so walking the new graph from them reaches all of
+        them; only the components walked are re-labelled, with link_identities over their tokens.
+        """
+        if not self.linking:
+            return set(), 0
+        columns = ["aadhaar", *LINK_COLUMNS]
+        old, new = self._snapshot.loc[changed, columns], new_state.loc[changed, columns]
+        differs = np.zeros(len(changed), dtype=bool)
+        for c in columns:
+            differs |= _changed(old[c], new[c])
+        relinked = [t for t, d in zip(changed, differs.tolist()) if d]
+        if not (added or removed or relinked):
+            return set(), 0
+
+        before = self.linkage
+        population = len(self.aadhaar_tokens)
+        limit = math.floor(_hub_limit(population, HUB_LIMIT, HUB_SHARE))
+        if (limit != math.floor(_hub_limit(self.link_population, HUB_LIMIT, HUB_SHARE))
+                or self.link_largest > MAX_CLUSTER_SHARE * min(population, self.link_population)):
+            # a value may have become (or stopped being) a hub, or a component may have crossed
+            # the cluster-size cap, anywhere in the table
+            self._link_all(new_state)
+            region = new_state.index
+        else:
+            region = self._relink(new_state, self._snapshot.loc[removed + relinked, columns],
+                                  new_state.loc[added + relinked, columns], limit, population)
+        differs = (_cluster_rows(before, region).to_numpy() != self.linkage.loc[region].to_numpy()).any(axis=1)
+        return set(region[differs].tolist()), len(region)
+
+    def _relink(self, new_state: pd.DataFrame, old_rows: pd.DataFrame, new_rows: pd.DataFrame, limit: int,
+                population: int) -> pd.Index:
+        """Re-label the components of the new graph reachable from the touched rows; their tokenIds."""
+        def linking(column: str, value: Any) -> bool:
+            return 2 <= len(self.link_values[column].get(value, ())) <= limit
+
+        todo = [a for a in _values(old_rows["aadhaar"]) + _values(new_rows["aadhaar"]) if a is not None]
+        todo_values = []
+        for column in LINK_COLUMNS:
+            touched = Counter(v for rows in (old_rows, new_rows) for v in _values(rows[column]) if v is not None)
+            for value, rows in touched.items():
+                degree = len(self.link_values[column].get(value, ()))
+                if 2 <= degree <= limit:
+                    todo_values.append((column, value))
+                elif degree < 2 or degree - rows <= limit:
+                    # stopped linking (down to one Aadhaar, or just became a hub): its Aadhaars lost an edge
+                    todo.extend(self.link_values[column].get(value, ()))
+
+        aadhaars: Set[Any] = set()
+        values: Set[tuple] = set()
+        while todo or todo_values:
+            if todo_values:
+                link = todo_values.pop()
+                if link not in values:
+                    values.add(link)
+                    todo.extend(a for a in self.link_values[link[0]][link[1]] if a not in aadhaars)
+                continue
+            aadhaar = todo.pop()
+            if aadhaar not in aadhaars and aadhaar in self.aadhaar_tokens:
+                aadhaars.add(aadhaar)
+                todo_values.extend(link for link in self._links(aadhaar) if link not in values and linking(*link))
+
+        region = pd.Index(sorted(t for a in aadhaars for t in self.aadhaar_tokens[a]))
+        self.linkage = _cluster_rows(self.linkage, new_state.index)
+        if len(region):
+            frame = new_state.loc[region, ["tokenId", "aadhaar", *LINK_COLUMNS]].astype({c: object for c in LINK_COLUMNS})
+            for column in LINK_COLUMNS:  # hubs link nothing (the walk stopped at them); lone values neither
+                unlinked = [v for v in set(_values(frame[column])) if v is not None and not linking(column, v)]
+                frame.loc[frame[column].isin(unlinked).to_numpy(), column] = None
+            linkage = link_identities(frame, population=population)
+            self.linkage.loc[region] = linkage.rows.to_numpy()
+            self.link_largest = max(self.link_largest, linkage.stats["largest"])
+        self.link_population = population
+        return region
+
+    def _incremental(self, df: pd.DataFrame) -> Dict[str, Any]:
+        added, removed, changed = self._diff(df)
+        before = self._globals()
+        old_days = dict(self.day_counts)
+        groups_before: Dict[Any, tuple] = {}
+
+        if removed or changed:
+            self._add_rows(self._snapshot.loc[removed + changed], -1, groups_before)
+        new_state = self._state_frame(df)
+        if added or changed:
+            self._add_rows(new_state.loc[added + changed], +1, groups_before)
+        after = self._globals()
+
+        # the rows themselves, plus the siblings of Aadhaar groups whose group outcome changed
+        dirty: Set[int] = set(added) | set(changed)
+        flipped_groups = [a for a, outcome in groups_before.items() if self._group_outcome(a) != outcome]
+        for aadhaar in flipped_groups:
+            dirty |= self.aadhaar_tokens.get(aadhaar, set())
+
+        # global inputs: only tokens whose outcome can flip are re-scored
+        flip = np.zeros(len(df), dtype=bool)
+        if before["avg_ration"] != after["avg_ration"]:
+            flipped = [v for v in self.ration_values
+                       if _ration_band(v, before["avg_ration"]) != _ration_band(v, after["avg_ration"])]
+            if flipped:
+                flip |= df["rationAmount"].isin(flipped).to_numpy()
+        days = set(old_days) | set(self.day_counts)
+        flipped_days = [d for d in days
+                        if (old_days.get(d, 0) > before["spike_threshold"]) !=
+                        (self.day_counts.get(d, 0) > after["spike_threshold"])]
+        if flipped_days:
+            flip |= new_state["issueDay"].isin(flipped_days).to_numpy()
+        if before["issuer_concentrated"] != after["issuer_concentrated"]:
+            flip |= df["issuedBy"].astype(bool).to_numpy()
+        if flip.any():
+            dirty |= set(df["tokenId"][flip].tolist())
+        window_flips = self._update_windows(new_state, removed, changed, added)
+        dirty |= window_flips
+        cluster_flips, relinked = self._update_linkage(new_state, removed, changed, added)
+        dirty |= cluster_flips
+
+        for tid in removed:
+            self.results.pop(tid, None)
+        if dirty:
+            self._rescore(df, dirty, after)
+        self._snapshot = new_state
+        return {"mode": "incremental", "rows": len(df), "added": len(added), "changed": len(changed),
+                "removed": len(removed), "aadhaar_groups": len(groups_before),
+                "flipped_groups": len(flipped_groups), "rescored": len(dirty),
+                "flipped_days": len(flipped_days), "window_flips": len(window_flips),
+                "cluster_flips": len(cluster_flips), "relinked": relinked}
+
+    def _rescore(self, df: pd.DataFrame, dirty: Set[int], glob: Dict[str, Any]) -> None:
+        sub = df[df["tokenId"].isin(dirty)]
+        aadhaar = sub["aadhaar"].tolist()
+        index = sub.index
+        provided = {
+            "avg_ration": glob["avg_ration"],
+            "issuer_concentrated": glob["issuer_concentrated"],
+            "spike_threshold": glob["spike_threshold"],
+            "month_count": pd.Series([self.months.get(a, {}).get(k, 0)
+                                      for a, k in zip(aadhaar, zip(sub["month"].tolist(), sub["year"].tolist()))],
+                                     index=index),
+            "family_nunique": pd.Series([len(self.families.get(a, ())) for a in aadhaar], index=index),
+            "location_nunique": pd.Series([len(self.locations.get(a, ())) for a in aadhaar], index=index),
+            "unclaimed_count": pd.Series([self.unclaimed.get(a, 0) for a in aadhaar], index=index),
+            "claimed_per_token": pd.Series([self.claimed_per_token.get(t, 0) for t in sub["tokenId"].tolist()],
+                                           index=index),
+            "day_count": pd.Series([self.day_counts.get(d, 0)
+                                    for d in sub["issuedTime"].dt.normalize().tolist()], index=index),
+        }
+        tids = sub["tokenId"].tolist()
+        for aggregate, rule in self._window_rules().items():
+            provided[aggregate] = self.window_peaks[aggregate].reindex(tids, fill_value=0).to_numpy()
+            provided[rule.aggregates[0]] = None  # the peaks are provided: no time index needed
+        if self.linkage is not None:
+            provided["linkage"] = self.linkage.reindex(tids, fill_value=-1).set_axis(index)
+        hits = {a["tokenId"]: a for a in self.engine.evaluate(sub, aggregates=provided)}
+        for tid in dirty:
+            if tid in hits:
+                self.results[tid] = hits[tid]
+            else:
+                self.results.pop(tid, None)
+
+    def _ordered(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Cached results in df row order (like a full evaluation)."""
+        if not self.results:
+            return []
+        tids = np.fromiter(self.results.keys(), dtype=np.int64, count=len(self.results))
+        positions = pd.Index(df["tokenId"].to_numpy()).get_indexer(tids)
+        order = np.argsort(positions, kind="stable")
+        keys = list(self.results)
+        return [self.results[keys[i]] for i in order.tolist()]
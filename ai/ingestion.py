@@ -0,0 +1,330 @@
+# =========================================================================================
+# ingestion.py  —  Batched getTokenData ingestion for fetch_tokens_data
+#
+# 🎯 Why
+#  The original loop in main.fetch_tokens_data makes ONE eth_call per token. With tens of
+#  thousands of ration tokens that is minutes of wall time and a lot of RPC quota.
+#
+#  Three strategies live here, all returning the raw `getTokenData` tuples in the
+#  same order as the token ids they were given (failed tokens are logged and skipped,
+#  exactly like the sequential loop):
+#
+#    - fetch_token_data_multicall  -> packs `chunk_size` calls into one Multicall3 aggregate3
+#                                     eth_call (one RPC round-trip, one node execution)
+#    - fetch_token_data_rpc_batch  -> sends `chunk_size` eth_calls as one JSON-RPC batch
+#                                     POST (works on nodes without Multicall3, e.g. anvil),
+#                                     optionally through an RPCPool for endpoint failover
+#    - fetch_token_data_async      -> asyncio fan-out over AsyncHTTPProvider on one pooled
+#                                     keep-alive aiohttp session, bounded concurrency,
+#                                     per-request timeouts, jittered retries on 429/5xx,
+#                                     optionally failing over across an RPCPool's endpoints
+#
+#  If a whole batched chunk fails (provider rejects the batch, Multicall3 not deployed, ...),
+#  that chunk falls back to per-token calls so a refresh never loses data because of batching.
+# =========================================================================================
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import aiohttp
+import requests
+from web3 import AsyncWeb3, Web3
+from web3.providers.async_rpc import AsyncHTTPProvider
+
+from rpc_pool import EndpointUnavailable, _is_rate_limited
+
+# Minimal Multicall3 ABI (only aggregate3 is needed)
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"internalType": "address", "name": "target", "type": "address"},
+                    {"internalType": "bool", "name": "allowFailure", "type": "bool"},
+                    {"internalType": "bytes", "name": "callData", "type": "bytes"},
+                ],
+                "internalType": "struct Multicall3.Call3[]",
+                "name": "calls",
+                "type": "tuple[]",
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"internalType": "bool", "name": "success", "type": "bool"},
+                    {"internalType": "bytes", "name": "returnData", "type": "bytes"},
+                ],
+                "internalType": "struct Multicall3.Result[]",
+                "name": "returnData",
+                "type": "tuple[]",
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function",
+    }
+]
+
+
+# ------------------- HELPERS -------------------
+def _chunks(seq: Sequence[Any], size: int):
+    size = max(1, int(size))
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def _abi_type(item: Dict[str, Any]) -> str:
+    """ABI json entry -> canonical type string (expands tuples/structs)."""
+    typ = item["type"]
+    if typ.startswith("tuple"):
+        inner = ",".join(_abi_type(c) for c in item["components"])
+        return f"({inner}){typ[len('tuple'):]}"
+    return typ
+
+
+def _output_types(contract, fn_name: str) -> List[str]:
+    for entry in contract.abi:
+        if entry.get("type") == "function" and entry.get("name") == fn_name:
+            return [_abi_type(o) for o in entry.get("outputs", [])]
+    raise ValueError(f"{fn_name} not found in contract ABI")
+
+
+def _decode_token_data(w3: Web3, output_types: List[str], raw: bytes) -> tuple:
+    """Decode a getTokenData return blob into the same tuple `.call()` would return."""
+    (data,) = w3.codec.decode(output_types, raw)
+    data = list(data)
+    data[2] = Web3.to_checksum_address(data[2])  # assignedShopkeeper, as web3 normalizes it
+    return tuple(data)
+
+
+def _fetch_sequential(contract, token_ids: Sequence[int], block_identifier="latest") -> List[tuple]:
+    out = []
+    for tid in token_ids:
+        try:
+            out.append(contract.functions.getTokenData(tid).call(block_identifier=block_identifier))
+        except Exception as e:
+            logging.warning(f"Failed to fetch data for token {tid}: {e}")
+    return out
+
+
+# ------------------- MULTICALL3 -------------------
+def fetch_token_data_multicall(
+    w3: Web3,
+    contract,
+    token_ids: Sequence[int],
+    chunk_size: int = 200,
+    multicall_address: str = "0xcA11bde05977b3631167028862bE2a173976CA11",
+    block_identifier="latest",
+) -> List[tuple]:
+    """getTokenData for every id, `chunk_size` calls per Multicall3 aggregate3 eth_call."""
+    multicall = w3.eth.contract(address=Web3.to_checksum_address(multicall_address), abi=MULTICALL3_ABI)
+    output_types = _output_types(contract, "getTokenData")
+    target = contract.address
+
+    out: List[tuple] = []
+    for chunk in _chunks(list(token_ids), chunk_size):
+        calls = [(target, True, contract.encodeABI(fn_name="getTokenData", args=[tid])) for tid in chunk]
+        try:
+            results = multicall.functions.aggregate3(calls).call(block_identifier=block_identifier)
+        except Exception as e:
+            logging.warning(f"Multicall chunk of {len(chunk)} tokens failed ({e}); falling back to per-token calls")
+            out.extend(_fetch_sequential(contract, chunk, block_identifier))
+            continue
+
+        for tid, (success, raw) in zip(chunk, results):
+            if not success:
+                logging.warning(f"Failed to fetch data for token {tid}: call reverted")
+                continue
+            try:
+                out.append(_decode_token_data(w3, output_types, raw))
+            except Exception as e:
+                logging.warning(f"Failed to decode data for token {tid}: {e}")
+    return out
+
+
+# ------------------- JSON-RPC BATCH -------------------
+def fetch_token_data_rpc_batch(
+    rpc_url: str,
+    w3: Web3,
+    contract,
+    token_ids: Sequence[int],
+    chunk_size: int = 200,
+    block_identifier="latest",
+    session: Optional[requests.Session] = None,
+    timeout: float = 30,
+    pool=None,
+) -> List[tuple]:
+    """
+    getTokenData for every id, `chunk_size` eth_calls per JSON-RPC batch request.
+    With an RPCPool (see rpc_pool.py) batches go through its endpoint failover instead of `rpc_url`.
+    """
+    output_types = _output_types(contract, "getTokenData")
+    target = contract.address
+    block = block_identifier if isinstance(block_identifier, str) else hex(block_identifier)
+    session = session or requests.Session()
+
+    out: List[tuple] = []
+    for chunk in _chunks(list(token_ids), chunk_size):
+        payload = [
+            {
+                "jsonrpc": "2.0",
+                "id": i,
+                "method": "eth_call",
+                "params": [{"to": target, "data": contract.encodeABI(fn_name="getTokenData", args=[tid])}, block],
+            }
+            for i, tid in enumerate(chunk)
+        ]
+        try:
+            if pool is not None:
+                replies = json.loads(pool.post(json.dumps(payload), timeout=timeout))
+            else:
+                resp = session.post(rpc_url, json=payload, timeout=timeout)
+                resp.raise_for_status()
+                replies = resp.json()
+            if not isinstance(replies, list):
+                raise ValueError(f"batch not supported by endpoint: {replies}")
+        except Exception as e:
+            logging.warning(f"RPC batch of {len(chunk)} tokens failed ({e}); falling back to per-token calls")
+            out.extend(_fetch_sequential(contract, chunk, block_identifier))
+            continue
+
+        by_id = {r.get("id"): r for r in replies}
+        for i, tid in enumerate(chunk):
+            reply = by_id.get(i, {})
+            if "result" not in reply:
+                logging.warning(f"Failed to fetch data for token {tid}: {reply.get('error', 'no reply')}")
+                continue
+            try:
+                out.append(_decode_token_data(w3, output_types, Web3.to_bytes(hexstr=reply["result"])))
+            except Exception as e:
+                logging.warning(f"Failed to decode data for token {tid}: {e}")
+    return out
+
+
+# ------------------- ASYNC (bounded concurrency) -------------------
+class PooledAsyncHTTPProvider(AsyncHTTPProvider):
+    """
+    AsyncHTTPProvider that posts through a caller-owned aiohttp session (shared keep-alive
+    connection pool) with a per-request timeout. web3's built-in retry middleware is
+    dropped so retries/backoff are handled in one place (see _call_with_retry).
+
+    With an RPCPool, each request tries the pool's endpoints in its ranking order and fails
+    over on the same errors as RPCPool.post (429/5xx, timeouts, dropped connections,
+    rate-limit replies), reporting every outcome to the pool.
+    """
+    _middlewares = ()
+
+    def __init__(self, endpoint_uri: str, session: aiohttp.ClientSession, timeout: float = 10, pool=None):
+        super().__init__(endpoint_uri)
+        self._session = session
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self.pool = pool
+
+    async def _post(self, url: str, request_data: bytes) -> bytes:
+        async with self._session.post(
+            url, data=request_data, headers=self.get_request_headers(), timeout=self._timeout
+        ) as resp:
+            resp.raise_for_status()
+            raw_response = await resp.read()
+        # providers sometimes answer throttling with HTTP 200 + a JSON-RPC error
+        if b'"error"' in raw_response and _is_rate_limited(raw_response):
+            raise EndpointUnavailable(f"rate limited: {raw_response[:200]!r}")
+        return raw_response
+
+    async def make_request(self, method, params):
+        request_data = self.encode_rpc_request(method, params)
+        if self.pool is None:
+            return self.decode_rpc_response(await self._post(self.endpoint_uri, request_data))
+
+        errors = []
+        for url in self.pool.ranked_urls():
+            start = time.perf_counter()
+            try:
+                raw_response = await self._post(url, request_data)
+            except Exception as e:
+                if not _is_retryable(e):
+                    raise
+                self.pool.report_error(url, f"{type(e).__name__}: {e}")
+                errors.append(f"{url}: {e}")
+                continue
+            self.pool.report_ok(url, (time.perf_counter() - start) * 1000, failed_over=bool(errors))
+            return self.decode_rpc_response(raw_response)
+        raise EndpointUnavailable("all RPC endpoints failed: " + "; ".join(errors))
+
+
+def _is_retryable(exc: Exception) -> bool:
+    """429 / 5xx responses, timeouts, dropped connections and throttling are worth retrying; reverts are not."""
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status == 429 or exc.status >= 500
+    return isinstance(exc, (asyncio.TimeoutError, aiohttp.ClientConnectionError, EndpointUnavailable))
+
+
+async def _call_with_retry(make_call, retries: int, backoff: float):
+    for attempt in range(retries + 1):
+        try:
+            return await make_call()
+        except Exception as e:
+            if attempt >= retries or not _is_retryable(e):
+                raise
+            # exponential backoff with jitter so throttled workers don't retry in lockstep
+            await asyncio.sleep(backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+async def _fetch_async(
+    rpc_url: str,
+    contract_address: str,
+    abi: List[Dict[str, Any]],
+    token_ids: Sequence[int],
+    concurrency: int,
+    timeout: float,
+    retries: int,
+    backoff: float,
+    block_identifier,
+    pool=None,
+) -> List[Optional[tuple]]:
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=30)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        # no default middlewares: the validation layer would add an eth_chainId round-trip per call
+        w3 = AsyncWeb3(PooledAsyncHTTPProvider(rpc_url, session, timeout, pool), middlewares=[])
+        contract = w3.eth.contract(address=contract_address, abi=abi)
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(tid):
+            async with sem:
+                try:
+                    return await _call_with_retry(
+                        lambda: contract.functions.getTokenData(tid).call(block_identifier=block_identifier),
+                        retries, backoff,
+                    )
+                except Exception as e:
+                    logging.warning(f"Failed to fetch data for token {tid}: {e}")
+                    return None
+
+        # gather keeps results in token_ids order regardless of completion order
+        return await asyncio.gather(*(one(tid) for tid in token_ids))
+
+
+def fetch_token_data_async(
+    rpc_url: str,
+    contract,
+    token_ids: Sequence[int],
+    concurrency: int = 16,
+    timeout: float = 10,
+    retries: int = 4,
+    backoff: float = 0.5,
+    block_identifier="latest",
+    pool=None,
+) -> List[tuple]:
+    """
+    getTokenData for every id with at most `concurrency` requests in flight.
+    Blocking wrapper (runs its own event loop) so sync callers like fetch_tokens_data can use it.
+    With an RPCPool (see rpc_pool.py) requests fail over across its endpoints instead of `rpc_url`.
+    """
+    results = asyncio.run(_fetch_async(
+        rpc_url, contract.address, contract.abi, list(token_ids),
+        max(1, int(concurrency)), timeout, retries, backoff, block_identifier, pool,
+    ))
+    return [tuple(r) for r in results if r is not None]
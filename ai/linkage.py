@@ -0,0 +1,217 @@
+# =========================================================================================
+# linkage.py  —  Identity-linkage clusters across Aadhaar, family, location and issuer
+#
+# 🎯 Why
+#  Rules 10/11 only ask whether ONE Aadhaar shows up under several familyIds / locations.
+#  Ring fraud spreads over many Aadhaars: a handful of identities rotating through the same
+#  few families (and small locations / issuers), each one looking unremarkable on its own.
+#
+#  link_identities() builds the bipartite graph Aadhaar — {familyId, location, issuedBy}
+#  (one edge per distinct pair) and labels its connected components (scipy's csgraph, linear
+#  in nodes + edges; the distinct pairs come from one sort, so O(E log E) overall):
+#    - hub values (a city, a big issuer: more than `hub_limit` Aadhaars, or more than
+#      `hub_share` of all Aadhaars on small tables; never below a family-sized 5) are left out,
+#      they would join everyone; values with a single Aadhaar link nothing and are skipped too
+#    - a legitimate family is a star (Aadhaars -> one family node): a tree. Rings create
+#      cycles. Each component is scored by its cycle rank, edges - nodes + 1 = the number
+#      of redundant links; 0 for any tree, however large
+#    - a cluster is suspicious with >= min_aadhaars Aadhaars and >= min_cycles redundant links,
+#      >= min_rotating of its Aadhaars each in two or more of its shared families (a household
+#      sharing one family, location and issuer has redundant links too: nested attributes,
+#      not identities rotating through families), and at most max_cluster_share of the
+#      table's Aadhaars (on a small table few values are hubs and one component can hold
+#      nearly everyone: that is the population, not a ring)
+#  Cluster ids are the smallest tokenId in the cluster, so they stay stable while tokens
+#  are added. The identity_ring rule (rules.py, code 20) flags every token of a suspicious
+#  cluster; /clusters lists them.
+# =========================================================================================
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+LINK_COLUMNS = ["familyId", "location", "issuedBy"]
+HUB_LIMIT = 50
+HUB_SHARE = 0.01
+MAX_CLUSTER_SHARE = 0.25
+_HUB_FLOOR = 5  # a value shared by a family-sized group of Aadhaars is never a hub
+
+
+class Linkage:
+    """
+    Result of link_identities: `rows` (per token: cluster id or -1, Aadhaars and redundant
+    links of its cluster) and `clusters` (one row per suspicious cluster, most linked first).
+    """
+
+    def __init__(self, rows: pd.DataFrame, clusters: pd.DataFrame, stats: Dict[str, Any]):
+        self.rows = rows
+        self.clusters = clusters
+        self.stats = stats
+
+
+def _codes(df: pd.DataFrame, column: str, index: Any):
+    """(group code per row, number of groups), from the secondary index when it has the column."""
+    if index is not None and index.has(column):
+        return index.codes(column), index.groups(column)
+    col = df[column]
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return col.cat.codes.to_numpy().astype(np.int64), len(col.cat.categories)
+    codes, uniques = pd.factorize(col)
+    return codes.astype(np.int64), len(uniques)
+
+
+def _hub_limit(aadhaars: int, hub_limit: int, hub_share: float) -> float:
+    """Most Aadhaars an attribute value may link before it counts as a hub."""
+    return min(hub_limit, max(_HUB_FLOOR, hub_share * aadhaars))
+
+
+def link_identities(df: pd.DataFrame, columns: Sequence[str] = LINK_COLUMNS, hub_limit: int = HUB_LIMIT,
+                    hub_share: float = HUB_SHARE, min_aadhaars: int = 3, min_cycles: int = 2,
+                    min_rotating: int = 3, max_cluster_share: float = MAX_CLUSTER_SHARE, index: Any = None,
+                    population: Optional[int] = None) -> Linkage:
+    """
+    Connected components of the Aadhaar / attribute graph, scored; see module header.
+    `population`: Aadhaars of the whole table when df holds only some of its components (hub
+    values already blanked out); sets the hub limit and the cluster share instead of df's own count.
+    """
+    columns = [c for c in columns if c in df.columns]
+    min_rotating = min_rotating if "familyId" in columns else 0
+    aadhaar, n_aadhaar = _codes(df, "aadhaar", index)
+    present = _present(aadhaar) if population is None else population
+    limit = _hub_limit(present, hub_limit, hub_share)
+    src: List[np.ndarray] = []
+    dst: List[np.ndarray] = []
+    offset = n_aadhaar
+    hubs = 0
+    rotating = np.zeros(0, dtype=np.int64)  # Aadhaars linked to two or more shared families
+    for column in columns:
+        codes, groups = _codes(df, column, index)
+        valid = (aadhaar >= 0) & (codes >= 0)
+        pairs = np.unique(aadhaar[valid] * groups + codes[valid])  # distinct (Aadhaar, value) links
+        owner, value = pairs // groups, pairs % groups
+        degree = np.bincount(value, minlength=groups)
+        hubs += int((degree > limit).sum())
+        keep = (degree[value] >= 2) & (degree[value] <= limit)
+        src.append(owner[keep])
+        dst.append(offset + value[keep])
+        if column == "familyId":
+            rotating = np.flatnonzero(np.bincount(owner[keep], minlength=n_aadhaar) >= 2)
+        offset += groups
+    src_all = np.concatenate(src) if src else np.zeros(0, dtype=np.int64)
+    dst_all = np.concatenate(dst) if dst else np.zeros(0, dtype=np.int64)
+
+    graph = coo_matrix((np.ones(len(src_all), dtype=np.int8), (src_all, dst_all)), shape=(offset, offset))
+    n_components, label = connected_components(graph, directed=False)
+    attr_nodes = np.unique(dst_all)
+    aadhaars = np.bincount(label[:n_aadhaar], minlength=n_components)
+    attrs = np.bincount(label[attr_nodes], minlength=n_components)
+    edges = np.bincount(label[src_all], minlength=n_components)
+    cycles = np.where(edges > 0, edges - (aadhaars + attrs) + 1, 0)
+    rotators = np.bincount(label[rotating], minlength=n_components)
+    suspicious = ((aadhaars >= min_aadhaars) & (cycles >= min_cycles) & (rotators >= min_rotating)
+                  & (aadhaars <= max_cluster_share * present))
+
+    has = aadhaar >= 0
+    component = np.full(len(df), -1, dtype=np.int64)
+    component[has] = label[aadhaar[has]]
+    flagged = np.flatnonzero(has & suspicious[np.maximum(component, 0)])
+
+    cluster = np.full(len(df), -1, dtype=np.int64)
+    members = np.zeros(len(df), dtype=np.int64)
+    links = np.zeros(len(df), dtype=np.int64)
+    clusters = pd.DataFrame(columns=["cluster", "aadhaars", "tokens", "redundant_links"] + columns)
+    if len(flagged):
+        comp = component[flagged]
+        tids = df["tokenId"].to_numpy()[flagged]
+        first = pd.Series(tids).groupby(comp).min()  # cluster id: smallest tokenId of the cluster
+        cluster[flagged] = first.reindex(comp).to_numpy()
+        members[flagged] = aadhaars[comp]
+        links[flagged] = cycles[comp]
+        sub = df.iloc[flagged]
+        summary = {
+            "cluster": first,
+            "aadhaars": pd.Series(aadhaars[first.index], index=first.index),
+            "tokens": pd.Series(comp).value_counts(),
+            "redundant_links": pd.Series(cycles[first.index], index=first.index),
+            **{c: sub[c].groupby(comp, observed=True).nunique() for c in columns},
+        }
+        clusters = (pd.DataFrame(summary).sort_values(["redundant_links", "aadhaars", "cluster"],
+                                                      ascending=[False, False, True])
+                    .reset_index(drop=True))
+    rows = pd.DataFrame({"cluster": cluster, "aadhaars": members, "redundant_links": links}, index=df.index)
+    stats = {"aadhaars": int(n_aadhaar), "links": int(len(src_all)), "hub_values": hubs,
+             "components": int((edges > 0).sum()), "suspicious": int(suspicious.sum()),
+             "largest": int(aadhaars.max()) if n_components else 0}
+    return Linkage(rows, clusters, stats)
+
+
+def _present(codes: np.ndarray) -> int:
+    """Distinct codes actually used (categoricals may list unused values)."""
+    return int(np.count_nonzero(np.bincount(codes[codes >= 0]))) if (codes >= 0).any() else 0
+
+
+def cluster_members(df: pd.DataFrame, linkage: Linkage, cluster: int, limit: int = 20) -> Dict[str, List[Any]]:
+    """Distinct Aadhaars / families / locations / issuers of one cluster (at most `limit` each)."""
+    sub = df[(linkage.rows["cluster"] == cluster).to_numpy()]
+    return {c: sub[c].dropna().astype(str).unique()[:limit].tolist()
+            for c in ["aadhaar", *LINK_COLUMNS] if c in sub.columns}
+
+
+def _link_identities_unionfind(df: pd.DataFrame, columns: Sequence[str] = LINK_COLUMNS, hub_limit: int = HUB_LIMIT,
+                               hub_share: float = HUB_SHARE, min_aadhaars: int = 3, min_cycles: int = 2,
+                               min_rotating: int = 3,
+                               max_cluster_share: float = MAX_CLUSTER_SHARE) -> Dict[int, Optional[int]]:
+    """Plain union-find over the same graph, row by row: parity reference (tokenId -> cluster id or None)."""
+    parent: Dict[Any, Any] = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    pairs = set()
+    for column in [c for c in columns if c in df.columns]:
+        for aadhaar, value in zip(df["aadhaar"].tolist(), df[column].tolist()):
+            if not pd.isna(aadhaar) and not pd.isna(value):
+                pairs.add((aadhaar, (column, value)))
+    degree: Dict[Any, int] = {}
+    for _, node in pairs:
+        degree[node] = degree.get(node, 0) + 1
+    min_rotating = min_rotating if "familyId" in columns else 0
+    present = len({a for a in df["aadhaar"].tolist() if not pd.isna(a)})
+    limit = _hub_limit(present, hub_limit, hub_share)
+    edges = [(a, v) for a, v in pairs if 2 <= degree[v] <= limit]
+    for a, v in edges:
+        parent[find(a)] = find(v)
+    for aadhaar in df["aadhaar"].tolist():
+        if not pd.isna(aadhaar):
+            find(aadhaar)
+
+    nodes: Dict[Any, set] = {}
+    n_edges: Dict[Any, int] = {}
+    for node in list(parent):
+        nodes.setdefault(find(node), set()).add(node)
+    families: Dict[Any, int] = {}
+    for a, v in edges:
+        n_edges[find(a)] = n_edges.get(find(a), 0) + 1
+        if v[0] == "familyId":
+            families[a] = families.get(a, 0) + 1
+    out: Dict[int, Optional[int]] = {}
+    first: Dict[Any, int] = {}
+    for tid, aadhaar in zip(df["tokenId"].tolist(), df["aadhaar"].tolist()):
+        if pd.isna(aadhaar):
+            continue
+        root = find(aadhaar)
+        n_aadhaar = sum(1 for x in nodes[root] if not isinstance(x, tuple))
+        n_rotating = sum(1 for x in nodes[root] if not isinstance(x, tuple) and families.get(x, 0) >= 2)
+        cycles = n_edges.get(root, 0) - len(nodes[root]) + 1 if n_edges.get(root) else 0
+        if (n_aadhaar >= min_aadhaars and cycles >= min_cycles and n_rotating >= min_rotating
+                and n_aadhaar <= max_cluster_share * present):
+            first[root] = min(first.get(root, tid), tid)
+    for tid, aadhaar in zip(df["tokenId"].tolist(), df["aadhaar"].tolist()):
+        out[tid] = None if pd.isna(aadhaar) else first.get(find(aadhaar))
+    return out
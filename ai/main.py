@@ -5,8 +5,11 @@
 #  - Endpoints that return JSON with base64-embedded PNG images:
 #       GET /graph               -> main scatter (Ration Amount vs Claim Delay, anomalies marked)
 #       GET /graphs/patterns     -> (1) TokenID vs Aadhaar "pattern" scatter, (2) Anomaly-type bar chart
-#       GET /anomalies           -> anomaly counts + sample rule-based anomaly details
+#       GET /anomalies           -> anomaly counts + sample rule-based anomaly details + highest ML scores
 #       GET /latest              -> last scheduled run + current interpretation
+#       GET /aadhaar/{id}        -> one beneficiary's tokens, scored (no global refresh)
+#       GET /clusters            -> suspicious identity clusters (shared families / locations / issuers)
+#       GET /ensemble            -> several PyOD detectors combined into one ranked score, timed per detector
 #
 #  - Robust plotting (matplotlib) that avoids "StrCategoryConverter"/"sci()" errors.
 #  - CORS enabled for Next.js dev origins (http://localhost:3000 / http://127.0.0.1:3000).
@@ -54,14 +57,15 @@ import matplotlib.pyplot as plt
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning, module="sklearn")
 
-import io, base64, json, datetime, logging
-from collections import Counter, defaultdict
+import io, base64, json, datetime, itertools, logging, threading, time
+_PROCESS_START = time.perf_counter()  # for time-to-ready / time-to-first-response (see /health)
 from typing import Dict, List, Tuple, Any, Optional
 
+import numpy as np
 import pandas as pd
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 
 # 👉 If you're actually on-chain, keep these imports; otherwise stub them for local testing.
 from web3 import Web3
@@ -90,6 +94,32 @@ from apscheduler.schedulers.background import BackgroundScheduler
 
 # 🔧 Your RPC + contract address come from config.py
 from config import RPC_URL, CONTRACT_ADDRESS  # make sure config.py is present alongside main.py
+from config import RPC_URLS, RPC_POOL_SIZE, RPC_TIMEOUT, RPC_COOLDOWN
+from config import FETCH_MODE, FETCH_CHUNK_SIZE, MULTICALL3_ADDRESS
+from config import FETCH_CONCURRENCY, FETCH_TIMEOUT, FETCH_RETRIES, FETCH_BACKOFF
+from config import INCREMENTAL_SYNC, SYNC_BLOCK_RANGE, SYNC_CONFIRMATIONS, TOKEN_STORE_PATH, STARTUP_MODE
+from config import DISABLED_RULES, INCREMENTAL_RULES, RULE_SHARD_MIN_ROWS, RULE_WORKERS, MODEL_CACHE_SIZE
+from config import MODEL_WINDOW_DAYS, MODEL_MAX_TRAIN_ROWS, MODEL_REFIT_HOURS
+from config import STREAM_SCORING, STREAM_POLL_SECONDS, STREAM_WINDOW
+from config import ENSEMBLE_DETECTORS, ENSEMBLE_N_JOBS, ENSEMBLE_SAMPLE_ROWS, ENSEMBLE_WORKERS
+from ingestion import (_fetch_sequential, fetch_token_data_async, fetch_token_data_multicall,
+                       fetch_token_data_rpc_batch)
+from rpc_pool import RPCPool, PooledHTTPProvider
+from token_sync import TokenSync
+from token_store import TokenStore
+from features import FeatureCache, featurize_raw
+from schema import compact_tokens, memory_report
+from synthetic import demo_tokens
+from rules import detect_rule_based_anomalies, render_reasons, engine as rule_engine
+from incremental_rules import IncrementalRuleEvaluator
+from ensemble import EnsembleRunner
+from linkage import cluster_members, link_identities
+from model_cache import ModelCache, feature_matrix
+from model_lifecycle import ModelLifecycle
+from score_index import ScoreIndex
+from sharded_rules import ShardedRuleEvaluator
+from streaming import OnlineScorer
+from token_index import TokenIndex
 
 
 # ------------------- FASTAPI APP -------------------
@@ -121,7 +151,10 @@ logging.basicConfig(
 with open("DCVToken.json") as f:
     token_abi = json.load(f)
 
-w3 = Web3(Web3.HTTPProvider(RPC_URL))
+# One pooled keep-alive session per endpoint, routed by health/latency with failover
+rpc_pool = RPCPool(RPC_URLS, pool_size=RPC_POOL_SIZE, timeout=RPC_TIMEOUT, cooldown=RPC_COOLDOWN)
+w3 = Web3(PooledHTTPProvider(rpc_pool))
+logging.info(f"RPC pool: {len(rpc_pool.endpoints)} endpoint(s)")
 
 # Add POA middleware if needed (for Polygon and other POA networks)
 if POA_MIDDLEWARE is not None:
@@ -140,27 +173,52 @@ else:
 
 contract = w3.eth.contract(address=CONTRACT_ADDRESS, abi=token_abi)
 
-# Test blockchain connection
-try:
-    latest_block = w3.eth.get_block('latest')
-    logging.info(f"Connected to blockchain. Latest block: {latest_block.number}")
-    
-    # Test contract connection
+
+def _check_connection() -> bool:
+    """Test blockchain + contract connection (network calls; runs in the startup task)."""
     try:
-        token_count = len(contract.functions.getAllTokens().call())
-        logging.info(f"Contract connection successful. Found {token_count} tokens.")
-    except Exception as e:
-        logging.error(f"Contract connection failed: {e}")
-        logging.info("Application will continue with limited functionality")
+        latest_block = w3.eth.get_block('latest')
+        logging.info(f"Connected to blockchain. Latest block: {latest_block.number}")
         
-except Exception as e:
-    logging.error(f"Blockchain connection failed: {e}")
-    logging.info("Application will run in demo mode with sample data")
-    # You could set a flag here to use mock data if blockchain is unavailable
+        # Test contract connection
+        try:
+            token_count = len(contract.functions.getAllTokens().call())
+            logging.info(f"Contract connection successful. Found {token_count} tokens.")
+        except Exception as e:
+            logging.error(f"Contract connection failed: {e}")
+            logging.info("Application will continue with limited functionality")
+        return True
+
+    except Exception as e:
+        logging.error(f"Blockchain connection failed: {e}")
+        logging.info("Application will run in demo mode with sample data")
+        return False
 
 # ------------------- GLOBAL STORAGE -------------------
+token_sync = TokenSync(contract, lambda ids, block: _fetch_raw(ids, block), SYNC_BLOCK_RANGE, SYNC_CONFIRMATIONS)
+token_store = TokenStore(TOKEN_STORE_PATH)
+feature_cache = FeatureCache()  # featurized rows per token, reused while its getTokenData tuple is unchanged
 latest_df: Optional[pd.DataFrame] = None
 latest_results: Optional[Dict[str, Any]] = None
+latest_model: Optional[IForest] = None  # frozen model the last analysis scored with
+model_cache = ModelCache(MODEL_CACHE_SIZE)  # fitted models per feature matrix, shared by every endpoint
+# Fit on a rolling window in scheduled_job, score everything else against the frozen, persisted model
+model_lifecycle = ModelLifecycle(model_cache, token_store, window_days=MODEL_WINDOW_DAYS,
+                                 max_rows=MODEL_MAX_TRAIN_ROWS, refit_hours=MODEL_REFIT_HOURS)
+online_scorer = OnlineScorer(window=STREAM_WINDOW)  # half-space trees for tokens arriving between scheduled runs
+_analysis_lock = threading.Lock()  # scheduled_job / stream_job / score_aadhaar: one of them rewrites latest_df at a time
+
+# Readiness of the startup task (see /health)
+startup_state: Dict[str, Any] = {
+    "status": "starting",           # starting -> warm (persisted results served) -> ready | failed
+    "mode": STARTUP_MODE,
+    "warm_start": False,
+    "chain_connected": None,
+    "error": None,
+    "time_to_warm_ms": None,
+    "time_to_ready_ms": None,
+    "time_to_first_response_ms": None,
+}
 
 
 # ------------------- HELPERS -------------------
@@ -200,199 +258,117 @@ def _human_seconds(seconds: float) -> str:
 
 
 # ------------------- FETCH TOKEN DATA -------------------
-def fetch_tokens_data() -> pd.DataFrame:
-    """Fetch token data from blockchain and preprocess into DataFrame."""
-    try:
-        token_ids = contract.functions.getAllTokens().call()
-        logging.info(f"Found {len(token_ids)} tokens on blockchain")
-    except Exception as e:
-        logging.error(f"Failed to fetch token IDs: {e}")
-        # Return sample data for demo purposes
-        return _create_sample_data()
-    
-    records = []
+def _fetch_raw(token_ids, block_identifier="latest", mode: Optional[str] = None,
+               chunk_size: Optional[int] = None) -> List[tuple]:
+    """getTokenData tuples for `token_ids` using the configured ingestion mode (see ingestion.py)."""
+    mode = mode or FETCH_MODE
+    chunk_size = chunk_size or FETCH_CHUNK_SIZE
+    if mode == "multicall":
+        return fetch_token_data_multicall(w3, contract, token_ids, chunk_size, MULTICALL3_ADDRESS, block_identifier)
+    if mode == "rpc_batch":
+        return fetch_token_data_rpc_batch(RPC_URL, w3, contract, token_ids, chunk_size, block_identifier,
+                                          timeout=RPC_TIMEOUT, pool=rpc_pool)
+    if mode == "async":
+        # async mode keeps its own aiohttp session but routes / fails over through rpc_pool
+        return fetch_token_data_async(RPC_URL, contract, token_ids, FETCH_CONCURRENCY, FETCH_TIMEOUT,
+                                      FETCH_RETRIES, FETCH_BACKOFF, block_identifier, pool=rpc_pool)
+    return _fetch_sequential(contract, token_ids, block_identifier)
+
+
+def fetch_tokens_data(mode: Optional[str] = None, chunk_size: Optional[int] = None,
+                      incremental: Optional[bool] = None) -> pd.DataFrame:
+    """
+    Fetch token data from blockchain and preprocess into DataFrame.
+
+    mode: "multicall" | "rpc_batch" | "async" | "sequential" (defaults to FETCH_MODE from config.py).
+    Batched modes pack `chunk_size` getTokenData calls per request; "async" keeps up to
+    FETCH_CONCURRENCY calls in flight (see ingestion.py).
 
-    for tid in token_ids:
+    incremental: keep the token table between calls and only apply new TokenMinted /
+    TokenClaimed / TokenExpired logs (defaults to INCREMENTAL_SYNC, see token_sync.py).
+    The incremental path always fetches new rows with the configured FETCH_MODE.
+    """
+    incremental = INCREMENTAL_SYNC if incremental is None else incremental
+    if incremental:
         try:
-            data = contract.functions.getTokenData(tid).call()
-            issued = datetime.datetime.fromtimestamp(data[4])
-            expiry = datetime.datetime.fromtimestamp(data[5])
-            claim = datetime.datetime.fromtimestamp(data[6]) if data[6] > 0 else None
-
-            records.append({
-                "tokenId": data[0],
-                "aadhaar": str(data[1]),
-                "rationAmount": data[3],
-                "issuedTime": issued,
-                "expiryTime": expiry,
-                "claimTime": claim,
-                "isClaimed": data[7],
-                "isExpired": data[8],
-                "category": data[9],
-                # Optional extras if ABI has them at these indices:
-                "familyId": data[10] if len(data) > 10 else None,
-                "location": data[11] if len(data) > 11 else None,
-                "issuedBy": data[12] if len(data) > 12 else None,
-            })
+            token_sync.sync()
+            token_store.save_sync(token_sync)
+            raw = token_sync.records()
+            logging.info(f"Token table has {len(raw)} tokens after sync (block {token_sync.last_block})")
         except Exception as e:
-            logging.warning(f"Failed to fetch data for token {tid}: {e}")
-            continue
+            logging.error(f"Incremental token sync failed: {e}")
+            return _create_sample_data()
+    else:
+        try:
+            token_ids = contract.functions.getAllTokens().call()
+            logging.info(f"Found {len(token_ids)} tokens on blockchain")
+        except Exception as e:
+            logging.error(f"Failed to fetch token IDs: {e}")
+            # Return sample data for demo purposes
+            return _create_sample_data()
+        raw = _fetch_raw(token_ids, mode=mode, chunk_size=chunk_size)
 
-    if not records:
+    if not raw:
         logging.warning("No valid token records found, using sample data")
         return _create_sample_data()
 
-    df = pd.DataFrame(records)
-
-    # Feature engineering
-    df["claimDelay"] = (df["claimTime"] - df["issuedTime"]).dt.total_seconds().fillna(0)
-    df["claimDelay"] = df["claimDelay"].clip(lower=0)
-    df["oddHour"] = df["issuedTime"].dt.hour
-    df["month"] = df["issuedTime"].dt.month
-    df["year"] = df["issuedTime"].dt.year
-    df["expiredUsage"] = ((df["isExpired"]) & (df["isClaimed"])).astype(int)
+    df = feature_cache.frame(raw)  # only new / changed tuples are featurized (see features.py)
+    logging.info(f"Featurized {feature_cache.last_stats['featurized']}/{len(raw)} tokens "
+                 f"({feature_cache.last_stats['mode']}, {feature_cache.last_stats['ms']:.0f} ms)")
 
     logging.info(f"Successfully processed {len(df)} token records")
     return df
 
 
+def fetch_aadhaar_tokens(aadhaar: str) -> Tuple[pd.DataFrame, int]:
+    """
+    Targeted fetch of one beneficiary's tokens via getTokensByAadhaar (no getAllTokens sweep).
+    Returns (featurized DataFrame, total token count reported by getTotalTokensByAadhaar).
+    """
+    aadhaar_int = int(aadhaar)
+    token_ids = contract.functions.getTokensByAadhaar(aadhaar_int).call()
+    total = contract.functions.getTotalTokensByAadhaar(aadhaar_int).call()
+    raw = _fetch_raw(token_ids)
+    logging.info(f"Fetched {len(raw)}/{total} tokens for Aadhaar {_mask_aadhaar(aadhaar)}")
+    if not raw:
+        return pd.DataFrame(), int(total)
+    return featurize_raw(raw), int(total)
+
+
 def _create_sample_data() -> pd.DataFrame:
     """Create sample data for demo when blockchain is unavailable."""
-    import numpy as np
-    
-    np.random.seed(42)  # For reproducible demo data
-    n_samples = 20
-    
-    base_time = datetime.datetime.now() - datetime.timedelta(days=30)
-    
-    records = []
-    for i in range(n_samples):
-        issued_time = base_time + datetime.timedelta(
-            days=np.random.randint(0, 30),
-            hours=np.random.randint(0, 24)
-        )
-        
-        # Some tokens are claimed, some aren't
-        is_claimed = np.random.choice([True, False], p=[0.7, 0.3])
-        claim_time = None
-        if is_claimed:
-            claim_time = issued_time + datetime.timedelta(
-                hours=np.random.exponential(24)  # Exponential distribution for realistic delays
-            )
-        
-        expiry_time = issued_time + datetime.timedelta(days=30)
-        is_expired = datetime.datetime.now() > expiry_time
-        
-        records.append({
-            "tokenId": i + 1,
-            "aadhaar": str(np.random.randint(100000000000, 999999999999)),
-            "rationAmount": np.random.choice([5, 10, 15, 20, 25], p=[0.1, 0.3, 0.4, 0.15, 0.05]),
-            "issuedTime": issued_time,
-            "expiryTime": expiry_time,
-            "claimTime": claim_time,
-            "isClaimed": is_claimed,
-            "isExpired": is_expired,
-            "category": np.random.choice(["BPL", "APL", "Priority", "Antyodaya"]),
-            "familyId": f"FAM{np.random.randint(1000, 9999)}",
-            "location": np.random.choice(["Delhi", "Mumbai", "Kolkata", "Chennai"]),
-            "issuedBy": f"ISSUER{np.random.randint(1, 10)}"
-        })
-    
-    df = pd.DataFrame(records)
-    
-    # Feature engineering
-    df["claimDelay"] = (df["claimTime"] - df["issuedTime"]).dt.total_seconds().fillna(0)
-    df["claimDelay"] = df["claimDelay"].clip(lower=0)
-    df["oddHour"] = df["issuedTime"].dt.hour
-    df["month"] = df["issuedTime"].dt.month
-    df["year"] = df["issuedTime"].dt.year
-    df["expiredUsage"] = ((df["isExpired"]) & (df["isClaimed"])).astype(int)
-    
+    df = demo_tokens()  # reproducible demo data (see synthetic.py)
     logging.info(f"Created {len(df)} sample records for demo")
     return df
 
 
 # ------------------- RULE-BASED ANOMALIES -------------------
-def detect_rule_based_anomalies(df: pd.DataFrame) -> List[Dict[str, Any]]:
-    anomalies = []
-    avg_ration = df["rationAmount"].mean() if len(df) > 0 else 0
-
-    for _, row in df.iterrows():
-        reasons = []
-
-        # 1) Odd hour (midnight-5am)
-        if pd.notnull(row["issuedTime"]) and row["issuedTime"].hour < 5:
-            reasons.append(f"Delivery at unusual hour ({row['issuedTime'].strftime('%H:%M')})")
-
-        # 2) Expired token claimed
-        if row["isExpired"] and row["isClaimed"]:
-            reasons.append("Expired token was claimed")
-
-        # 3) Token expired without claim
-        if row["isExpired"] and not row["isClaimed"]:
-            reasons.append("Token expired without claim")
-
-        # 4) Multiple tokens same month for same Aadhaar
-        month_count = df[(df["aadhaar"] == row["aadhaar"]) &
-                         (df["month"] == row["month"]) &
-                         (df["year"] == row["year"])].shape[0]
-        if month_count > 1:
-            reasons.append(f"Multiple tokens issued for Aadhaar {row['aadhaar']} in {row['month']}/{row['year']}")
-
-        # 5/6) Unusually high/low ration allocation
-        if avg_ration > 0 and row["rationAmount"] > 2 * avg_ration:
-            reasons.append("Unusually high ration allocation")
-        if avg_ration > 0 and row["rationAmount"] < 0.5 * avg_ration:
-            reasons.append("Unusually low ration allocation")
-
-        # 7) Instant claim (<60s)
-        if pd.notnull(row["claimTime"]) and row["claimDelay"] < 60:
-            reasons.append(f"Claimed instantly after issue ({row['claimTime'].strftime('%H:%M')})")
-
-        # 8) Claim after expiry
-        if pd.notnull(row["claimTime"]) and row["claimTime"] > row["expiryTime"]:
-            reasons.append("Claim attempted after token expiry")
-
-        # 9) Invalid category
-        if row["category"] not in ["BPL", "APL", "Priority", "Antyodaya"]:
-            reasons.append(f"Unknown or invalid category '{row['category']}'")
-
-        # 10) Same Aadhaar across multiple familyIds
-        if row["familyId"] and (df[df["aadhaar"] == row["aadhaar"]]["familyId"].nunique() > 1):
-            reasons.append(f"Aadhaar {row['aadhaar']} linked to multiple family IDs")
-
-        # 11) Aadhaar used in multiple locations
-        if row["location"] and (df[df["aadhaar"] == row["aadhaar"]]["location"].nunique() > 1):
-            reasons.append(f"Aadhaar {row['aadhaar']} used in multiple locations")
-
-        # 12) Double claim (same tokenId marked claimed more than once)
-        if row["isClaimed"] and df[(df["tokenId"] == row["tokenId"]) & (df["isClaimed"] == True)].shape[0] > 1:
-            reasons.append("Token claimed more than once (double claim)")
-
-        # 13) Repeatedly unclaimed Aadhaar
-        unclaimed = df[(df["aadhaar"] == row["aadhaar"]) & (df["isClaimed"] == False)].shape[0]
-        if unclaimed > 3:
-            reasons.append(f"Aadhaar {row['aadhaar']} has {unclaimed} unclaimed tokens")
-
-        # 14) Suspicious issuer concentration
-        if row["issuedBy"] and df["issuedBy"].value_counts().max() > 0.9 * len(df):
-            reasons.append(f"Suspicious concentration: {row['issuedBy']} issued almost all tokens")
-
-        # 15) Spike: many tokens same day
-        day_count = df[df["issuedTime"].dt.date == row["issuedTime"].date()].shape[0]
-        if day_count > (df.shape[0] / max(1, df["issuedTime"].dt.date.nunique())) * 2:
-            reasons.append(f"Spike: unusually high number of tokens issued on {row['issuedTime'].date()}")
-
-        if reasons:
-            anomalies.append({
-                "tokenId": row["tokenId"],
-                "aadhaar": row["aadhaar"],
-                "issuedAt": row["issuedTime"].strftime("%d-%m-%Y %H:%M") if pd.notnull(row["issuedTime"]) else None,
-                "claimAt": row["claimTime"].strftime("%d-%m-%Y %H:%M") if pd.notnull(row["claimTime"]) else None,
-                "reasons": reasons
-            })
-
-    return anomalies
+# detect_rule_based_anomalies lives in rules.py (rule registry + columnar engine)
+for _rule in DISABLED_RULES:
+    if _rule in rule_engine.rules:
+        rule_engine.disable(_rule)
+    else:
+        logging.warning(f"DISABLED_RULES: unknown rule '{_rule}'")
+
+# Full evaluations spread over Aadhaar-hash shards in RULE_WORKERS processes, forked here before
+# the scheduler threads start (sharded_rules.py); in-process when RULE_WORKERS <= 1
+sharded_evaluator = ShardedRuleEvaluator(rule_engine, RULE_WORKERS, RULE_SHARD_MIN_ROWS).start()
+# PyOD detectors for /ensemble, one per process in ENSEMBLE_WORKERS processes (ensemble.py), forked here too
+ensemble_runner = EnsembleRunner(ENSEMBLE_WORKERS, ENSEMBLE_N_JOBS, ENSEMBLE_SAMPLE_ROWS).start()
+# Refreshes re-score only new/changed tokens and the groups they touch (full run on the first call)
+rule_evaluator = IncrementalRuleEvaluator(rule_engine, full_evaluate=sharded_evaluator.evaluate)
+# Aadhaar / family / location / issuer / day -> row positions of the current table (token_index.py)
+token_index = TokenIndex()
+# Tokens of the last analysed table ranked by ml_score, for top-K / threshold queries (score_index.py)
+score_index = ScoreIndex()
+
+
+def _rule_anomalies(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Rule hits for the whole (refreshed) token table; refreshes the secondary indexes on the way."""
+    index = token_index.refresh(df)
+    if INCREMENTAL_RULES:
+        return rule_evaluator.evaluate(df, index=index)
+    return sharded_evaluator.evaluate(df, index=index)
 
 
 # ------------------- ML ANOMALIES -------------------
@@ -400,20 +376,102 @@ def run_anomaly_detection(df: pd.DataFrame) -> Dict[str, Any]:
     if df.empty:
         return {"ml_detected": 0, "rule_detected": 0, "details": []}
 
-    features = df[["rationAmount", "claimDelay", "oddHour", "expiredUsage"]].values
-    model = IForest(random_state=42)  # stable results
-    model.fit(features)
-    df["ml_anomaly"] = model.predict(features)  # 1=outlier, 0=normal
+    global latest_model
+    scores, labels = model_lifecycle.score(df)  # frozen model; fitted here only before the first scheduled fit
+    df["ml_score"] = scores.astype(np.float32)  # decision score, higher = more anomalous
+    df["ml_anomaly"] = labels  # 1=outlier, 0=normal (ml_score > ml_threshold)
+    latest_model = model_lifecycle.artifact.model
+    score_index.refresh(df)
 
-    rule_anomalies = detect_rule_based_anomalies(df)
+    rule_anomalies = _rule_anomalies(df)
 
     return {
         "ml_detected": int(df["ml_anomaly"].sum()),
+        "ml_threshold": model_lifecycle.artifact.threshold,
         "rule_detected": len(rule_anomalies),
         "details": rule_anomalies,
     }
 
 
+def _ranked_tokens(df: pd.DataFrame, limit: int, min_score: Optional[float] = None,
+                   show_full_aadhaar: bool = False) -> List[Dict[str, Any]]:
+    """Highest ml_score tokens of df, highest first, from score_index (O(limit)); min_score keeps scores >= it."""
+    if "ml_score" not in df.columns:
+        return []
+    if not score_index.covers(df):
+        score_index.refresh(df)
+    positions = score_index.top(limit) if min_score is None else score_index.above(min_score, limit)
+    rows = df.iloc[positions]
+    return [
+        {"tokenId": int(tid), "aadhaar": str(a) if show_full_aadhaar else _mask_aadhaar(a),
+         "ml_score": round(float(score), 4), "ml_anomaly": int(ml)}
+        for tid, a, score, ml in zip(rows["tokenId"], rows["aadhaar"], rows["ml_score"], rows["ml_anomaly"])
+    ]
+
+
+def score_aadhaar(aadhaar: str) -> Dict[str, Any]:
+    """
+    Fetch + score one Aadhaar's tokens and merge them into latest_df, without a global refresh.
+    ML verdicts come from the frozen model (only the new tokens are scored); rules are evaluated against the merged cache
+    so the population-level rules (ration average, issuer share, day spikes) keep their context.
+    """
+    global latest_df, latest_results
+    sub, total = fetch_aadhaar_tokens(aadhaar)
+    if sub.empty:
+        return {"aadhaar": str(aadhaar), "total_tokens": total, "tokens_fetched": 0,
+                "ml_anomalies": 0, "rule_based_anomalies": 0, "anomaly_details": [], "tokens": []}
+
+    with _analysis_lock:  # merge into the latest_df scheduled_job / stream_job may be replacing
+        base = latest_df if latest_df is not None else pd.DataFrame(columns=sub.columns)
+        merged = pd.concat([base[~base["tokenId"].isin(sub["tokenId"])], sub], ignore_index=True)
+        merged = compact_tokens(merged.sort_values("tokenId", ignore_index=True))  # concat widens mismatched categoricals
+
+        scores, labels = model_lifecycle.score(merged)
+        merged["ml_anomaly"] = labels
+        merged["ml_score"] = scores.astype(np.float32)
+        token_ids = sub["tokenId"].tolist()
+        hits = detect_rule_based_anomalies(merged, token_ids)
+        latest_df = merged
+        if latest_results is not None:
+            # this Aadhaar's rule hits replace its old ones; other tokens keep theirs until the next run
+            mine = set(token_ids)
+            kept = [d for d in latest_results.get("details", []) if d["tokenId"] not in mine]
+            details_all = sorted(kept + hits, key=lambda d: d["tokenId"])
+            latest_results = {**latest_results, "ml_detected": int(merged["ml_anomaly"].sum()),
+                              "rule_detected": len(details_all), "details": details_all}
+
+    details = render_reasons(hits)
+    rows = merged[merged["tokenId"].isin(sub["tokenId"])]
+    return {
+        "aadhaar": str(aadhaar),
+        "total_tokens": total,
+        "tokens_fetched": len(rows),
+        "ml_anomalies": int(rows["ml_anomaly"].sum()),
+        "rule_based_anomalies": len(details),
+        "anomaly_details": details,
+        "tokens": _token_summaries(rows),
+    }
+
+
+def _token_summaries(rows: pd.DataFrame, keys: Tuple[str, ...] = ()) -> List[Dict[str, Any]]:
+    """Per-token JSON for drill-down responses; `keys` adds those columns (e.g. location) as-is."""
+    return [
+        {
+            "tokenId": int(r["tokenId"]),
+            **{k: (None if pd.isna(r[k]) else str(r[k])) for k in keys},
+            "rationAmount": int(r["rationAmount"]),
+            "category": r["category"],
+            "issuedAt": r["issuedTime"].strftime("%d-%m-%Y %H:%M"),
+            "claimAt": r["claimTime"].strftime("%d-%m-%Y %H:%M") if pd.notnull(r["claimTime"]) else None,
+            "isClaimed": bool(r["isClaimed"]),
+            "isExpired": bool(r["isExpired"]),
+            "ml_anomaly": int(r["ml_anomaly"]) if "ml_anomaly" in r else None,
+            "ml_score": round(float(r["ml_score"]), 4) if pd.notna(r.get("ml_score")) else None,
+        }
+        for _, r in rows.iterrows()
+    ]
+
+
 # ------------------- INTERPRETATION -------------------
 def interpret_graph(df: pd.DataFrame) -> Dict[str, Any]:
     if df.empty:
@@ -480,10 +538,9 @@ def generate_main_scatter_payload(df: pd.DataFrame) -> Dict[str, Any]:
     """Scatter of Ration Amount vs Claim Delay with anomalies marked (x=amount, y=delay)."""
     if "ml_anomaly" not in df.columns:
         # ensure anomalies exist (e.g., if /graph called before /anomalies)
-        features = df[["rationAmount", "claimDelay", "oddHour", "expiredUsage"]].values
-        model = IForest(random_state=42)
-        model.fit(features)
-        df["ml_anomaly"] = model.predict(features)
+        scores, labels = model_lifecycle.score(df)
+        df["ml_anomaly"] = labels
+        df["ml_score"] = scores.astype(np.float32)
 
     # Coerce numeric safely
     x = pd.to_numeric(df.get("rationAmount"), errors="coerce")
@@ -547,10 +604,9 @@ def _token_vs_aadhaar_scatter(df: pd.DataFrame, show_full_aadhaar: bool = False)
 
     # Ensure ml_anomaly exists
     if "ml_anomaly" not in dfx.columns:
-        features = dfx[["rationAmount", "claimDelay", "oddHour", "expiredUsage"]].values
-        model = IForest(random_state=42)
-        model.fit(features)
-        dfx["ml_anomaly"] = model.predict(features)
+        scores, ml_labels = model_lifecycle.score(dfx)
+        dfx["ml_anomaly"] = ml_labels
+        dfx["ml_score"] = scores.astype(np.float32)
 
     fig, ax = plt.subplots(figsize=(10, 6))
     if dfx.empty:
@@ -592,18 +648,18 @@ def _token_vs_aadhaar_scatter(df: pd.DataFrame, show_full_aadhaar: bool = False)
 
 def _anomaly_type_bar(rule_anomalies: List[Dict[str, Any]]) -> Tuple[str, Dict[str, int]]:
     """
-    Bar chart of rule-based anomaly type counts (by reason text).
+    Bar chart of rule-based anomaly type counts (by reason code, labelled with the rule's type).
     Returns (image_b64, counts_dict).
     """
-    # Flatten reasons
-    all_reasons: List[str] = []
-    for item in rule_anomalies:
-        all_reasons.extend(item.get("reasons", []))
-    counts = Counter(all_reasons)
+    # Flatten reason codes and count them
+    codes = np.fromiter(itertools.chain.from_iterable(item["codes"] for item in rule_anomalies), dtype=np.int64)
+    per_code = np.bincount(codes) if len(codes) else np.zeros(0, dtype=np.int64)
+    present = np.flatnonzero(per_code)
+    counts = {rule_engine.label(c): int(per_code[c]) for c in present[np.argsort(-per_code[present], kind="stable")]}
 
     # If there are many, show the top-K on the chart
     K = 15
-    most_common = counts.most_common(K)
+    most_common = list(counts.items())[:K]
 
     fig, ax = plt.subplots(figsize=(10, 6))
     if not most_common:
@@ -624,18 +680,117 @@ def _anomaly_type_bar(rule_anomalies: List[Dict[str, Any]]) -> Tuple[str, Dict[s
 # ------------------- SCHEDULER -------------------
 def scheduled_job():
     global latest_df, latest_results
-    df = fetch_tokens_data()
-    results = run_anomaly_detection(df)
-    latest_df, latest_results = df, results
+    with _analysis_lock:
+        df = fetch_tokens_data()
+        if not df.empty and model_lifecycle.due():
+            model_lifecycle.fit(df)  # rolling-window refit; every other call scores against the frozen model
+        results = run_anomaly_detection(df)
+        latest_df, latest_results = df, results
+        _stream_events(push=False)  # batch verdicts stand; the online trees still learn the new tokens
+    try:
+        token_store.save_analysis(df, results)
+    except Exception as e:
+        logging.warning(f"[Store] Could not persist analysis: {e}")
     logging.info(f"[Scheduler] Anomaly detection updated at {datetime.datetime.now()}")
 
 
+def _stream_events(push: bool) -> int:
+    """Score tokens changed by logs since the last call with the online trees; push=True upserts them into latest_df."""
+    global latest_df, latest_results
+    rows = token_sync.drain_events()
+    if not rows or latest_df is None or latest_df.empty:
+        return 0
+    if not online_scorer.ready:
+        online_scorer.seed(feature_matrix(latest_df))
+    new = featurize_raw(rows)
+    _, labels = online_scorer.score(new["tokenId"].to_numpy(), feature_matrix(new))
+    if push:
+        new["ml_anomaly"] = labels
+        new["ml_score"] = np.float32(np.nan)  # online scores are on another scale: unranked until the next run
+        merged = pd.concat([latest_df[~latest_df["tokenId"].isin(new["tokenId"])], new], ignore_index=True)
+        latest_df = compact_tokens(merged.sort_values("tokenId", ignore_index=True))
+        latest_results = {**(latest_results or {}), "ml_detected": int(latest_df["ml_anomaly"].sum())}
+    return len(rows)
+
+
+def stream_job():
+    """Poll new logs between scheduled runs and give the changed tokens an online ML verdict (see streaming.py)."""
+    if latest_df is None or not _analysis_lock.acquire(blocking=False):
+        return  # nothing to push into yet, or a scheduled run is scoring everything anyway
+    try:
+        token_sync.sync()
+        token_store.save_sync(token_sync)
+        scored = _stream_events(push=True)
+        if scored:
+            logging.info(f"[Stream] Scored {scored} changed tokens online ({online_scorer.us_per_token} µs/token)")
+    except Exception as e:
+        logging.warning(f"[Stream] Poll failed: {e}")
+    finally:
+        _analysis_lock.release()
+
+
+def _warm_start() -> bool:
+    """Load the token table, checkpoint, model and last analysis from the token store (see token_store.py)."""
+    global latest_df, latest_results
+    started = time.perf_counter()
+    try:
+        rows, last_block, reorg_state = token_store.load_tokens()
+        if rows:
+            token_sync.load(rows, last_block, reorg_state)
+        model_lifecycle.load()  # frozen detector: restarts score with it instead of refitting
+        df, results = token_store.load_analysis()
+    except Exception as e:
+        logging.warning(f"[Store] Warm start failed, doing a full first run: {e}")
+        return False
+    if df is None or results is None:
+        return False
+    latest_df, latest_results = df, results
+    logging.info(f"[Store] Warm start: {len(rows)} tokens (block {last_block}), {len(df)} analysed rows "
+                 f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return True
+
+
+def _elapsed_ms() -> float:
+    return round((time.perf_counter() - _PROCESS_START) * 1000, 1)
+
+
+def _startup_task():
+    """Connection test + first (or catch-up) analysis, off the import path in lazy mode."""
+    try:
+        startup_state["chain_connected"] = _check_connection()
+        scheduled_job()
+        startup_state["status"] = "ready"
+        startup_state["time_to_ready_ms"] = _elapsed_ms()
+        logging.info(f"[Startup] Ready after {startup_state['time_to_ready_ms']} ms")
+    except Exception as e:
+        startup_state["status"] = "warm" if startup_state["warm_start"] else "failed"
+        startup_state["error"] = str(e)
+        logging.error(f"[Startup] First analysis failed: {e}")
+
+
 scheduler = BackgroundScheduler()
 scheduler.add_job(scheduled_job, "interval", hours=3)
+if STREAM_SCORING and INCREMENTAL_SYNC:
+    scheduler.add_job(stream_job, "interval", seconds=STREAM_POLL_SECONDS, max_instances=1)
 if not scheduler.running:
     scheduler.start()
-# Run once on startup
-scheduled_job()
+if _warm_start():
+    # Serve the persisted results now; catch up with the chain in the background
+    startup_state.update(status="warm", warm_start=True, time_to_warm_ms=_elapsed_ms())
+if STARTUP_MODE == "eager":
+    # Block the import until connected and analysed (old behaviour)
+    _startup_task()
+else:
+    scheduler.add_job(_startup_task)
+
+
+@app.middleware("http")
+async def _first_response_timer(request, call_next):
+    response = await call_next(request)
+    if startup_state["time_to_first_response_ms"] is None:
+        startup_state["time_to_first_response_ms"] = _elapsed_ms()
+        logging.info(f"[Startup] First response after {startup_state['time_to_first_response_ms']} ms")
+    return response
 
 
 # ------------------- API ROUTES -------------------
@@ -648,16 +803,61 @@ def root():
         return HTMLResponse("<h1>Ration Anomaly API is running 🚀</h1><p>Visit /graph, /anomalies, /latest, or /graphs/patterns for API endpoints.</p>")
 
 
+@app.get("/health")
+def health():
+    """
+    Readiness probe: 200 once results can be served (warm cache or first analysis done),
+    503 while the startup task is still connecting / analysing.
+    """
+    can_serve = latest_df is not None
+    body = {
+        **startup_state,
+        "can_serve": can_serve,
+        "uptime_ms": _elapsed_ms(),
+        "cached_records": 0 if latest_df is None else len(latest_df),
+        "table_memory": None if latest_df is None else
+        {k: v for k, v in memory_report(latest_df).items() if k != "columns"},
+        "featurize": feature_cache.last_stats,
+        "model_cache": model_cache.stats(),
+        "model": model_lifecycle.stats(),
+        "streaming": online_scorer.stats(),
+        "index": token_index.last_stats,
+        "score_index": score_index.last_stats,
+        "sync_block": token_sync.last_block,
+        "rpc": rpc_pool.stats(),
+    }
+    return JSONResponse(body, status_code=200 if can_serve else 503)
+
+
+@app.get("/rules")
+def rules():
+    """Rule registry (enabled flags, columns, shared aggregates) + cost of the last evaluation."""
+    return {"rules": rule_engine.describe(), "last_evaluation": rule_engine.last_stats,
+            "incremental": rule_evaluator.last_stats if INCREMENTAL_RULES else None,
+            "sharded": sharded_evaluator.last_stats}
+
+
 @app.get("/anomalies")
-def anomalies(limit: int = 10):
+def anomalies(limit: int = 10, min_score: Optional[float] = None, show_full_aadhaar: bool = False):
+    """
+    Counts + the first `limit` rule-based anomalies + the `limit` tokens with the highest ML
+    anomaly score (`top_ml_tokens`, highest first). With `min_score`, only tokens scoring at
+    least that much are listed and `ml_tokens_above_min_score` counts all of them
+    (`ml_threshold` is the score above which ml_anomaly = 1).
+    """
     df = fetch_tokens_data()
     result = run_anomaly_detection(df)
-    return {
+    body = {
         "total_records": len(df),
         "ml_anomalies": result["ml_detected"],
+        "ml_threshold": result.get("ml_threshold"),
         "rule_based_anomalies": result["rule_detected"],
-        "anomaly_details": result["details"][:limit],
+        "anomaly_details": render_reasons(result["details"][:limit]),
+        "top_ml_tokens": _ranked_tokens(df, limit, min_score, show_full_aadhaar),
     }
+    if min_score is not None and not df.empty:
+        body["ml_tokens_above_min_score"] = score_index.count_above(min_score)
+    return body
 
 
 @app.get("/graph")
@@ -693,6 +893,7 @@ def get_latest_results():
     interp = interpret_graph(latest_df)
     return {
         **latest_results,
+        "reason_codes": rule_engine.legend(),
         "graph_interpretation": {
             "insights": interp["insights"],
             "stats": interp["stats"],
@@ -700,6 +901,107 @@ def get_latest_results():
     }
 
 
+@app.get("/aadhaar/{aadhaar_id}")
+def get_aadhaar(aadhaar_id: str):
+    """
+    Drill into one beneficiary: fetches only that Aadhaar's tokens (getTokensByAadhaar),
+    scores them and merges them into the cache. Does NOT trigger a global refresh.
+    """
+    if not aadhaar_id.isdigit():
+        raise HTTPException(status_code=400, detail="aadhaar_id must be numeric")
+    try:
+        return score_aadhaar(aadhaar_id)
+    except Exception as e:
+        logging.error(f"Aadhaar lookup failed: {e}")
+        raise HTTPException(status_code=502, detail="Could not fetch tokens for this Aadhaar from the chain")
+
+
+@app.get("/tokens")
+def get_tokens(aadhaar: Optional[str] = None, familyId: Optional[str] = None, location: Optional[str] = None,
+               issuedBy: Optional[str] = None, day: Optional[str] = None, limit: int = 100):
+    """
+    Cached tokens matching every given filter (day = YYYY-MM-DD of issue), answered from the
+    secondary indexes — no table scan, no chain call.
+    """
+    df = latest_df
+    if df is None:
+        return {"message": "No scheduled results yet"}
+    start = time.perf_counter()
+    if not token_index.covers(df):  # e.g. after an /aadhaar merge
+        token_index.refresh(df)
+    filters = {"aadhaar": aadhaar, "familyId": familyId, "location": location, "issuedBy": issuedBy, "issueDay": day}
+    filters = {k: v for k, v in filters.items() if v is not None}
+    unknown = [k for k in filters if not token_index.has(k)]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"No such column in the token table: {unknown}")
+    rows = token_index.lookup(**filters)
+    lookup_ms = round((time.perf_counter() - start) * 1000, 3)
+    return {
+        "filters": filters,
+        "matches": len(rows),
+        "lookup_ms": lookup_ms,
+        "tokens": _token_summaries(df.iloc[rows[:max(limit, 0)]], ("aadhaar", "familyId", "location", "issuedBy")),
+    }
+
+
+@app.get("/clusters")
+def get_clusters(limit: int = 10, show_full_aadhaar: bool = False):
+    """
+    Suspicious identity clusters (linkage.py): Aadhaars tied together through shared families /
+    locations / issuers, most redundant links first, with their members. The cluster ids are
+    the "cluster" field of identity_ring anomalies.
+    """
+    df = latest_df
+    if df is None:
+        return {"message": "No scheduled results yet"}
+    if not token_index.covers(df):
+        token_index.refresh(df)
+    start = time.perf_counter()
+    linkage = link_identities(df, index=token_index)
+    clusters = []
+    for c in linkage.clusters.head(max(limit, 0)).to_dict("records"):
+        members = cluster_members(df, linkage, c["cluster"])
+        if not show_full_aadhaar:
+            members["aadhaar"] = [_mask_aadhaar(a) for a in members["aadhaar"]]
+        clusters.append({**{k: int(v) for k, v in c.items()}, "members": members})
+    return {
+        "total_clusters": len(linkage.clusters),
+        "graph": linkage.stats,
+        "ms": round((time.perf_counter() - start) * 1000, 3),
+        "clusters": clusters,
+    }
+
+
+@app.get("/ensemble")
+def get_ensemble(detectors: Optional[str] = None, limit: int = 10, show_full_aadhaar: bool = False):
+    """
+    Ensemble of PyOD detectors (ensemble.py) over the cached table: each fitted on the same sample
+    and run in parallel, scores standardized and averaged into one ranked outlier score. Returns
+    fit / score / CPU time per detector and the `limit` highest-ranked tokens.
+    `detectors`: comma-separated subset of iforest,hbos,copod,ecod,lof (default ENSEMBLE_DETECTORS).
+    """
+    df = latest_df
+    if df is None:
+        return {"message": "No scheduled results yet"}
+    names = [d.strip() for d in detectors.split(",") if d.strip()] if detectors else ENSEMBLE_DETECTORS
+    try:
+        result = ensemble_runner.run(df, names)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    top = result.top(max(limit, 0))
+    rows = df.loc[top.index]
+    tokens = [
+        {"tokenId": int(tid),
+         "aadhaar": str(a) if show_full_aadhaar else _mask_aadhaar(a),
+         "ml_anomaly": int(ml) if pd.notna(ml) else None,
+         "scores": {k: round(float(v), 4) for k, v in scores.items()}}
+        for tid, a, ml, scores in zip(rows["tokenId"], rows["aadhaar"],
+                                      rows.get("ml_anomaly", pd.Series(np.nan, index=rows.index)),
+                                      top.to_dict("records"))
+    ]
+    return {**result.stats, "combination": "mean of standardized scores", "top": tokens}
+
+
 @app.get("/graphs/patterns")
 def get_patterns(show_full_aadhaar: bool = False):
     """
@@ -720,7 +1022,7 @@ def get_patterns(show_full_aadhaar: bool = False):
         latest_df = df
 
     # Build rule-based anomalies for the bar chart
-    rule_details = detect_rule_based_anomalies(latest_df)
+    rule_details = _rule_anomalies(latest_df)
     bar_b64, counts = _anomaly_type_bar(rule_details)
 
     # Build token vs aadhaar pattern (annotate tokenId on anomaly points)
@@ -0,0 +1,90 @@
+# =========================================================================================
+# model_cache.py  —  Fitted IsolationForest models, shared across endpoints
+#
+# 🎯 Why
+#  run_anomaly_detection, generate_main_scatter_payload and _token_vs_aadhaar_scatter each
+#  fitted IForest(random_state=42) from scratch, so one dashboard load (/anomalies, /graph,
+#  /graphs/patterns, or the Gradio handlers in app.py, which call the same functions) fitted
+#  the same model on the same rows two or three times, and /anomalies refitted on every call
+#  even when the chain had not changed.
+#
+#  ModelCache.fit_predict() keys each fit by a fingerprint of the feature matrix (blake2b of
+#  its float64 bytes + shape) and of the model config, and keeps the fitted model with its
+#  training labels (pyod's labels_ == predict() on the training rows, so a hit costs no
+#  predict either). A bounded LRU (MODEL_CACHE_SIZE) holds a few matrices, e.g. the full
+#  table and a freshly merged one. Hit / miss counters and fit time are in stats()
+#  (/health "model_cache").
+# =========================================================================================
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pyod.models.iforest import IForest
+
+MODEL_FEATURES = ["rationAmount", "claimDelay", "oddHour", "expiredUsage"]
+MODEL_CONFIG: Dict[str, Any] = {"random_state": 42}  # stable results
+
+
+def feature_matrix(df: pd.DataFrame) -> np.ndarray:
+    """The model's input: MODEL_FEATURES as one contiguous float64 matrix."""
+    return np.ascontiguousarray(df[MODEL_FEATURES].to_numpy(dtype=np.float64))
+
+
+def fingerprint(features: np.ndarray, config: Dict[str, Any]) -> str:
+    """Cache key: hash of the matrix values + shape, and of the model config."""
+    features = np.ascontiguousarray(features, dtype=np.float64)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((features.shape, sorted(config.items()))).encode())
+    h.update(features.tobytes())
+    return h.hexdigest()
+
+
+class ModelCache:
+    """LRU of fitted IForest models (with their training labels) keyed by fingerprint()."""
+
+    def __init__(self, max_entries: int = 4, config: Optional[Dict[str, Any]] = None):
+        self.max_entries = max(1, max_entries)
+        self.config = dict(MODEL_CONFIG if config is None else config)
+        self._entries: "OrderedDict[str, Tuple[IForest, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fit_ms = 0.0
+        self.last_key: Optional[str] = None
+
+    def fit_predict(self, features: np.ndarray) -> Tuple[IForest, np.ndarray]:
+        """(model fitted on `features`, its 0/1 labels for those rows), fitted at most once per matrix."""
+        key = fingerprint(features, self.config)
+        with self._lock:  # concurrent requests for the same matrix wait for one fit
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                start = time.perf_counter()
+                model = IForest(**self.config)
+                model.fit(features)
+                entry = (model, model.labels_.copy())  # 1=outlier, 0=normal
+                self.fit_ms += (time.perf_counter() - start) * 1000
+                self.misses += 1
+                self._entries[key] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            self.last_key = key
+            model, labels = entry
+            return model, labels.copy()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "hits": self.hits,
+                    "misses": self.misses, "hit_rate": round(self.hits / total, 3) if total else None,
+                    "fit_ms": round(self.fit_ms, 3), "config": self.config}
@@ -0,0 +1,179 @@
+# =========================================================================================
+# model_lifecycle.py  —  Fit once on a rolling window, score many against the frozen model
+#
+# 🎯 Why
+#  Every analysis fitted IForest on all tokens and predicted on the same tokens, so an ML
+#  verdict cost a full fit, and a token's verdict could flip on any refresh simply because
+#  the population around it moved.
+#
+#  ModelLifecycle separates the two:
+#    - fit(df)   : the scheduler (scheduled_job, at most every MODEL_REFIT_HOURS) fits a
+#                  detector on a rolling training window — tokens issued in the last
+#                  MODEL_WINDOW_DAYS, at most MODEL_MAX_TRAIN_ROWS of the newest — and
+#                  freezes it as a ModelArtifact: the detector, its feature schema and its
+#                  decision threshold (pyod's threshold_: predict() == score > threshold).
+#                  The artifact is persisted in the token store, so a restart scores with
+#                  the same model instead of refitting.
+#    - score(df) : decision_function of the frozen model; labels are score > threshold.
+#                  Scores are remembered per tokenId, so tokens whose features did not
+#                  change since the last call are not scored again — a refresh or an
+#                  Aadhaar drill-down only pays for new / changed tokens (microseconds
+#                  per token in batch instead of a refit), and verdicts stay the same
+#                  until the next refit.
+#  An artifact whose feature schema or library versions differ from the running code is
+#  ignored and refitted.
+# =========================================================================================
+import datetime
+import logging
+import pickle
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from model_cache import MODEL_FEATURES, ModelCache, feature_matrix
+
+
+class ModelArtifact:
+    """A frozen detector: fitted model + the feature schema, threshold and window it was fitted with."""
+
+    def __init__(self, model: Any, meta: Dict[str, Any]):
+        self.model = model
+        self.meta = meta
+
+    @property
+    def version(self) -> int:
+        return self.meta["version"]
+
+    @property
+    def threshold(self) -> float:
+        return self.meta["threshold"]
+
+    def compatible(self) -> bool:
+        """Same features and sklearn as the running code (pickles do not survive either changing)."""
+        return self.meta.get("features") == MODEL_FEATURES and self.meta.get("sklearn") == sklearn.__version__
+
+
+class ModelLifecycle:
+    """Owns the current ModelArtifact: rolling-window fits, persistence and memoized scoring."""
+
+    def __init__(self, cache: ModelCache, store: Any = None, window_days: float = 90,
+                 max_rows: int = 200_000, refit_hours: float = 24, min_rows: int = 256):
+        self.cache = cache          # fits go through the shared model cache (same window -> no refit)
+        self.store = store          # TokenStore, or None for in-memory only
+        self.window_days = window_days
+        self.max_rows = max_rows
+        self.refit_hours = refit_hours
+        self.min_rows = min_rows    # never train on fewer rows than this while the table has them
+        self.artifact: Optional[ModelArtifact] = None
+        self._lock = threading.RLock()
+        self._memo: Optional[Tuple[int, pd.Index, np.ndarray, np.ndarray]] = None  # version, tokenIds, X, scores
+        self.last_fit: Optional[Dict[str, Any]] = None
+        self.last_score: Optional[Dict[str, Any]] = None
+
+    # ------------------- TRAINING -------------------
+    def window(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Rolling training window: tokens issued in the last `window_days` (newest `max_rows`, at least `min_rows`)."""
+        if "issuedTime" not in df.columns or df["issuedTime"].isna().all():
+            return df.tail(self.max_rows)
+        order = df.sort_values("issuedTime", kind="stable", na_position="first")
+        recent = order["issuedTime"] >= order["issuedTime"].max() - pd.Timedelta(days=self.window_days)
+        size = min(max(int(recent.sum()), self.min_rows), self.max_rows)
+        return order.tail(size)
+
+    def due(self) -> bool:
+        """No usable model yet, or the current one is older than `refit_hours`."""
+        if self.artifact is None:
+            return True
+        age = time.time() - self.artifact.meta["trained_at"]
+        return age >= self.refit_hours * 3600
+
+    def fit(self, df: pd.DataFrame) -> ModelArtifact:
+        """Fit on the rolling window, freeze, persist; scores are recomputed against the new version."""
+        with self._lock:
+            start = time.perf_counter()
+            train = self.window(df)
+            model, _ = self.cache.fit_predict(feature_matrix(train))
+            issued = train["issuedTime"] if "issuedTime" in train.columns else pd.Series(dtype="datetime64[s]")
+            meta = {
+                "features": list(MODEL_FEATURES),
+                "config": dict(self.cache.config),
+                "threshold": float(model.threshold_),
+                "contamination": float(model.contamination),
+                "trained_at": time.time(),
+                "window": {"rows": len(train), "days": self.window_days,
+                           "from": None if issued.isna().all() else str(issued.min()),
+                           "to": None if issued.isna().all() else str(issued.max())},
+                "sklearn": sklearn.__version__,
+            }
+            meta["version"] = (self.artifact.version + 1) if self.artifact else 1
+            if self.store is not None:
+                try:
+                    meta["version"] = self.store.save_model(meta, pickle.dumps(model))
+                except Exception as e:
+                    logging.warning(f"[Model] Could not persist model: {e}")
+            self.artifact = ModelArtifact(model, meta)
+            self._memo = None
+            self.last_fit = {"version": meta["version"], "rows": len(train),
+                             "ms": round((time.perf_counter() - start) * 1000, 3)}
+            logging.info(f"[Model] Fitted v{meta['version']} on {len(train)} tokens "
+                         f"({meta['window']['from']} .. {meta['window']['to']}) in {self.last_fit['ms']:.0f} ms")
+            return self.artifact
+
+    def load(self) -> bool:
+        """Adopt the newest persisted artifact if it matches the running feature schema."""
+        if self.store is None:
+            return False
+        try:
+            meta, blob = self.store.load_model()
+            if meta is None:
+                return False
+            artifact = ModelArtifact(pickle.loads(blob), meta)
+        except Exception as e:
+            logging.warning(f"[Model] Could not load persisted model: {e}")
+            return False
+        if not artifact.compatible():
+            logging.info(f"[Model] Persisted model v{meta.get('version')} does not match the feature schema, refitting")
+            return False
+        with self._lock:
+            self.artifact, self._memo = artifact, None
+        logging.info(f"[Model] Loaded v{artifact.version} trained at "
+                     f"{datetime.datetime.fromtimestamp(meta['trained_at'])}")
+        return True
+
+    # ------------------- SCORING -------------------
+    def score(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """(decision scores, 0/1 labels) of every row against the frozen model; fits first if there is none."""
+        with self._lock:
+            artifact = self.artifact or self.fit(df)
+            start = time.perf_counter()
+            features = feature_matrix(df)
+            scores = np.empty(len(df), dtype=np.float64)
+            todo = np.ones(len(df), dtype=bool)
+            tids = pd.Index(df["tokenId"]) if "tokenId" in df.columns else None
+            if self._memo is not None and self._memo[0] == artifact.version and tids is not None:
+                _, memo_ids, memo_x, memo_scores = self._memo
+                pos = memo_ids.get_indexer(tids) if memo_ids.is_unique else np.full(len(df), -1)
+                known = np.flatnonzero(pos >= 0)
+                same = known[(memo_x[pos[known]] == features[known]).all(axis=1)]
+                scores[same] = memo_scores[pos[same]]
+                todo[same] = False
+            model_start = time.perf_counter()
+            if todo.any():
+                scores[todo] = artifact.model.decision_function(features[todo])
+            model_ms = (time.perf_counter() - model_start) * 1000
+            if tids is not None and tids.is_unique:
+                self._memo = (artifact.version, tids, features, scores.copy())
+            scored = int(todo.sum())
+            ms = (time.perf_counter() - start) * 1000
+            self.last_score = {"version": artifact.version, "rows": len(df), "scored": scored,
+                               "reused": len(df) - scored, "ms": round(ms, 3), "model_ms": round(model_ms, 3),
+                               "us_per_token": round(ms * 1000 / len(df), 3) if len(df) else None}
+            return scores, (scores > artifact.threshold).astype(int)
+
+    def stats(self) -> Dict[str, Any]:
+        meta = None if self.artifact is None else {k: v for k, v in self.artifact.meta.items() if k != "config"}
+        return {"model": meta, "due": self.due(), "last_fit": self.last_fit, "last_score": self.last_score}
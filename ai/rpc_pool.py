@@ -0,0 +1,237 @@
+# =========================================================================================
+# rpc_pool.py  —  Multi-endpoint JSON-RPC client with pooled sessions and failover
+#
+# 🎯 Why
+#  All chain access went through one Web3.HTTPProvider on a single RPC_URL: web3's default
+#  session (10 pooled connections), no failover, and one slow or rate-limited provider
+#  stalls every refresh. When it went down, fetch_tokens_data fell back to sample data.
+#
+#  RPCPool takes a list of endpoints (RPC_URLS) and keeps one keep-alive requests.Session
+#  per endpoint with a sized connection pool. Every call is routed to the healthiest,
+#  fastest endpoint:
+#
+#    - healthy endpoints first, ordered by latency (EWMA; unmeasured endpoints get probed)
+#    - transport errors, timeouts, HTTP 429/5xx and provider rate-limit errors fail over to
+#      the next endpoint and put the failing one in a cooldown that doubles per consecutive
+#      failure (capped), so a flapping provider is not hammered
+#    - endpoints in cooldown are still tried last; if every endpoint fails the whole list is
+#      retried `retries` more times with backoff (replaces web3's per-provider retry)
+#    - contract reverts and other JSON-RPC errors are real answers and are NOT failed over
+#
+#  PooledHTTPProvider plugs the pool into web3, so contract calls, TokenSync's eth_getLogs
+#  and Multicall3 all get failover. RPCPool.post() does the same for raw JSON-RPC batches
+#  (rpc_batch mode), the async aiohttp path reports into the same counters (ranked_urls /
+#  report_ok / report_error), and stats() exposes per-endpoint latency/errors for /health.
+# =========================================================================================
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3.providers.rpc import HTTPProvider
+
+# JSON-RPC error codes providers use for throttling / capacity (worth trying another endpoint)
+_RETRYABLE_RPC_CODES = {-32005, -32029, 429}
+
+
+def _is_rate_limited(body: bytes) -> bool:
+    try:
+        replies = json.loads(body)
+    except ValueError:
+        return False
+    for reply in replies if isinstance(replies, list) else [replies]:
+        error = reply.get("error") if isinstance(reply, dict) else None
+        if isinstance(error, dict) and error.get("code") in _RETRYABLE_RPC_CODES:
+            return True
+    return False
+
+
+class EndpointUnavailable(Exception):
+    """Transport-level failure of one endpoint (the call may succeed elsewhere)."""
+
+
+class _Endpoint:
+    def __init__(self, url: str, pool_size: int):
+        self.url = url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.latency_ms: Optional[float] = None  # EWMA of successful calls
+        self.last_error: Optional[str] = None
+        self.cooldown_until = 0.0
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.cooldown_until <= now,
+            "requests": self.requests,
+            "errors": self.errors,
+            "consecutive_errors": self.consecutive_errors,
+            "latency_ms": None if self.latency_ms is None else round(self.latency_ms, 1),
+            "cooldown_s": round(max(0.0, self.cooldown_until - now), 1),
+            "last_error": self.last_error,
+        }
+
+
+class RPCPool:
+    """Routes JSON-RPC POSTs across several endpoints by health and latency."""
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        pool_size: int = 32,
+        timeout: float = 15,
+        cooldown: float = 30,
+        max_cooldown: float = 600,
+        ewma_alpha: float = 0.2,
+        retries: int = 2,
+        backoff: float = 0.5,
+    ):
+        urls = [u for u in urls if u]
+        if not urls:
+            raise ValueError("RPCPool needs at least one endpoint URL")
+        self.endpoints = [_Endpoint(u, max(1, int(pool_size))) for u in urls]
+        self.timeout = timeout
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.ewma_alpha = ewma_alpha
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        self.failovers = 0
+        self._lock = threading.Lock()
+
+    # ------------------- ROUTING -------------------
+    def _ranked(self) -> List[_Endpoint]:
+        now = time.monotonic()
+        with self._lock:
+            healthy = [e for e in self.endpoints if e.cooldown_until <= now]
+            cooling = [e for e in self.endpoints if e.cooldown_until > now]
+        # unmeasured endpoints sort first (latency 0) so each one gets probed once
+        healthy.sort(key=lambda e: e.latency_ms or 0.0)
+        cooling.sort(key=lambda e: e.cooldown_until)
+        return healthy + cooling
+
+    def best_url(self) -> str:
+        """URL of the endpoint the next call would go to (for clients with their own transport)."""
+        return self._ranked()[0].url
+
+    # clients with their own HTTP stack (ingestion.py's aiohttp path) route by the same ranking
+    # and report each outcome back, so cooldowns, failover counts and /health cover them too
+    def ranked_urls(self) -> List[str]:
+        """Endpoint URLs in the order post() would try them."""
+        return [e.url for e in self._ranked()]
+
+    def report_ok(self, url: str, elapsed_ms: float, failed_over: bool = False) -> None:
+        self._record_ok(self._endpoint(url), elapsed_ms)
+        if failed_over:
+            with self._lock:
+                self.failovers += 1
+
+    def report_error(self, url: str, error: str) -> None:
+        self._record_error(self._endpoint(url), error)
+
+    def _endpoint(self, url: str) -> _Endpoint:
+        return next(e for e in self.endpoints if e.url == url)
+
+    def _record_ok(self, ep: _Endpoint, elapsed_ms: float) -> None:
+        with self._lock:
+            ep.requests += 1
+            ep.consecutive_errors = 0
+            ep.cooldown_until = 0.0
+            ep.latency_ms = elapsed_ms if ep.latency_ms is None else (
+                self.ewma_alpha * elapsed_ms + (1 - self.ewma_alpha) * ep.latency_ms)
+
+    def _record_error(self, ep: _Endpoint, error: str) -> None:
+        with self._lock:
+            ep.requests += 1
+            ep.errors += 1
+            ep.consecutive_errors += 1
+            ep.last_error = error
+            backoff = min(self.max_cooldown, self.cooldown * 2 ** (ep.consecutive_errors - 1))
+            ep.cooldown_until = time.monotonic() + backoff
+        logging.warning(f"[RPC] {ep.url} failed ({error}); cooling down for {backoff:.0f}s")
+
+    # ------------------- TRANSPORT -------------------
+    def _post_once(self, ep: _Endpoint, data: Any, headers: Optional[Dict[str, str]], timeout: float) -> bytes:
+        try:
+            resp = ep.session.post(ep.url, data=data, headers=headers, timeout=timeout)
+        except requests.RequestException as e:
+            raise EndpointUnavailable(f"{type(e).__name__}: {e}") from e
+        if resp.status_code == 429 or resp.status_code >= 500:
+            raise EndpointUnavailable(f"HTTP {resp.status_code}")
+        resp.raise_for_status()
+        body = resp.content
+        # providers sometimes answer throttling with HTTP 200 + a JSON-RPC error
+        if b'"error"' in body and _is_rate_limited(body):
+            raise EndpointUnavailable(f"rate limited: {body[:200]!r}")
+        return body
+
+    def post(self, data: Any, headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None) -> bytes:
+        """POST a JSON-RPC request (or batch) body; fail over across endpoints. Returns the raw response."""
+        headers = headers or {"Content-Type": "application/json"}
+        timeout = self.timeout if timeout is None else timeout
+        errors = []
+        for round_ in range(self.retries + 1):
+            if round_:
+                time.sleep(self.backoff * 2 ** (round_ - 1))
+            for ep in self._ranked():
+                start = time.perf_counter()
+                try:
+                    body = self._post_once(ep, data, headers, timeout)
+                except EndpointUnavailable as e:
+                    self._record_error(ep, str(e))
+                    errors.append(f"{ep.url}: {e}")
+                    continue
+                self._record_ok(ep, (time.perf_counter() - start) * 1000)
+                if errors:
+                    with self._lock:
+                        self.failovers += 1
+                return body
+        raise EndpointUnavailable("all RPC endpoints failed: " + "; ".join(errors[-len(self.endpoints):]))
+
+    # ------------------- STATS -------------------
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "failovers": self.failovers,
+                "endpoints": [e.stats(now) for e in self.endpoints],
+            }
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """
+    Web3 HTTP provider that sends every request through an RPCPool. web3's retry middleware
+    is dropped: retrying the same endpoint is what the pool's failover replaces.
+
+    eth_chainId is answered from cache after the first call: web3's validation middleware
+    asks for it before every eth_call, which doubled the round-trips of per-token calls.
+    """
+    _middlewares = ()
+
+    def __init__(self, pool: RPCPool, request_kwargs: Optional[Dict[str, Any]] = None):
+        super().__init__(pool.endpoints[0].url, request_kwargs=request_kwargs)
+        self.pool = pool
+        self._chain_id: Optional[Any] = None
+
+    def __str__(self) -> str:
+        return f"RPC pool {[e.url for e in self.pool.endpoints]}"
+
+    def make_request(self, method, params):
+        if method == "eth_chainId" and self._chain_id is not None:
+            return {"jsonrpc": "2.0", "id": next(self.request_counter), "result": self._chain_id}
+        request_data = self.encode_rpc_request(method, params)
+        kwargs = self.get_request_kwargs()
+        raw_response = self.pool.post(request_data, headers=kwargs.get("headers"), timeout=kwargs.get("timeout"))
+        response = self.decode_rpc_response(raw_response)
+        if method == "eth_chainId" and "result" in response:
+            self._chain_id = response["result"]
+        return response
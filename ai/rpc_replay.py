@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+# =========================================================================================
+# rpc_replay.py  —  Recorded-RPC stand-in node for offline ingestion benchmarks
+#
+# 🎯 Why
+#  fetch_tokens_data could only be exercised against the live Alchemy endpoint; the demo
+#  fallback (_create_sample_data) skips the RPC code path entirely. This module serves
+#  recorded chain responses from a local JSON fixture over real HTTP JSON-RPC, so every
+#  ingestion mode, TokenSync and the RPC pool can be measured and regression-checked offline.
+#
+#    python rpc_replay.py record --rpc-url $NEXT_PUBLIC_RPC_URL --contract 0x... --out fixture.json
+#    python rpc_replay.py synth --tokens 5000 --out fixture.json        # no chain needed
+#    python rpc_replay.py serve fixture.json --port 8545 --latency-ms 40 --error-rate 0.05
+#
+#  Then point NEXT_PUBLIC_RPC_URL / RPC_URLS (and DCVTOKEN_ADDRESS) at it, or use
+#  `benchmark.py ingest --replay fixture.json`.
+#
+#  Fixture: eth_call results keyed by calldata (getAllTokens, getTokenData, the
+#  getTokensByAadhaar pair, ...), raw eth_getLogs entries and the head block. Served:
+#    eth_chainId, eth_blockNumber, eth_getBlockByNumber, eth_call (incl. Multicall3
+#    aggregate3, answered per inner call), eth_getLogs — single requests and batches.
+#
+#  Injected faults, per HTTP request: `latency_ms` (+ uniform `jitter_ms`), `error_rate`
+#  (HTTP 500), `rate_limit_rate` (HTTP 429). Counters are on ReplayNode.stats.
+# =========================================================================================
+import argparse
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import requests
+from eth_abi import decode, encode
+from eth_utils import encode_hex, event_abi_to_log_topic, keccak
+from web3 import Web3
+
+from ingestion import MULTICALL3_ABI, _chunks, _output_types
+
+DEFAULT_CONTRACT = "0x00000000000000000000000000000000000DC070"
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+
+def _load_abi() -> List[Dict[str, Any]]:
+    with open("DCVToken.json") as f:
+        return json.load(f)
+
+
+def _offline_contract(address: str):
+    """Contract object used only for ABI encoding (never talks to a node)."""
+    w3 = Web3()
+    return w3, w3.eth.contract(address=Web3.to_checksum_address(address), abi=_load_abi())
+
+
+def _block_hash(number: int) -> str:
+    return encode_hex(keccak(b"replay-block" + number.to_bytes(32, "big")))
+
+
+# ------------------- RECORD -------------------
+def _rpc(session: requests.Session, url: str, method: str, params: list) -> Any:
+    reply = session.post(url, json={"jsonrpc": "2.0", "id": 1, "method": method, "params": params}, timeout=60).json()
+    if "error" in reply:
+        raise RuntimeError(f"{method} failed: {reply['error']}")
+    return reply["result"]
+
+
+def record_fixture(rpc_url: str, contract_address: str, limit: int = 0, from_block: int = 0,
+                   block_range: int = 2000, chunk_size: int = 200) -> Dict[str, Any]:
+    """Snapshot getAllTokens, getTokenData (+ per-Aadhaar lookups) and DCVToken logs at the current head."""
+    w3, contract = _offline_contract(contract_address)
+    session = requests.Session()
+    head = int(_rpc(session, rpc_url, "eth_blockNumber", []), 16)
+    block = hex(head)
+    calls: Dict[str, str] = {}
+
+    def call(data: str) -> str:
+        calls[data] = _rpc(session, rpc_url, "eth_call", [{"to": contract.address, "data": data}, block])
+        return calls[data]
+
+    all_data = contract.encodeABI(fn_name="getAllTokens")
+    (token_ids,) = w3.codec.decode(_output_types(contract, "getAllTokens"), Web3.to_bytes(hexstr=call(all_data)))
+    token_ids = list(token_ids)[:limit] if limit else list(token_ids)
+    if limit:
+        calls[all_data] = encode_hex(encode(["uint256[]"], [token_ids]))
+    logging.info(f"[Replay] Recording {len(token_ids)} tokens at block {head}")
+
+    output_types = _output_types(contract, "getTokenData")
+    aadhaars = set()
+    for chunk in _chunks(token_ids, chunk_size):
+        payload = [{"jsonrpc": "2.0", "id": i, "method": "eth_call",
+                    "params": [{"to": contract.address, "data": contract.encodeABI(fn_name="getTokenData", args=[t])}, block]}
+                   for i, t in enumerate(chunk)]
+        for reply in session.post(rpc_url, json=payload, timeout=60).json():
+            if "result" in reply:
+                calls[payload[reply["id"]]["params"][0]["data"]] = reply["result"]
+                (data,) = w3.codec.decode(output_types, Web3.to_bytes(hexstr=reply["result"]))
+                aadhaars.add(int(data[1]))
+    for aadhaar in aadhaars:
+        call(contract.encodeABI(fn_name="getTokensByAadhaar", args=[aadhaar]))
+        call(contract.encodeABI(fn_name="getTotalTokensByAadhaar", args=[aadhaar]))
+
+    logs = []
+    for start in range(from_block, head + 1, block_range):
+        logs.extend(_rpc(session, rpc_url, "eth_getLogs", [{
+            "address": contract.address, "fromBlock": hex(start), "toBlock": hex(min(head, start + block_range - 1))}]))
+    chain_id = _rpc(session, rpc_url, "eth_chainId", [])
+    return {"contract": contract.address, "chain_id": chain_id, "block_number": head, "calls": calls, "logs": logs}
+
+
+# ------------------- SYNTHESIZE -------------------
+def synthetic_fixture(n_tokens: int = 1000, seed: int = 42, contract_address: str = DEFAULT_CONTRACT,
+                      claim_rate: float = 0.7, tokens_per_block: int = 5) -> Dict[str, Any]:
+    """Fixture with `n_tokens` generated tokens and matching TokenMinted/TokenClaimed logs."""
+    rng = random.Random(seed)
+    w3, contract = _offline_contract(contract_address)
+    output_types = _output_types(contract, "getTokenData")
+    topics = {e["name"]: encode_hex(event_abi_to_log_topic(e))
+              for e in contract.abi if e.get("type") == "event"}
+
+    now = int(time.time())
+    start_block = 1_000_000
+    aadhaars = [rng.randint(100000000000, 999999999999) for _ in range(max(1, n_tokens // 3))]
+    shopkeepers = [Web3.to_checksum_address(encode_hex(keccak(text=f"shop{i}"))[-40:]) for i in range(10)]
+    calls: Dict[str, str] = {}
+    logs: List[Dict[str, Any]] = []
+    by_aadhaar: Dict[int, List[int]] = {}
+
+    def log(name: str, block: int, tid: int, aadhaar: int, data: bytes) -> Dict[str, Any]:
+        return {
+            "address": contract.address, "blockNumber": hex(block), "blockHash": _block_hash(block),
+            "transactionHash": encode_hex(keccak(f"{name}{tid}".encode())), "transactionIndex": "0x0",
+            "logIndex": hex(len(logs)), "removed": False, "data": encode_hex(data),
+            "topics": [topics[name], encode_hex(tid.to_bytes(32, "big")), encode_hex(aadhaar.to_bytes(32, "big"))],
+        }
+
+    for tid in range(1, n_tokens + 1):
+        aadhaar = rng.choice(aadhaars)
+        issued = now - rng.randint(0, 30 * 86400)
+        expiry = issued + 30 * 86400
+        claimed = rng.random() < claim_rate
+        claim_time = issued + int(rng.expovariate(1 / 86400)) if claimed else 0
+        row = (tid, aadhaar, rng.choice(shopkeepers), rng.choice([5, 10, 15, 20, 25]), issued, expiry,
+               claim_time, claimed, expiry < now and not claimed, rng.choice(["BPL", "APL", "Priority", "Antyodaya"]))
+        calls[contract.encodeABI(fn_name="getTokenData", args=[tid])] = encode_hex(encode(output_types, [row]))
+        by_aadhaar.setdefault(aadhaar, []).append(tid)
+
+        block = start_block + (tid - 1) // max(1, tokens_per_block)
+        logs.append(log("TokenMinted", block, tid, aadhaar, encode(["uint256", "uint256"], [row[3], expiry])))
+        if claimed:
+            logs.append(log("TokenClaimed", block + 1, tid, aadhaar, encode(["uint256"], [claim_time])))
+
+    calls[contract.encodeABI(fn_name="getAllTokens")] = encode_hex(encode(["uint256[]"], [list(range(1, n_tokens + 1))]))
+    for aadhaar, tids in by_aadhaar.items():
+        calls[contract.encodeABI(fn_name="getTokensByAadhaar", args=[aadhaar])] = encode_hex(encode(["uint256[]"], [tids]))
+        calls[contract.encodeABI(fn_name="getTotalTokensByAadhaar", args=[aadhaar])] = encode_hex(encode(["uint256"], [len(tids)]))
+
+    logs.sort(key=lambda entry: int(entry["blockNumber"], 16))
+    head = int(logs[-1]["blockNumber"], 16) + 1 if logs else start_block
+    return {"contract": contract.address, "chain_id": "0x13882", "block_number": head, "calls": calls, "logs": logs}
+
+
+# ------------------- SERVE -------------------
+class ReplayNode:
+    """Threaded HTTP JSON-RPC server answering from a fixture, with injectable latency/faults."""
+
+    def __init__(self, fixture: Dict[str, Any], host: str = "127.0.0.1", port: int = 0,
+                 latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0,
+                 rate_limit_rate: float = 0, seed: Optional[int] = None):
+        self.fixture = fixture
+        self.contract = fixture["contract"].lower()
+        self.head = int(fixture["block_number"])
+        self.calls = {k.lower(): v for k, v in fixture["calls"].items()}
+        self.logs = sorted(fixture["logs"], key=lambda entry: int(entry["blockNumber"], 16))
+        self.hashes = {int(entry["blockNumber"], 16): entry["blockHash"] for entry in self.logs}
+        self.latency_ms, self.jitter_ms = latency_ms, jitter_ms
+        self.error_rate, self.rate_limit_rate = error_rate, rate_limit_rate
+        self.stats = {"http_requests": 0, "rpc_calls": 0, "errors_injected": 0, "rate_limited": 0, "misses": 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._multicall = Web3().eth.contract(address=MULTICALL3_ADDRESS, abi=MULTICALL3_ABI)
+        self._aggregate3 = self._multicall.encodeABI(fn_name="aggregate3", args=[[]])[:10]
+
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # keep-alive, like a real provider
+            disable_nagle_algorithm = True  # headers + body are separate writes
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status, payload = node._handle(body)
+                out = json.dumps(payload).encode() if payload is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "ReplayNode":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "ReplayNode":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # ------------------- REQUEST HANDLING -------------------
+    def _handle(self, body: bytes):
+        with self._lock:
+            self.stats["http_requests"] += 1
+            roll = self._rng.random()
+            delay = self.latency_ms + self._rng.uniform(0, self.jitter_ms)
+        if delay:
+            time.sleep(delay / 1000)
+        if roll < self.error_rate:
+            with self._lock:
+                self.stats["errors_injected"] += 1
+            return 500, None
+        if roll < self.error_rate + self.rate_limit_rate:
+            with self._lock:
+                self.stats["rate_limited"] += 1
+            return 429, None
+
+        request = json.loads(body)
+        if isinstance(request, list):
+            return 200, [self._dispatch(r) for r in request]
+        return 200, self._dispatch(request)
+
+    def _dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self.stats["rpc_calls"] += 1
+        reply = {"jsonrpc": "2.0", "id": request.get("id")}
+        try:
+            reply["result"] = self._answer(request["method"], request.get("params", []))
+        except KeyError as e:
+            with self._lock:
+                self.stats["misses"] += 1
+            reply["error"] = {"code": -32000, "message": f"execution reverted: not in fixture ({e})"}
+        except NotImplementedError:
+            reply["error"] = {"code": -32601, "message": f"method {request['method']} not supported by replay node"}
+        return reply
+
+    def _block_number(self, tag: Any) -> int:
+        if tag in (None, "latest", "safe", "finalized", "pending"):
+            return self.head
+        if tag == "earliest":
+            return 0
+        return int(tag, 16)
+
+    def _answer(self, method: str, params: list) -> Any:
+        if method == "eth_chainId":
+            return self.fixture.get("chain_id", "0x1")
+        if method == "net_version":
+            return str(int(self.fixture.get("chain_id", "0x1"), 16))
+        if method == "eth_blockNumber":
+            return hex(self.head)
+        if method == "eth_getBlockByNumber":
+            number = self._block_number(params[0])
+            if number > self.head:
+                return None
+            return {"number": hex(number), "hash": self.hashes.get(number, _block_hash(number)),
+                    "parentHash": self.hashes.get(number - 1, _block_hash(number - 1)),
+                    "timestamp": hex(int(time.time()) - 2 * (self.head - number)), "transactions": []}
+        if method == "eth_call":
+            return self._call(params[0]["to"], params[0]["data"])
+        if method == "eth_getLogs":
+            return self._get_logs(params[0])
+        raise NotImplementedError(method)
+
+    def _call(self, to: str, data: str) -> str:
+        data = data.lower()
+        if to.lower() == MULTICALL3_ADDRESS.lower() and data.startswith(self._aggregate3):
+            (calls,) = decode(["(address,bool,bytes)[]"], bytes.fromhex(data[10:]))
+            results = []
+            for target, allow_failure, calldata in calls:
+                try:
+                    results.append((True, Web3.to_bytes(hexstr=self._call(target, encode_hex(calldata)))))
+                except KeyError:
+                    if not allow_failure:
+                        raise
+                    results.append((False, b""))
+            return encode_hex(encode(["(bool,bytes)[]"], [results]))
+        if to.lower() != self.contract:
+            raise KeyError(to)
+        return self.calls[data]
+
+    def _get_logs(self, flt: Dict[str, Any]) -> List[Dict[str, Any]]:
+        start = self._block_number(flt.get("fromBlock"))
+        end = self._block_number(flt.get("toBlock"))
+        address = flt.get("address")
+        addresses = {a.lower() for a in ([address] if isinstance(address, str) else address or [])}
+        topic0 = (flt.get("topics") or [None])[0]
+        topic0 = {t.lower() for t in ([topic0] if isinstance(topic0, str) else topic0 or [])}
+        return [
+            entry for entry in self.logs
+            if start <= int(entry["blockNumber"], 16) <= end
+            and (not addresses or entry["address"].lower() in addresses)
+            and (not topic0 or entry["topics"][0].lower() in topic0)
+        ]
+
+
+def load_fixture(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Recorded-RPC replay node for offline ingestion benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("record", help="snapshot DCVToken state from a live node into a fixture")
+    p.add_argument("--rpc-url", required=True)
+    p.add_argument("--contract", required=True)
+    p.add_argument("--out", required=True)
+    p.add_argument("--limit", type=int, default=0, help="only record the first N token ids")
+    p.add_argument("--from-block", type=int, default=0, help="first block to record logs from")
+
+    p = sub.add_parser("synth", help="generate a fixture without a chain")
+    p.add_argument("--tokens", type=int, default=1000)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--out", required=True)
+
+    p = sub.add_parser("serve", help="serve a fixture as a JSON-RPC node")
+    p.add_argument("fixture")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8545)
+    p.add_argument("--latency-ms", type=float, default=0)
+    p.add_argument("--jitter-ms", type=float, default=0)
+    p.add_argument("--error-rate", type=float, default=0, help="fraction of HTTP requests answered with 500")
+    p.add_argument("--rate-limit-rate", type=float, default=0, help="fraction of HTTP requests answered with 429")
+
+    args = parser.parse_args()
+    if args.command == "record":
+        fixture = record_fixture(args.rpc_url, args.contract, args.limit, args.from_block)
+    elif args.command == "synth":
+        fixture = synthetic_fixture(args.tokens, args.seed)
+    else:
+        node = ReplayNode(load_fixture(args.fixture), args.host, args.port, args.latency_ms, args.jitter_ms,
+                          args.error_rate, args.rate_limit_rate)
+        print(f"🔁 Replaying {args.fixture} (contract {node.fixture['contract']}, head {node.head}) on {node.url}")
+        try:
+            node._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        print(f"📊 {node.stats}")
+        return 0
+
+    with open(args.out, "w") as f:
+        json.dump(fixture, f)
+    print(f"💾 Wrote {len(fixture['calls'])} calls and {len(fixture['logs'])} logs (head {fixture['block_number']}) to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,680 @@
+# =========================================================================================
+# rules.py  —  Columnar rule engine with a pluggable rule registry
+#
+# 🎯 Why
+#  The original engine looped with df.iterrows() and, for every row, re-filtered the whole
+#  frame (per-Aadhaar month counts, familyId/location nunique, double claims, unclaimed
+#  counts, same-day counts) and recomputed issuedBy.value_counts(): O(n²), which made
+#  /anomalies unusable beyond a few thousand tokens. The 15 rules were also hard-coded in
+#  one loop body, so none could be switched off, added or profiled.
+#
+#  Now each rule is a Rule in a registry (RuleEngine). A rule declares the columns it reads
+#  and the shared group aggregates it needs (AGGREGATES: per-Aadhaar month counts, issuer
+#  counts, per-day counts, ...). Per evaluation every aggregate is computed ONCE, however
+#  many rules use it and each rule produces a boolean mask over the column arrays.
+#  evaluate() records per-rule runtime, hits and bytes (engine.last_stats, served on /rules)
+#  so the rule set can be tuned under load.
+#
+#  Hits are structured: each anomaly carries "codes" (Reason ids, in rule order) and
+#  "params" (one small tuple per code, e.g. (hour, minute) or (month, year)), not text.
+#  Counting anomaly types is a bincount over codes, and the cached/persisted results hold
+#  no near-duplicate strings. Text is rendered only for what an endpoint actually returns:
+#  engine.render(anomalies[:limit]) adds "reasons" from each rule's template.
+#
+#  Adding a rule (e.g. district-specific; it gets a reason code above 100):
+#
+#      engine.register(Rule("night_shop_x", columns=["issuedBy", "issuedTime"], aggregates=[],
+#                           mask=lambda ctx: (ctx.df["issuedBy"] == "ISSUER7").to_numpy(),
+#                           template="Issued by shop under audit"))
+#
+#  Disabling: engine.disable("daily_spike") or DISABLED_RULES=daily_spike,... (config.py).
+#
+#  Velocity rules are a second rule type, WindowRule: "at least N tokens of one Aadhaar /
+#  issuer / location within any sliding window" (16-19), computed on a sorted (key, time)
+#  index in O(n log n) (windows.py). Another window is one registration:
+#
+#      engine.register(WindowRule("family_velocity_24h", "familyId", window=DAY, min_count=4,
+#                                 template="Family {1} received {0} tokens within 24 hours"))
+#
+#  Ring fraud across many Aadhaars is rule 20, identity_ring: connected components of the
+#  Aadhaar / family / location / issuer graph, scored by their redundant links (linkage.py).
+#  It only fires for clusters with at least three Aadhaars each in several of the cluster's
+#  families, and at most a quarter of the table's Aadhaars: a household sharing a family,
+#  location and issuer, or a small table that is one big component, is not a ring.
+#  Its hits carry the cluster id, and render() adds it to the anomaly as "cluster" (a rule's
+#  `details` hook: extra fields from its params).
+#
+#  With the original 15 rules (LEGACY_RULES) the output (rows, order, rendered reason text)
+#  is identical to the old loop, kept as _detect_rule_based_anomalies_loop so
+#  `benchmark.py rules` can check parity.
+# =========================================================================================
+import gc
+import time
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from linkage import link_identities
+from schema import aadhaar_text, python_values
+from windows import TimeIndex, window_peaks
+
+VALID_CATEGORIES = ["BPL", "APL", "Priority", "Antyodaya"]
+HOUR, DAY = 3600, 86400
+
+
+# ------------------- HELPERS -------------------
+def _truthy(col: pd.Series) -> np.ndarray:
+    """Python truthiness per value (None/'' -> False, NaN -> True), like `if row[col]:`."""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        # truthiness of each category once; missing (None before compact_tokens) -> False
+        truthy = np.append(col.cat.categories.astype(bool), False)
+        return truthy[col.cat.codes.to_numpy()]
+    return col.astype(bool).to_numpy()
+
+
+def _strftime(col: pd.Series, fmt: str, floor: str = "min") -> pd.Series:
+    """strftime on the distinct (floored) values only; NaT -> NaN. Timestamps repeat a lot at minute resolution."""
+    codes, uniques = pd.factorize(col.dt.floor(floor))
+    text = np.append(np.asarray(uniques.strftime(fmt), dtype=object), np.nan)  # code -1 (NaT) -> NaN
+    return pd.Series(text[codes], index=col.index, dtype=object)
+
+
+@contextmanager
+def _gc_paused():
+    """
+    Building 10^6 small lists / tuples / dicts re-triggers the cyclic GC over and over (each
+    full pass scans every tracked object); none of them form cycles, so it waits until the end.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _nbytes(value: Any) -> int:
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=False))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=False).sum())
+    return int(getattr(value, "nbytes", 0))
+
+
+# ------------------- SHARED AGGREGATES -------------------
+# name -> fn(ctx); computed at most once per evaluation (ctx.agg memoizes). Aggregates see
+# the WHOLE frame, also when only some token_ids are reported.
+AGGREGATES: Dict[str, Callable[["RuleContext"], Any]] = {
+    "avg_ration": lambda ctx: ctx.df["rationAmount"].mean(),
+    "issued_ok": lambda ctx: ctx.df["issuedTime"].notna().to_numpy(),
+    "claim_ok": lambda ctx: ctx.df["claimTime"].notna().to_numpy(),
+    "claimed": lambda ctx: ctx.df["isClaimed"].astype(bool).to_numpy(),
+    "expired": lambda ctx: ctx.df["isExpired"].astype(bool).to_numpy(),
+    "month_count": lambda ctx: _indexed_month_count(ctx) if ctx.index else
+    ctx.df.groupby(["aadhaar", "month", "year"], sort=False)["tokenId"].transform("size"),
+    "family_nunique": lambda ctx: _indexed_nunique(ctx, "familyId") if ctx.index else
+    ctx.df.groupby("aadhaar", sort=False)["familyId"].transform("nunique"),
+    "location_nunique": lambda ctx: _indexed_nunique(ctx, "location") if ctx.index else
+    ctx.df.groupby("aadhaar", sort=False)["location"].transform("nunique"),
+    # `== True` / `== False`: same comparisons as the loop
+    "claimed_per_token": lambda ctx: (ctx.df["isClaimed"] == True).groupby(  # noqa: E712
+        ctx.df["tokenId"], sort=False).transform("sum"),
+    "unclaimed_count": lambda ctx: _group_sum(ctx, ctx.index.codes("aadhaar"), ctx.df["isClaimed"] == False)  # noqa: E712
+    if ctx.index else (ctx.df["isClaimed"] == False).groupby(ctx.df["aadhaar"], sort=False).transform("sum"),  # noqa: E712
+    "issuer_concentrated": lambda ctx: _issuer_concentrated(ctx.df),
+    "issue_day": lambda ctx: ctx.df["issuedTime"].dt.normalize(),
+    "day_count": lambda ctx: _group_sum(ctx, ctx.index.codes("issueDay")) if ctx.index else
+    ctx.agg("issue_day").groupby(ctx.agg("issue_day"), sort=False).transform("size"),
+    "spike_threshold": lambda ctx: (ctx.n / max(1, _present_groups(ctx.index.codes("issueDay")) if ctx.index else
+                                                ctx.agg("issue_day").nunique())) * 2,
+    # per row: identity cluster id (-1 = none), its Aadhaars and redundant links (linkage.py)
+    "linkage": lambda ctx: link_identities(ctx.df, index=ctx.index).rows,
+}
+
+
+# Index-backed versions of the group aggregates (token_index.py): the key columns are already
+# factorized into group codes, so a group size / sum / distinct count is a bincount. Same values
+# as the groupby transforms: rows with a missing key get NaN.
+def _group_sum(ctx: "RuleContext", codes: np.ndarray, weights: Optional[pd.Series] = None) -> pd.Series:
+    valid = codes >= 0
+    w = None if weights is None else weights.to_numpy(dtype=np.float64)[valid]
+    totals = np.bincount(codes[valid], weights=w)
+    out = np.full(len(codes), np.nan)
+    out[valid] = totals[codes[valid]]
+    return pd.Series(out, index=ctx.df.index)
+
+
+def _present_groups(codes: np.ndarray) -> int:
+    return int(np.count_nonzero(np.bincount(codes[codes >= 0]))) if (codes >= 0).any() else 0
+
+
+def _indexed_nunique(ctx: "RuleContext", column: str) -> pd.Series:
+    """Distinct non-missing `column` values per Aadhaar, for every row."""
+    aadhaar, other = ctx.index.codes("aadhaar"), ctx.index.codes(column)
+    valid = (aadhaar >= 0) & (other >= 0)
+    pairs = pd.unique(aadhaar[valid] * ctx.index.groups(column) + other[valid])
+    distinct = np.bincount(pairs // ctx.index.groups(column), minlength=ctx.index.groups("aadhaar"))
+    out = np.full(len(aadhaar), np.nan)
+    has = aadhaar >= 0
+    out[has] = distinct[aadhaar[has]]
+    return pd.Series(out, index=ctx.df.index)
+
+
+def _indexed_month_count(ctx: "RuleContext") -> pd.Series:
+    """Tokens per (Aadhaar, month, year), for every row."""
+    aadhaar = ctx.index.codes("aadhaar")
+    month, months = pd.factorize(ctx.df["month"])
+    year, years = pd.factorize(ctx.df["year"])
+    valid = (aadhaar >= 0) & (month >= 0) & (year >= 0)
+    key = np.full(len(aadhaar), -1, dtype=np.int64)
+    key[valid] = pd.factorize((aadhaar[valid] * len(months) + month[valid]) * len(years) + year[valid])[0]
+    return _group_sum(ctx, key)
+
+
+def _issuer_concentrated(df: pd.DataFrame) -> bool:
+    counts = df["issuedBy"].value_counts()
+    return bool(len(counts)) and counts.max() > 0.9 * len(df)
+
+
+class RuleContext:
+    """One evaluation: the frame plus memoized shared aggregates and their cost."""
+
+    def __init__(self, df: pd.DataFrame, provided: Optional[Dict[str, Any]] = None, index: Any = None):
+        self.df = df
+        self.n = len(df)
+        # secondary indexes built for exactly this frame (token_index.TokenIndex), or None
+        self.index = index if index is not None and all(index.has(c) for c in ("aadhaar", "issueDay")) else None
+        # aggregates supplied by the caller (e.g. maintained incrementally, see incremental_rules.py)
+        self._aggs: Dict[str, Any] = dict(provided or {})
+        self.agg_stats: Dict[str, Dict[str, Any]] = {}
+
+    def agg(self, name: str) -> Any:
+        if name not in self._aggs:
+            start = time.perf_counter()
+            value = AGGREGATES[name](self)
+            self._aggs[name] = value
+            self.agg_stats[name] = {"ms": round((time.perf_counter() - start) * 1000, 3), "bytes": _nbytes(value)}
+        return self._aggs[name]
+
+
+# ------------------- REASON CODES -------------------
+class Reason(IntEnum):
+    """Reason code of each default rule. Hits carry (code, params); text is rendered at the API edge."""
+    ODD_HOUR = 1
+    EXPIRED_CLAIMED = 2
+    EXPIRED_UNCLAIMED = 3
+    MULTI_TOKEN_MONTH = 4
+    HIGH_RATION = 5
+    LOW_RATION = 6
+    INSTANT_CLAIM = 7
+    CLAIM_AFTER_EXPIRY = 8
+    INVALID_CATEGORY = 9
+    MULTI_FAMILY = 10
+    MULTI_LOCATION = 11
+    DOUBLE_CLAIM = 12
+    REPEAT_UNCLAIMED = 13
+    ISSUER_CONCENTRATION = 14
+    DAILY_SPIKE = 15
+    AADHAAR_VELOCITY_24H = 16
+    AADHAAR_VELOCITY_7D = 17
+    ISSUER_BURST = 18
+    LOCATION_BURST = 19
+    IDENTITY_RING = 20
+
+
+# ------------------- RULES -------------------
+class Rule:
+    """
+    One anomaly rule. mask(ctx) -> bool array over ctx.df rows; params(ctx, idx) -> one tuple
+    per hit position idx (called only when there are hits; None = no parameters). A hit is
+    rendered as template.format(*params, aadhaar=<hit aadhaar>); label names the anomaly type.
+    details(params) -> extra fields render() adds to the anomaly (e.g. {"cluster": ...}).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        columns: Sequence[str],
+        aggregates: Sequence[str],
+        mask: Callable[[RuleContext], np.ndarray],
+        template: str,
+        params: Optional[Callable[[RuleContext, np.ndarray], List[tuple]]] = None,
+        label: Optional[str] = None,
+        code: Optional[int] = None,
+        enabled: bool = True,
+        details: Optional[Callable[[Sequence[Any]], Dict[str, Any]]] = None,
+    ):
+        self.name = name
+        self.columns = list(columns)
+        self.aggregates = list(aggregates)
+        self.mask = mask
+        self.template = template
+        self.params = params
+        self.label = label or template
+        self.code = code  # assigned by RuleEngine.register when None
+        self.enabled = enabled
+        self.details = details
+
+    def render(self, params: Sequence[Any], aadhaar: Any) -> str:
+        return self.template.format(*params, aadhaar=aadhaar)
+
+
+class WindowRule(Rule):
+    """
+    Sliding-window velocity rule: flags every token of `key` that lies in a `window` (seconds,
+    over `time_column`) holding at least `min_count` tokens of that key — and, with `factor`,
+    more than factor x the key's own average per window. Backed by windows.window_peaks on a
+    sorted (key, time) index, shared by all window rules on the same key; params are (tokens
+    in the window, key value).
+    """
+
+    def __init__(self, name: str, key: str, window: int, min_count: int, template: str,
+                 factor: Optional[float] = None, time_column: str = "issuedTime",
+                 label: Optional[str] = None, code: Optional[int] = None, enabled: bool = True):
+        self.key, self.window, self.min_count, self.factor = key, int(window), int(min_count), factor
+        self.time_column = time_column
+        # one sorted index per (key, time) and one aggregate per window spec, shared between rules
+        index = f"time_index:{key}:{time_column}"
+        aggregate = f"window:{key}:{time_column}:{self.window}:{self.min_count}:{factor}"
+        AGGREGATES.setdefault(index, lambda ctx: TimeIndex.from_columns(ctx.df[key], ctx.df[time_column]))
+        AGGREGATES.setdefault(aggregate, lambda ctx: window_peaks(ctx.agg(index), self.window, self.min_count,
+                                                                  self.factor))
+        self.aggregate = aggregate
+        super().__init__(
+            name, [key, time_column], [index, aggregate],
+            lambda ctx: ctx.agg(aggregate) > 0, template,
+            lambda ctx, idx: _fields(pd.Series(ctx.agg(aggregate)[idx]), _python(_col(ctx, key, idx))),
+            label=label, code=code, enabled=enabled,
+        )
+
+    def peaks(self, df: pd.DataFrame) -> np.ndarray:
+        """Per row of df: tokens in the largest qualifying window containing it (0 = not flagged)."""
+        return window_peaks(TimeIndex.from_columns(df[self.key], df[self.time_column]),
+                            self.window, self.min_count, self.factor)
+
+
+def _col(ctx: RuleContext, name: str, idx: np.ndarray) -> pd.Series:
+    return ctx.df[name].iloc[idx]
+
+
+def _fields(*cols: pd.Series) -> List[tuple]:
+    return list(zip(*(c.tolist() for c in cols)))
+
+
+def _python(values: pd.Series) -> pd.Series:
+    """Key values for params: Aadhaar as its digits, categoricals as plain values."""
+    if values.name == "aadhaar":
+        return pd.Series(aadhaar_text(values))
+    return pd.Series(python_values(values))
+
+
+def _linkage(ctx: RuleContext, idx: np.ndarray) -> List[tuple]:
+    rows = ctx.agg("linkage")
+    return _fields(*(rows[c].iloc[idx] for c in ("cluster", "aadhaars", "redundant_links")))
+
+
+def _hour_minute(ctx: RuleContext, name: str, idx: np.ndarray) -> List[tuple]:
+    times = _col(ctx, name, idx)
+    return _fields(times.dt.hour, times.dt.minute)
+
+
+DEFAULT_RULES: List[Rule] = [
+    # 1) Odd hour (midnight-5am)
+    Rule("odd_hour", ["issuedTime"], ["issued_ok"],
+         lambda ctx: ctx.agg("issued_ok") & (ctx.df["issuedTime"].dt.hour < 5).to_numpy(),
+         "Delivery at unusual hour ({0:02d}:{1:02d})", lambda ctx, idx: _hour_minute(ctx, "issuedTime", idx),
+         label="Delivery at unusual hour", code=Reason.ODD_HOUR),
+    # 2) Expired token claimed
+    Rule("expired_claimed", ["isExpired", "isClaimed"], ["expired", "claimed"],
+         lambda ctx: ctx.agg("expired") & ctx.agg("claimed"),
+         "Expired token was claimed", code=Reason.EXPIRED_CLAIMED),
+    # 3) Token expired without claim
+    Rule("expired_unclaimed", ["isExpired", "isClaimed"], ["expired", "claimed"],
+         lambda ctx: ctx.agg("expired") & ~ctx.agg("claimed"),
+         "Token expired without claim", code=Reason.EXPIRED_UNCLAIMED),
+    # 4) Multiple tokens same month for same Aadhaar
+    Rule("multi_token_month", ["aadhaar", "month", "year"], ["month_count"],
+         lambda ctx: (ctx.agg("month_count") > 1).to_numpy(),
+         "Multiple tokens issued for Aadhaar {aadhaar} in {0}/{1}",
+         lambda ctx, idx: _fields(_col(ctx, "month", idx), _col(ctx, "year", idx)),
+         label="Multiple tokens in one month", code=Reason.MULTI_TOKEN_MONTH),
+    # 5/6) Unusually high/low ration allocation
+    Rule("high_ration", ["rationAmount"], ["avg_ration"],
+         lambda ctx: (ctx.df["rationAmount"] > 2 * ctx.agg("avg_ration")).to_numpy() & (ctx.agg("avg_ration") > 0),
+         "Unusually high ration allocation", code=Reason.HIGH_RATION),
+    Rule("low_ration", ["rationAmount"], ["avg_ration"],
+         lambda ctx: (ctx.df["rationAmount"] < 0.5 * ctx.agg("avg_ration")).to_numpy() & (ctx.agg("avg_ration") > 0),
+         "Unusually low ration allocation", code=Reason.LOW_RATION),
+    # 7) Instant claim (<60s)
+    Rule("instant_claim", ["claimTime", "claimDelay"], ["claim_ok"],
+         lambda ctx: ctx.agg("claim_ok") & (ctx.df["claimDelay"] < 60).to_numpy(),
+         "Claimed instantly after issue ({0:02d}:{1:02d})", lambda ctx, idx: _hour_minute(ctx, "claimTime", idx),
+         label="Claimed instantly after issue", code=Reason.INSTANT_CLAIM),
+    # 8) Claim after expiry
+    Rule("claim_after_expiry", ["claimTime", "expiryTime"], ["claim_ok"],
+         lambda ctx: ctx.agg("claim_ok") & (ctx.df["claimTime"] > ctx.df["expiryTime"]).to_numpy(),
+         "Claim attempted after token expiry", code=Reason.CLAIM_AFTER_EXPIRY),
+    # 9) Invalid category
+    Rule("invalid_category", ["category"], [],
+         lambda ctx: ~ctx.df["category"].isin(VALID_CATEGORIES).to_numpy(),
+         "Unknown or invalid category '{0}'", lambda ctx, idx: [(c,) for c in python_values(_col(ctx, "category", idx))],
+         label="Unknown or invalid category", code=Reason.INVALID_CATEGORY),
+    # 10) Same Aadhaar across multiple familyIds
+    Rule("multi_family", ["aadhaar", "familyId"], ["family_nunique"],
+         lambda ctx: _truthy(ctx.df["familyId"]) & (ctx.agg("family_nunique") > 1).to_numpy(),
+         "Aadhaar {aadhaar} linked to multiple family IDs",
+         label="Aadhaar linked to multiple family IDs", code=Reason.MULTI_FAMILY),
+    # 11) Aadhaar used in multiple locations
+    Rule("multi_location", ["aadhaar", "location"], ["location_nunique"],
+         lambda ctx: _truthy(ctx.df["location"]) & (ctx.agg("location_nunique") > 1).to_numpy(),
+         "Aadhaar {aadhaar} used in multiple locations",
+         label="Aadhaar used in multiple locations", code=Reason.MULTI_LOCATION),
+    # 12) Double claim (same tokenId marked claimed more than once)
+    Rule("double_claim", ["tokenId", "isClaimed"], ["claimed", "claimed_per_token"],
+         lambda ctx: ctx.agg("claimed") & (ctx.agg("claimed_per_token") > 1).to_numpy(),
+         "Token claimed more than once (double claim)", code=Reason.DOUBLE_CLAIM),
+    # 13) Repeatedly unclaimed Aadhaar
+    Rule("repeat_unclaimed", ["aadhaar", "isClaimed"], ["unclaimed_count"],
+         lambda ctx: (ctx.agg("unclaimed_count") > 3).to_numpy(),
+         "Aadhaar {aadhaar} has {0} unclaimed tokens",
+         lambda ctx, idx: _fields(ctx.agg("unclaimed_count").iloc[idx].astype(np.int64)),
+         label="Aadhaar with many unclaimed tokens", code=Reason.REPEAT_UNCLAIMED),
+    # 14) Suspicious issuer concentration
+    Rule("issuer_concentration", ["issuedBy"], ["issuer_concentrated"],
+         lambda ctx: _truthy(ctx.df["issuedBy"]) & ctx.agg("issuer_concentrated"),
+         "Suspicious concentration: {0} issued almost all tokens",
+         lambda ctx, idx: [(b,) for b in python_values(_col(ctx, "issuedBy", idx))],
+         label="Suspicious issuer concentration", code=Reason.ISSUER_CONCENTRATION),
+    # 15) Spike: many tokens same day
+    Rule("daily_spike", ["issuedTime"], ["day_count", "spike_threshold"],
+         lambda ctx: (ctx.agg("day_count") > ctx.agg("spike_threshold")).to_numpy(),
+         "Spike: unusually high number of tokens issued on {0:04d}-{1:02d}-{2:02d}",
+         lambda ctx, idx: _fields(*(getattr(_col(ctx, "issuedTime", idx).dt, f) for f in ("year", "month", "day"))),
+         label="Daily issuance spike", code=Reason.DAILY_SPIKE),
+    # 16-19) Velocity: sliding windows per Aadhaar / issuer / location (windows.py)
+    WindowRule("aadhaar_velocity_24h", "aadhaar", window=DAY, min_count=3,
+               template="Aadhaar {aadhaar} received {0} tokens within 24 hours",
+               label="Aadhaar token velocity (24h)", code=Reason.AADHAAR_VELOCITY_24H),
+    WindowRule("aadhaar_velocity_7d", "aadhaar", window=7 * DAY, min_count=5,
+               template="Aadhaar {aadhaar} received {0} tokens within 7 days",
+               label="Aadhaar token velocity (7 days)", code=Reason.AADHAAR_VELOCITY_7D),
+    WindowRule("issuer_burst", "issuedBy", window=HOUR, min_count=20, factor=5,
+               template="Issuance burst: {0} tokens by {1} within one hour",
+               label="Issuer burst", code=Reason.ISSUER_BURST),
+    WindowRule("location_burst", "location", window=HOUR, min_count=20, factor=5,
+               template="Issuance burst: {0} tokens in {1} within one hour",
+               label="Location burst", code=Reason.LOCATION_BURST),
+    # 20) Identity ring: Aadhaars linked through shared families / locations / issuers (linkage.py)
+    Rule("identity_ring", ["aadhaar", "familyId", "location", "issuedBy"], ["linkage"],
+         lambda ctx: (ctx.agg("linkage")["cluster"] >= 0).to_numpy(),
+         "Aadhaar {aadhaar} is in linked identity cluster #{0}: {1} Aadhaars sharing families / locations / "
+         "issuers ({2} redundant links)", _linkage,
+         label="Linked identity cluster", code=Reason.IDENTITY_RING, details=lambda p: {"cluster": p[0]}),
+]
+
+# the rules of the original loop engine (_detect_rule_based_anomalies_loop)
+LEGACY_RULES = [r.name for r in DEFAULT_RULES[:15]]
+
+
+# ------------------- ENGINE -------------------
+class RuleEngine:
+    """Ordered rule registry; evaluate() runs the enabled rules with shared aggregates."""
+
+    def __init__(self, rules: Optional[Sequence[Rule]] = None):
+        self.rules: Dict[str, Rule] = {}
+        self.by_code: Dict[int, Rule] = {}
+        for rule in rules or []:
+            self.register(rule)
+        self.last_stats: Optional[Dict[str, Any]] = None
+
+    def register(self, rule: Rule, replace: bool = False) -> None:
+        """Add a rule (reasons are emitted in registration order)."""
+        if rule.name in self.rules and not replace:
+            raise ValueError(f"Rule '{rule.name}' is already registered")
+        unknown = [a for a in rule.aggregates if a not in AGGREGATES]
+        if unknown:
+            raise ValueError(f"Rule '{rule.name}' needs unknown aggregates {unknown}")
+        codes = {r.code: r.name for r in self.rules.values() if r.name != rule.name}
+        if rule.code is None:
+            rule.code = max([100, *codes]) + 1  # custom rules: codes above the built-in Reason range
+        elif rule.code in codes:
+            raise ValueError(f"Rule '{rule.name}' reuses reason code {rule.code} of '{codes[rule.code]}'")
+        if rule.name in self.rules:
+            self.by_code.pop(self.rules[rule.name].code, None)
+        self.rules[rule.name] = rule
+        self.by_code[rule.code] = rule
+
+    def enable(self, name: str) -> None:
+        self.rules[name].enabled = True
+
+    def disable(self, name: str) -> None:
+        self.rules[name].enabled = False
+
+    def signature(self) -> tuple:
+        """Changes whenever a rule is added, replaced, enabled or disabled."""
+        return tuple((name, id(rule), rule.enabled) for name, rule in self.rules.items())
+
+    def describe(self) -> List[Dict[str, Any]]:
+        return [{"name": r.name, "code": int(r.code), "label": r.label, "enabled": r.enabled,
+                 "columns": r.columns, "aggregates": r.aggregates} for r in self.rules.values()]
+
+    def legend(self) -> Dict[int, Dict[str, str]]:
+        """code -> rule name, type label and text template (for clients rendering codes themselves)."""
+        return {int(code): {"rule": r.name, "label": r.label, "template": r.template} for code, r in self.by_code.items()}
+
+    def label(self, code: int) -> str:
+        rule = self.by_code.get(int(code))
+        return rule.label if rule is not None else f"Reason {code}"
+
+    def render(self, anomalies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Anomalies with their reason codes rendered as text ("reasons"); call on the slice being served."""
+        out = []
+        for a in anomalies:
+            rules = [self.by_code.get(int(c)) for c in a["codes"]]
+            reasons = [r.render(p, a["aadhaar"]) if r is not None else f"Reason {c}"
+                       for r, c, p in zip(rules, a["codes"], a["params"])]
+            details = {k: v for r, p in zip(rules, a["params"]) if r is not None and r.details is not None
+                       for k, v in r.details(p).items()}
+            out.append({**a, **details, "reasons": reasons})
+        return out
+
+    def evaluate(self, df: pd.DataFrame, token_ids: Optional[List[int]] = None,
+                 aggregates: Optional[Dict[str, Any]] = None, index: Any = None) -> List[Dict[str, Any]]:
+        """
+        Rule hits per token. `token_ids` limits which rows are reported (rules still see all of df).
+        `aggregates` pre-fills shared aggregates (aligned with df) instead of computing them from df.
+        `index` (token_index.TokenIndex) supplies the group codes; ignored unless built for df.
+        """
+        start = time.perf_counter()
+        stats: Dict[str, Any] = {"rows": len(df), "rules": {}, "aggregates": {}}
+        self.last_stats = stats
+        if len(df) == 0:
+            return []
+
+        ctx = RuleContext(df, aggregates, index if index is not None and index.covers(df) else None)
+        rows = None if token_ids is None else df["tokenId"].isin(token_ids).to_numpy()
+        anomalies = self.records(df, self._hits(ctx, self.rules.values(), rows, stats))
+        stats["aggregates"] = ctx.agg_stats
+        stats["flagged"] = len(anomalies)
+        stats["total_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return anomalies
+
+    def hits(self, df: pd.DataFrame, rules: Optional[Sequence[Rule]] = None, aggregates: Optional[Dict[str, Any]] = None,
+             index: Any = None) -> tuple:
+        """
+        Per-rule hits of `rules` (default: all) over df, without building anomaly dicts:
+        ([(rule, row positions, params), ...] in rule order, stats). records() turns them into
+        evaluate()'s output; sharded_rules.py merges hits of several frames before that.
+        """
+        stats: Dict[str, Any] = {"rows": len(df), "rules": {}}
+        if len(df) == 0:
+            return [], stats
+        ctx = RuleContext(df, aggregates, index if index is not None and index.covers(df) else None)
+        hits = self._hits(ctx, self.rules.values() if rules is None else rules, None, stats)
+        stats["aggregates"] = ctx.agg_stats
+        return hits, stats
+
+    def _hits(self, ctx: RuleContext, rules: Iterable[Rule], rows: Optional[np.ndarray],
+              stats: Dict[str, Any]) -> List[tuple]:
+        masks: List[tuple] = []
+        for rule in rules:
+            if not rule.enabled:
+                stats["rules"][rule.name] = {"enabled": False}
+                continue
+            missing = [c for c in rule.columns if c not in ctx.df.columns]
+            if missing:
+                stats["rules"][rule.name] = {"enabled": True, "skipped": f"missing columns {missing}"}
+                continue
+            for name in rule.aggregates:
+                ctx.agg(name)  # shared: timed once under stats["aggregates"]
+            t = time.perf_counter()
+            mask = np.asarray(rule.mask(ctx), dtype=bool)
+            if rows is not None:
+                mask &= rows
+            stats["rules"][rule.name] = {"enabled": True, "hits": int(mask.sum()),
+                                         "ms": (time.perf_counter() - t) * 1000, "bytes": mask.nbytes}
+            masks.append((rule, mask))
+
+        hits: List[tuple] = []
+        for rule, mask in masks:
+            idx = np.flatnonzero(mask)
+            rule_stats = stats["rules"][rule.name]
+            if len(idx):
+                t = time.perf_counter()
+                hit_params = rule.params(ctx, idx) if rule.params is not None else [()] * len(idx)
+                hits.append((rule, idx, hit_params))
+                rule_stats["ms"] += (time.perf_counter() - t) * 1000
+                rule_stats["bytes"] += 8 * (len(idx) + sum(map(len, hit_params)))  # ~one word per code / parameter
+            rule_stats["ms"] = round(rule_stats["ms"], 3)
+        return hits
+
+    @staticmethod
+    def records(df: pd.DataFrame, hits: List[tuple]) -> List[Dict[str, Any]]:
+        """Anomaly dicts (df row order, codes in `hits` order) from per-rule (rule, positions, params)."""
+        if not hits:
+            return []
+        with _gc_paused():
+            hit_idx = np.unique(np.concatenate([idx for _, idx, _ in hits]))
+            slot = np.full(len(df), -1, dtype=np.int64)
+            slot[hit_idx] = np.arange(len(hit_idx))
+            codes: List[List[int]] = [[] for _ in range(len(hit_idx))]
+            params: List[List[tuple]] = [[] for _ in range(len(hit_idx))]
+            for rule, idx, hit_params in hits:
+                code = int(rule.code)
+                for s, p in zip(slot[idx].tolist(), hit_params):
+                    codes[s].append(code)
+                    params[s].append(p)
+
+            rows = df.iloc[hit_idx]
+            issued_at = _strftime(rows["issuedTime"], "%d-%m-%Y %H:%M")
+            claim_at = _strftime(rows["claimTime"], "%d-%m-%Y %H:%M")
+            issued_at = issued_at.where(rows["issuedTime"].notna(), None).tolist()
+            claim_at = claim_at.where(rows["claimTime"].notna(), None).tolist()
+            return [
+                {"tokenId": tid, "aadhaar": aadhaar, "issuedAt": i_at, "claimAt": c_at, "codes": c, "params": p}
+                for tid, aadhaar, i_at, c_at, c, p in zip(
+                    rows["tokenId"].tolist(), aadhaar_text(rows["aadhaar"]), issued_at, claim_at, codes, params)
+            ]
+
+
+# Default engine used by the service (main.py disables rules listed in DISABLED_RULES)
+engine = RuleEngine(DEFAULT_RULES)
+
+
+def detect_rule_based_anomalies(df: pd.DataFrame, token_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """Rule hits per token. `token_ids` limits which rows are reported (rules still see all of df)."""
+    return engine.evaluate(df, token_ids)
+
+
+def render_reasons(anomalies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Add the reason text to (a slice of) detect_rule_based_anomalies output."""
+    return engine.render(anomalies)
+
+
+# ------------------- REFERENCE (row loop) -------------------
+def _detect_rule_based_anomalies_loop(df: pd.DataFrame, token_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """The original O(n²) iterrows engine, kept as the parity reference for the columnar one."""
+    anomalies = []
+    avg_ration = df["rationAmount"].mean() if len(df) > 0 else 0
+
+    rows = df if token_ids is None else df[df["tokenId"].isin(token_ids)]
+    for _, row in rows.iterrows():
+        reasons = []
+
+        # 1) Odd hour (midnight-5am)
+        if pd.notnull(row["issuedTime"]) and row["issuedTime"].hour < 5:
+            reasons.append(f"Delivery at unusual hour ({row['issuedTime'].strftime('%H:%M')})")
+
+        # 2) Expired token claimed
+        if row["isExpired"] and row["isClaimed"]:
+            reasons.append("Expired token was claimed")
+
+        # 3) Token expired without claim
+        if row["isExpired"] and not row["isClaimed"]:
+            reasons.append("Token expired without claim")
+
+        # 4) Multiple tokens same month for same Aadhaar
+        month_count = df[(df["aadhaar"] == row["aadhaar"]) &
+                         (df["month"] == row["month"]) &
+                         (df["year"] == row["year"])].shape[0]
+        if month_count > 1:
+            reasons.append(f"Multiple tokens issued for Aadhaar {row['aadhaar']} in {row['month']}/{row['year']}")
+
+        # 5/6) Unusually high/low ration allocation
+        if avg_ration > 0 and row["rationAmount"] > 2 * avg_ration:
+            reasons.append("Unusually high ration allocation")
+        if avg_ration > 0 and row["rationAmount"] < 0.5 * avg_ration:
+            reasons.append("Unusually low ration allocation")
+
+        # 7) Instant claim (<60s)
+        if pd.notnull(row["claimTime"]) and row["claimDelay"] < 60:
+            reasons.append(f"Claimed instantly after issue ({row['claimTime'].strftime('%H:%M')})")
+
+        # 8) Claim after expiry
+        if pd.notnull(row["claimTime"]) and row["claimTime"] > row["expiryTime"]:
+            reasons.append("Claim attempted after token expiry")
+
+        # 9) Invalid category
+        if row["category"] not in ["BPL", "APL", "Priority", "Antyodaya"]:
+            reasons.append(f"Unknown or invalid category '{row['category']}'")
+
+        # 10) Same Aadhaar across multiple familyIds
+        if row["familyId"] and (df[df["aadhaar"] == row["aadhaar"]]["familyId"].nunique() > 1):
+            reasons.append(f"Aadhaar {row['aadhaar']} linked to multiple family IDs")
+
+        # 11) Aadhaar used in multiple locations
+        if row["location"] and (df[df["aadhaar"] == row["aadhaar"]]["location"].nunique() > 1):
+            reasons.append(f"Aadhaar {row['aadhaar']} used in multiple locations")
+
+        # 12) Double claim (same tokenId marked claimed more than once)
+        if row["isClaimed"] and df[(df["tokenId"] == row["tokenId"]) & (df["isClaimed"] == True)].shape[0] > 1:
+            reasons.append("Token claimed more than once (double claim)")
+
+        # 13) Repeatedly unclaimed Aadhaar
+        unclaimed = df[(df["aadhaar"] == row["aadhaar"]) & (df["isClaimed"] == False)].shape[0]
+        if unclaimed > 3:
+            reasons.append(f"Aadhaar {row['aadhaar']} has {unclaimed} unclaimed tokens")
+
+        # 14) Suspicious issuer concentration
+        if row["issuedBy"] and df["issuedBy"].value_counts().max() > 0.9 * len(df):
+            reasons.append(f"Suspicious concentration: {row['issuedBy']} issued almost all tokens")
+
+        # 15) Spike: many tokens same day
+        day_count = df[df["issuedTime"].dt.date == row["issuedTime"].date()].shape[0]
+        if day_count > (df.shape[0] / max(1, df["issuedTime"].dt.date.nunique())) * 2:
+            reasons.append(f"Spike: unusually high number of tokens issued on {row['issuedTime'].date()}")
+
+        if reasons:
+            anomalies.append({
+                "tokenId": row["tokenId"],
+                "aadhaar": row["aadhaar"],
+                "issuedAt": row["issuedTime"].strftime("%d-%m-%Y %H:%M") if pd.notnull(row["issuedTime"]) else None,
+                "claimAt": row["claimTime"].strftime("%d-%m-%Y %H:%M") if pd.notnull(row["claimTime"]) else None,
+                "reasons": reasons
+            })
+
+    return anomalies
@@ -0,0 +1,96 @@
+# =========================================================================================
+# schema.py  —  Compact typed columns for the token table
+#
+# 🎯 Why
+#  The token DataFrame kept every Aadhaar as a Python str, category / familyId / location /
+#  issuedBy as object columns (one str object per row, ~60 bytes each), the timestamps at
+#  nanosecond resolution and the small features as int64/int32. At 10^6 tokens that is
+#  ~400 bytes per token, most of it per-row Python objects that the rules then hash again.
+#
+#  compact_tokens() gives every column the narrowest type that holds its values:
+#    - aadhaar                       : uint64 (12 digits; kept as text if a value does not fit)
+#    - category/familyId/location/
+#      issuedBy                      : categorical (int8/int16/int32 codes + one copy per value)
+#    - issuedTime/expiryTime/claimTime: datetime64[s] — int64 epoch seconds, NaT = missing,
+#                                       same .dt API as before
+#    - rationAmount, oddHour, month,
+#      year, expiredUsage            : smallest integer type; isClaimed/isExpired: bool
+#                                       (nullable "boolean" when something is missing)
+#  engineer_features() applies it, so the live fetch, the Aadhaar drill-down, the sample data
+#  and synthetic.py all produce the same compact frame. API output is unchanged: Aadhaar is
+#  rendered back to its digits at the edge (aadhaar_text), categories to their strings.
+#
+#    memory_report(df)   -> bytes per token and per column (served on /health)
+# =========================================================================================
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+CATEGORICAL_COLUMNS = ["category", "familyId", "location", "issuedBy"]
+TIME_COLUMNS = ["issuedTime", "expiryTime", "claimTime"]
+BOOL_COLUMNS = ["isClaimed", "isExpired"]
+SMALL_INT_COLUMNS = ["rationAmount", "oddHour", "month", "year", "expiredUsage"]
+TIME_DTYPE = "datetime64[s]"
+
+
+def compact_tokens(df: pd.DataFrame) -> pd.DataFrame:
+    """Narrow every known token column in place (see module header); unknown columns are left alone."""
+    if "aadhaar" in df.columns:
+        df["aadhaar"] = aadhaar_column(df["aadhaar"])
+    for col in TIME_COLUMNS:
+        if col in df.columns and df[col].dtype != TIME_DTYPE:
+            df[col] = pd.to_datetime(df[col]).astype(TIME_DTYPE)
+    for col in BOOL_COLUMNS:
+        if col in df.columns and df[col].dtype != bool:
+            df[col] = df[col].astype("boolean") if df[col].isna().any() else df[col].astype(bool)
+    for col in SMALL_INT_COLUMNS:
+        if col in df.columns and pd.api.types.is_integer_dtype(df[col]) and len(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return df
+
+
+def aadhaar_column(col: pd.Series) -> pd.Series:
+    """uint64 when every value is the canonical digits of a number < 2^64, else unchanged."""
+    if col.dtype == np.uint64:
+        return col
+    if col.isna().any() or len(col) == 0:
+        return col
+    codes, uniques = pd.factorize(col)  # Aadhaars repeat: convert and check each distinct value once
+    uniques = pd.Series(uniques)
+    try:
+        numbers = uniques.astype(np.uint64)
+    except (TypeError, ValueError, OverflowError):
+        return col
+    # round-trip check: rejects "0123", "12.0", signs, anything that would render differently
+    if not (numbers.astype(str).to_numpy() == uniques.astype(str).to_numpy()).all():
+        return col
+    return pd.Series(numbers.to_numpy()[codes], index=col.index, name=col.name)
+
+
+def aadhaar_text(values: pd.Series) -> List[Any]:
+    """Aadhaar values as the API renders them (digits as str; missing -> None)."""
+    if values.dtype == np.uint64:
+        return values.astype(str).tolist()
+    return values.tolist()
+
+
+def python_values(values: pd.Series) -> List[Any]:
+    """Values as plain Python objects, missing -> None (categoricals otherwise give NaN)."""
+    return values.astype(object).where(values.notna(), None).tolist()
+
+
+def memory_report(df: pd.DataFrame) -> Dict[str, Any]:
+    """Bytes per token, total and per column (deep: includes str objects and category values)."""
+    per_column = df.memory_usage(deep=True, index=False)
+    total = int(per_column.sum())
+    n = len(df)
+    return {
+        "rows": n,
+        "bytes": total,
+        "bytes_per_token": round(total / n, 1) if n else 0.0,
+        "columns": {col: {"dtype": str(df[col].dtype), "bytes": int(b)} for col, b in per_column.items()},
+    }
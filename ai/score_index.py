@@ -0,0 +1,70 @@
+# =========================================================================================
+# score_index.py  —  Tokens ranked by ML anomaly score: top-K and score-threshold lookups
+#
+# 🎯 Why
+#  run_anomaly_detection kept only the 0/1 verdict and dropped the model's decision score,
+#  so investigators could not tell the worst outliers from borderline ones, and anything
+#  ranked had to sort or filter the whole frame per request.
+#
+#  The decision score is now kept as the float32 `ml_score` column (higher = more
+#  anomalous; the frozen model's threshold separates ml_anomaly 1 from 0). ScoreIndex is
+#  built once per analysed table: one argsort of the scores, descending (O(n log n) per
+#  refresh, ~0.15 s at 10^6 tokens). After that:
+#    - top(k)            : the k highest-risk rows, a slice of the order — O(k)
+#    - above(t, limit)   : rows scoring >= t, by binary search on the sorted scores —
+#                          O(log n + limit)
+#  Rows without a score (NaN: tokens only scored online since the last run, see
+#  streaming.py) are left out until the next scheduled run scores them.
+# =========================================================================================
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class ScoreIndex:
+    """Descending order of a score column over one table; positions are df row positions."""
+
+    def __init__(self, column: str = "ml_score"):
+        self.column = column
+        self._order: Optional[np.ndarray] = None      # row positions, highest score first
+        self._negated: Optional[np.ndarray] = None    # minus their scores: ascending, for searchsorted
+        self._tids: Optional[np.ndarray] = None       # tokenIds of the indexed table, in row order
+        self._lock = threading.Lock()
+        self.last_stats: Optional[Dict[str, Any]] = None
+
+    def refresh(self, df: pd.DataFrame) -> "ScoreIndex":
+        start = time.perf_counter()
+        scores = df[self.column].to_numpy(dtype=np.float32)
+        valid = np.flatnonzero(~np.isnan(scores))
+        order = valid[np.argsort(-scores[valid], kind="stable")]
+        with self._lock:
+            self._order, self._negated = order, -scores[order]
+            self._tids = df["tokenId"].to_numpy()
+        self.last_stats = {"rows": len(df), "scored": len(order),
+                           "ms": round((time.perf_counter() - start) * 1000, 3)}
+        return self
+
+    def covers(self, df: pd.DataFrame) -> bool:
+        """True when the index was built for exactly this frame's rows (same tokenIds, same order)."""
+        return self._tids is not None and len(df) == len(self._tids) and \
+            np.array_equal(df["tokenId"].to_numpy(), self._tids)
+
+    def top(self, k: int) -> np.ndarray:
+        """Row positions of the k highest scores, highest first."""
+        with self._lock:
+            return self._order[:max(k, 0)].copy()
+
+    def above(self, threshold: float, limit: Optional[int] = None) -> np.ndarray:
+        """Row positions scoring >= threshold, highest first (at most `limit`)."""
+        with self._lock:
+            count = int(np.searchsorted(self._negated, -np.float32(threshold), side="right"))
+            if limit is not None:
+                count = min(count, max(limit, 0))
+            return self._order[:count].copy()
+
+    def count_above(self, threshold: float) -> int:
+        with self._lock:
+            return int(np.searchsorted(self._negated, -np.float32(threshold), side="right"))
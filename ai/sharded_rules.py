@@ -0,0 +1,258 @@
+# =========================================================================================
+# sharded_rules.py  —  Rule evaluation over Aadhaar-hash shards in a process pool
+#
+# 🎯 Why
+#  The columnar engine is vectorized but still single-core inside one FastAPI worker: at
+#  national scale one full evaluation is seconds of one CPU while the others idle.
+#
+#  ShardedRuleEvaluator splits the table by a hash of the Aadhaar, so every Aadhaar group
+#  (same-month tokens, families, locations, unclaimed count, Aadhaar velocity windows) lies
+#  inside one shard and the group rules give the same result per shard as on the whole table:
+#    - map     : the token table is copied ONCE into a shared-memory block (column arrays,
+#                categoricals as codes) plus each shard's row positions; pool processes attach
+#                to it, rebuild their shard and evaluate the shard-local rules
+#    - global  : rules that need the whole table (daily spike, double claim, issuer /
+#                location bursts, identity rings, custom rules) run in this process on the
+#                full table meanwhile; scalar inputs of shard-local rules (average ration,
+#                issuer concentration) are computed here once and sent with each shard
+#    - reduce  : the per-rule hits of all shards are mapped back to table positions and
+#                merged with the global rules' hits in rule order (RuleEngine.records), so the
+#                output is identical to engine.evaluate(df)
+#  Small tables (< min_rows) and workers <= 1 go straight to engine.evaluate. The pool forks
+#  its workers once, from start(): main.py calls it at import, before the scheduler threads
+#  exist (forking a threaded process can deadlock; "spawn" would re-run main.py in every worker
+#  under `python main.py`). If the pool breaks, evaluation stays in-process from then on.
+#  `benchmark.py rules-sharded` checks parity and measures scaling over 1..N processes.
+# =========================================================================================
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from rules import DEFAULT_RULES, Rule, RuleContext, RuleEngine, WindowRule, _gc_paused
+
+# aggregates that only depend on the row itself or on its Aadhaar group
+SHARD_LOCAL_AGGREGATES = {"issued_ok", "claim_ok", "claimed", "expired", "issue_day", "month_count",
+                          "family_nunique", "location_nunique", "unclaimed_count"}
+# whole-table scalars: computed once on the full table and sent to every shard
+BROADCAST_AGGREGATES = {"avg_ration", "issuer_concentrated"}
+
+_DEFAULT_RULES = {r.name: r for r in DEFAULT_RULES}
+
+
+# ------------------- SHARED MEMORY FRAME -------------------
+def _column_arrays(col: pd.Series) -> Tuple[str, np.ndarray, Any]:
+    """(kind, flat array, metadata) for one column; categoricals / objects travel as codes + values."""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return "categorical", col.cat.codes.to_numpy(), col.cat.categories
+    values = col.to_numpy()
+    if values.dtype == object:  # also extension dtypes without a plain NumPy form
+        codes, uniques = pd.factorize(col)
+        return "object", codes, np.asarray(uniques, dtype=object)
+    if values.dtype.kind == "M":
+        return "datetime", values.view(np.int64), str(values.dtype)
+    return "plain", values, None
+
+
+def share_frame(df: pd.DataFrame, shards: List[np.ndarray]) -> Tuple[shared_memory.SharedMemory, Dict[str, Any]]:
+    """Copy df's columns and the shard row positions into one shared-memory block; returns (block, spec)."""
+    arrays, columns = [], []
+    for name in df.columns:
+        kind, values, meta = _column_arrays(df[name])
+        arrays.append(np.ascontiguousarray(values))
+        columns.append((name, kind, meta))
+    arrays += [s.astype(np.int64) for s in shards]
+    size = sum(a.nbytes for a in arrays)
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    layout, offset = [], 0
+    for a in arrays:
+        np.ndarray(a.shape, a.dtype, buffer=block.buf, offset=offset)[:] = a
+        layout.append((a.dtype.str, len(a), offset))
+        offset += a.nbytes
+    spec = {"name": block.name, "columns": columns, "layout": layout, "shards": len(shards)}
+    return block, spec
+
+
+def _shard_frame(block: shared_memory.SharedMemory, spec: Dict[str, Any], shard: int) -> Tuple[pd.DataFrame, np.ndarray]:
+    """(shard's rows as a frame, their positions in the full table), copied out of the block."""
+    def view(i: int) -> np.ndarray:
+        dtype, length, offset = spec["layout"][i]
+        return np.ndarray((length,), np.dtype(dtype), buffer=block.buf, offset=offset)
+
+    n_columns = len(spec["columns"])
+    rows = view(n_columns + shard).copy()
+    data = {}
+    for i, (name, kind, meta) in enumerate(spec["columns"]):
+        values = view(i)[rows]
+        if kind == "categorical":
+            data[name] = pd.Categorical.from_codes(values, categories=meta)
+        elif kind == "object":
+            out = np.empty(len(values), dtype=object)
+            out[values >= 0] = meta[values[values >= 0]]
+            data[name] = out
+        elif kind == "datetime":
+            data[name] = values.view(meta)
+        else:
+            data[name] = values
+    return pd.DataFrame(data), rows
+
+
+def _evaluate_shard(spec: Dict[str, Any], shard: int, rule_names: List[str],
+                    provided: Dict[str, Any]) -> Tuple[List[tuple], Dict[str, Any]]:
+    """Pool task: shard-local rules over one shard -> ([(rule name, table positions, params)], stats)."""
+    start = time.perf_counter()
+    block = shared_memory.SharedMemory(name=spec["name"])
+    resource_tracker.unregister(block._name, "shared_memory")  # the parent owns (and unlinks) the block
+    try:
+        df, rows = _shard_frame(block, spec, shard)
+    finally:
+        block.close()
+    rules = [_DEFAULT_RULES[name] for name in rule_names]
+    hits, stats = RuleEngine(rules).hits(df, rules, aggregates=provided)
+    stats["ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return [(rule.name, rows[idx], params) for rule, idx, params in hits], stats
+
+
+def _merge_rule_stats(shard_stats: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per-rule hits / ms / bytes summed over the shards."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for stats in shard_stats:
+        for name, rule in stats["rules"].items():
+            total = out.setdefault(name, {"enabled": True, "hits": 0, "ms": 0.0, "bytes": 0})
+            for key in ("hits", "ms", "bytes"):
+                total[key] += rule.get(key, 0)
+    for total in out.values():
+        total["ms"] = round(total["ms"], 3)
+    return out
+
+
+def _warm(_: int) -> int:
+    return len(_DEFAULT_RULES)  # importing this module in the worker loads the rules
+
+
+# ------------------- EVALUATOR -------------------
+class ShardedRuleEvaluator:
+    """engine.evaluate(df) with the Aadhaar-local rules spread over `workers` processes; see module header."""
+
+    def __init__(self, engine: RuleEngine, workers: int, min_rows: int = 200_000):
+        self.engine = engine
+        self.workers = int(workers)
+        self.min_rows = min_rows
+        self.last_stats: Optional[Dict[str, Any]] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._broken: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> "ShardedRuleEvaluator":
+        """Fork the worker processes now (call before starting threads); no-op for workers <= 1."""
+        if self.workers > 1 and self._pool is None and self._broken is None:
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("fork"))
+            list(self._pool.map(_warm, range(self.workers)))  # the first task forks every worker
+        return self
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def split(self) -> Tuple[List[Rule], List[Rule]]:
+        """(shard-local, global) enabled rules. Only built-in rules can run in a pool process."""
+        local, global_ = [], []
+        for rule in self.engine.rules.values():
+            if not rule.enabled:
+                continue
+            aggregates = set(rule.aggregates)
+            if isinstance(rule, WindowRule) and rule.key == "aadhaar":
+                aggregates -= {rule.aggregates[0], rule.aggregate}  # windows per Aadhaar stay in the shard
+            shardable = (_DEFAULT_RULES.get(rule.name) is rule and
+                         aggregates <= SHARD_LOCAL_AGGREGATES | BROADCAST_AGGREGATES)
+            (local if shardable else global_).append(rule)
+        return local, global_
+
+    def evaluate(self, df: pd.DataFrame, index: Any = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            if self._pool is not None and len(df) >= self.min_rows:
+                try:
+                    return self._evaluate(df, index)
+                except (BrokenProcessPool, OSError) as e:  # a killed worker, no /dev/shm, ...
+                    logging.warning(f"Sharded rule evaluation failed ({e!r}); evaluating in this process from now on")
+                    self._broken = repr(e)
+                    self.shutdown()
+            out = self.engine.evaluate(df, index=index)
+            self.last_stats = {"mode": "single", "rows": len(df), "ms": self.engine.last_stats.get("total_ms")}
+            if self._broken:
+                self.last_stats["reason"] = f"process pool failed: {self._broken}"
+            return out
+
+    def _evaluate(self, df: pd.DataFrame, index: Any) -> List[Dict[str, Any]]:
+        start = time.perf_counter()
+        local, global_ = self.split()
+        present = [r for r in local if all(c in df.columns for c in r.columns)]
+        shards = self._shards(df)
+
+        # broadcast scalars (a reduce over the whole table, done once here)
+        ctx = RuleContext(df)
+        provided = {name: ctx.agg(name) for name in {a for r in present for a in r.aggregates} & BROADCAST_AGGREGATES}
+
+        t = time.perf_counter()
+        block, spec = share_frame(df, shards)
+        share_ms = (time.perf_counter() - t) * 1000
+        try:
+            names = [r.name for r in present]
+            futures = [self._pool.submit(_evaluate_shard, spec, i, names, provided) for i in range(len(shards))]
+            t = time.perf_counter()
+            global_hits, global_stats = self.engine.hits(df, global_, index=index)
+            global_ms = (time.perf_counter() - t) * 1000
+            with _gc_paused():  # unpickling the shards' hit tuples
+                results = [f.result() for f in futures]
+        finally:
+            block.close()
+            block.unlink()
+
+        # reduce: every rule's hits over all shards, in rule order
+        t = time.perf_counter()
+        by_rule: Dict[str, List[tuple]] = {}
+        for shard_hits, _ in results:
+            for name, rows, params in shard_hits:
+                by_rule.setdefault(name, []).append((rows, params))
+        for rule, idx, params in global_hits:
+            by_rule.setdefault(rule.name, []).append((idx, params))
+        hits = []
+        for rule in self.engine.rules.values():
+            parts = by_rule.get(rule.name)
+            if not parts:
+                continue
+            # one hit per token and rule: records() does not need the positions sorted
+            hits.append((rule, np.concatenate([p[0] for p in parts]), [x for p in parts for x in p[1]]))
+        anomalies = self.engine.records(df, hits)
+        reduce_ms = (time.perf_counter() - t) * 1000
+
+        self.last_stats = {
+            "mode": "sharded", "rows": len(df), "workers": self.workers, "shards": len(shards),
+            "local_rules": [r.name for r in present], "global_rules": [r.name for r in global_],
+            "shard_rows": [len(s) for s in shards], "shard_ms": [s["ms"] for _, s in results],
+            "share_ms": round(share_ms, 3), "global_ms": round(global_ms, 3), "reduce_ms": round(reduce_ms, 3),
+            "flagged": len(anomalies), "ms": round((time.perf_counter() - start) * 1000, 3),
+        }
+        self.engine.last_stats = {"rows": len(df), "rules": {**global_stats["rules"],
+                                                             **_merge_rule_stats([s for _, s in results])},
+                                  "aggregates": global_stats.get("aggregates", {}), "flagged": len(anomalies),
+                                  "total_ms": self.last_stats["ms"]}
+        return anomalies
+
+    def _shards(self, df: pd.DataFrame) -> List[np.ndarray]:
+        """Row positions per shard: hash of the Aadhaar mod the number of shards (missing Aadhaar -> shard 0)."""
+        aadhaar = df["aadhaar"]
+        hashed = pd.util.hash_pandas_object(aadhaar, index=False).to_numpy()
+        shard = (hashed % np.uint64(self.workers)).astype(np.int64)
+        shard[aadhaar.isna().to_numpy()] = 0
+        order = np.argsort(shard, kind="stable")
+        bounds = np.searchsorted(shard[order], np.arange(1, self.workers))
+        return [s for s in np.split(order, bounds)]
@@ -0,0 +1,171 @@
+# =========================================================================================
+# streaming.py  —  Online anomaly scoring of newly minted / claimed tokens (half-space trees)
+#
+# 🎯 Why
+#  A token minted or claimed after the last scheduled_job had no ML verdict until the next
+#  three-hourly run. stream_job (main.py) now polls the chain's logs every
+#  STREAM_POLL_SECONDS and scores each changed token on arrival, with the same four
+#  features as run_anomaly_detection; the verdict goes into the cached results right away
+#  and the next scheduled run replaces it with the frozen batch model's verdict.
+#
+#  HalfSpaceTrees is Streaming Half-Space Trees (Tan, Ting & Liu, 2011):
+#    - `n_trees` random trees of fixed `height` over the unit cube; each node halves a random
+#      feature range. The trees are built once, from random work ranges, without data
+#    - every token walks one root-to-leaf path per tree: O(n_trees * height) per token,
+#      independent of how many tokens came before (O(1) amortized), and memory is the fixed
+#      node arrays (about 2^(height+1) * n_trees counters), never the stream
+#    - a token's mass score is, per tree, the reference-window count of the first node on
+#      its path with fewer than `size_limit` tokens (or of its leaf), times 2^depth: tokens in
+#      sparse regions get low mass. The anomaly score is 1 - mass / max mass, in [0, 1]
+#    - counts go into the latest window; every `window` tokens it becomes the reference.
+#      Scoring reads only the reference, so a batch is scored and learned in one vectorized
+#      pass per window segment, exactly as token-by-token
+#  Features are scaled to [0, 1] with the limits of the seed sample (the newest table rows);
+#  the label threshold is the (1 - contamination) quantile of the seed's own scores, same
+#  contamination as IForest's default.
+# =========================================================================================
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import numpy as np
+
+
+class HalfSpaceTrees:
+    """Streaming half-space trees over features scaled to [0, 1]; see module header."""
+
+    def __init__(self, n_features: int, n_trees: int = 25, height: int = 12, window: int = 250,
+                 size_limit: Optional[float] = None, seed: int = 42):
+        self.n_trees = n_trees
+        self.height = height
+        self.window = window
+        self.size_limit = 0.1 * window if size_limit is None else size_limit
+        rng = np.random.default_rng(seed)
+        n_nodes = 2 ** (height + 1) - 1
+        self.split_dim = np.zeros((n_trees, n_nodes), dtype=np.int16)
+        self.split_value = np.zeros((n_trees, n_nodes), dtype=np.float64)
+        # random work range per tree around a random point of the unit cube (the paper's construction)
+        s = rng.random((n_trees, n_features))
+        half = 2 * np.maximum(s, 1 - s)
+        lo, hi = (s - half)[:, None, :], (s + half)[:, None, :]
+        trees = np.arange(n_trees)[:, None]
+        for depth in range(height):  # level by level: nodes 2^d - 1 .. 2^(d+1) - 2 in heap order
+            first = 2 ** depth - 1
+            nodes = np.arange(first, 2 * first + 1)
+            dim = rng.integers(0, n_features, size=(n_trees, len(nodes)))
+            mid = (np.take_along_axis(lo, dim[..., None], 2) + np.take_along_axis(hi, dim[..., None], 2))[..., 0] / 2
+            self.split_dim[:, nodes] = dim
+            self.split_value[:, nodes] = mid
+            left_hi, right_lo = hi.copy(), lo.copy()
+            np.put_along_axis(left_hi, dim[..., None], mid[..., None], 2)
+            np.put_along_axis(right_lo, dim[..., None], mid[..., None], 2)
+            lo = np.stack([lo, right_lo], axis=2).reshape(n_trees, -1, n_features)
+            hi = np.stack([left_hi, hi], axis=2).reshape(n_trees, -1, n_features)
+        self.reference = np.zeros((n_trees, n_nodes), dtype=np.int32)
+        self.latest = np.zeros((n_trees, n_nodes), dtype=np.int32)
+        self.seen = 0  # tokens learned in the current window
+        self.windows = 0
+        self._trees = trees
+        self._max_mass = float(n_trees * window * 2 ** height)
+
+    def _paths(self, x: np.ndarray) -> np.ndarray:
+        """Node index per (token, tree, depth 0..height)."""
+        node = np.zeros((len(x), self.n_trees), dtype=np.int64)
+        paths = np.empty((len(x), self.n_trees, self.height + 1), dtype=np.int64)
+        rows = np.arange(len(x))[:, None]
+        for depth in range(self.height + 1):
+            paths[:, :, depth] = node
+            if depth < self.height:
+                dim = self.split_dim[self._trees.T, node]
+                right = x[rows, dim] > self.split_value[self._trees.T, node]
+                node = 2 * node + 1 + right
+        return paths
+
+    def _score(self, paths: np.ndarray) -> np.ndarray:
+        mass = self.reference[self._trees.T[..., None], paths]  # (tokens, trees, depth)
+        # first node below size_limit, or the leaf (counts only shrink going down a path)
+        depth = np.minimum((mass >= self.size_limit).sum(axis=2), self.height)
+        at = np.take_along_axis(mass, depth[..., None], 2)[..., 0]
+        return 1.0 - (at * 2.0 ** depth).sum(axis=1) / self._max_mass
+
+    def score_learn(self, x: np.ndarray) -> np.ndarray:
+        """Anomaly score of each row (in arrival order), then learn it: same as one row at a time."""
+        out = np.empty(len(x), dtype=np.float64)
+        start = 0
+        while start < len(x):
+            stop = min(len(x), start + self.window - self.seen)  # never cross a window boundary
+            paths = self._paths(x[start:stop])
+            out[start:stop] = self._score(paths)
+            np.add.at(self.latest, (np.broadcast_to(self._trees.T[..., None], paths.shape), paths), 1)
+            self.seen += stop - start
+            if self.seen == self.window:
+                self.reference, self.latest = self.latest, np.zeros_like(self.latest)
+                self.seen = 0
+                self.windows += 1
+            start = stop
+        return out
+
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.split_dim, self.split_value, self.reference, self.latest))
+
+
+class OnlineScorer:
+    """Scales token features and labels HalfSpaceTrees scores; seeded from the cached table."""
+
+    def __init__(self, n_trees: int = 25, height: int = 12, window: int = 250,
+                 contamination: float = 0.1, seed_rows: int = 5000, recent: int = 1000):
+        self.params = {"n_trees": n_trees, "height": height, "window": window}
+        self.contamination = contamination
+        self.seed_rows = seed_rows
+        self.trees: Optional[HalfSpaceTrees] = None
+        self.lo: Optional[np.ndarray] = None
+        self.span: Optional[np.ndarray] = None
+        self.threshold: Optional[float] = None
+        self.recent: Deque[Tuple[int, float, int]] = deque(maxlen=recent)  # (tokenId, score, label)
+        self.scored = 0
+        self.flagged = 0
+        self.us_per_token: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.trees is not None
+
+    def seed(self, features: np.ndarray) -> None:
+        """Fix the feature scaling, warm the reference window and calibrate the threshold on `features`."""
+        features = features[-self.seed_rows:]
+        with self._lock:
+            self.lo = np.nanmin(features, axis=0)
+            self.span = np.maximum(np.nanmax(features, axis=0) - self.lo, 1e-9)
+            self.trees = HalfSpaceTrees(features.shape[1], **self.params)
+            x = self._scale(features)
+            self.trees.score_learn(x)
+            if self.trees.windows == 0:  # fewer seed rows than a window: use what there is as reference
+                self.trees.reference, self.trees.latest = self.trees.latest, np.zeros_like(self.trees.latest)
+                self.trees.seen = 0
+            scores = self.trees._score(self.trees._paths(x))
+            self.threshold = float(np.quantile(scores, 1 - self.contamination))
+
+    def _scale(self, features: np.ndarray) -> np.ndarray:
+        return np.nan_to_num((features - self.lo) / self.span, nan=0.0)
+
+    def score(self, token_ids: np.ndarray, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(scores, 0/1 labels) for arriving tokens, in arrival order; the trees learn them too."""
+        with self._lock:
+            start = time.perf_counter()
+            scores = self.trees.score_learn(self._scale(features))
+            labels = (scores > self.threshold).astype(int)
+            if len(scores):
+                self.us_per_token = round((time.perf_counter() - start) * 1e6 / len(scores), 1)
+            self.scored += len(scores)
+            self.flagged += int(labels.sum())
+            self.recent.extend(zip(np.asarray(token_ids).tolist(), np.round(scores, 4).tolist(), labels.tolist()))
+            return scores, labels
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ready": self.ready, **self.params, "threshold": self.threshold, "scored": self.scored,
+                "flagged": self.flagged, "us_per_token": self.us_per_token,
+                "windows": None if self.trees is None else self.trees.windows,
+                "memory_bytes": None if self.trees is None else self.trees.nbytes(),
+                "recent_flagged": [tid for tid, _, label in list(self.recent)[-20:] if label]}
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# =========================================================================================
+# synthetic.py  —  Vectorized synthetic token generator for load testing
+#
+# 🎯 Why
+#  _create_sample_data built 20 rows one at a time with datetime arithmetic: fine for the
+#  demo, useless for capacity planning. generate_tokens builds 10^5 - 10^7 tokens in
+#  seconds with numpy and returns the same columns/dtypes as fetch_tokens_data, so rules,
+#  the model, persistence and the API can all be benchmarked at scale.
+#
+#  Realistic structure:
+#    - Aadhaar reuse      : heavy-tailed tokens per beneficiary (most get a few, some many)
+#    - families/locations : beneficiaries grouped into families, families into locations
+#    - issuers            : a handful of issuers per location
+#    - issue times        : daytime-weighted hours over `days` days, with a few spike days
+#    - claims             : ~70% claimed, exponential claim delay, unclaimed tokens expire
+#
+#  Planted anomalies (seeded, rates per token, see ANOMALY_RATES): odd-hour issue, instant
+#  claim, claim after expiry, invalid category, high/low ration, Aadhaar in several
+#  families / locations, issuer concentration, daily spikes, identity rings (off by default).
+#  return_labels=True also
+#  returns a boolean frame of what was planted where, for scoring detectors.
+#
+#    python synthetic.py --tokens 1000000            # timing + planted counts
+# =========================================================================================
+import argparse
+import sys
+import time
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from features import engineer_features
+
+CATEGORIES = np.array(["BPL", "APL", "Priority", "Antyodaya"], dtype=object)
+LOCATIONS = np.array(["Delhi", "Mumbai", "Kolkata", "Chennai", "Bengaluru", "Hyderabad",
+                      "Pune", "Ahmedabad", "Jaipur", "Lucknow", "Patna", "Bhopal"], dtype=object)
+RATION_AMOUNTS = np.array([5, 10, 15, 20, 25])
+RATION_P = np.array([0.1, 0.3, 0.4, 0.15, 0.05])
+
+# fraction of tokens each planted anomaly is applied to (spike_days: fraction of days)
+ANOMALY_RATES: Dict[str, float] = {
+    "odd_hour": 0.02,
+    "instant_claim": 0.01,
+    "expired_claim": 0.005,
+    "invalid_category": 0.002,
+    "high_ration": 0.005,
+    "low_ration": 0.005,
+    "multi_family": 0.003,
+    "multi_location": 0.003,
+    "issuer_concentration": 0.0,   # share of tokens moved to one issuer (rule 14 fires above 0.9)
+    "spike_days": 0.05,
+    "identity_ring": 0.0,          # owners of these tokens form rings of 5 Aadhaars rotating through 3 families
+}
+
+_DAY = 86400
+
+
+def generate_tokens(
+    n_tokens: int,
+    seed: int = 42,
+    anomaly_rates: Optional[Dict[str, float]] = None,
+    days: int = 30,
+    now: Optional[pd.Timestamp] = None,
+    tokens_per_aadhaar: float = 3.0,
+    featurize: bool = True,
+    return_labels: bool = False,
+) -> Union[pd.DataFrame, Tuple[pd.DataFrame, pd.DataFrame]]:
+    """
+    `n_tokens` synthetic tokens shaped like fetch_tokens_data's output (features included
+    unless featurize=False). Same seed + arguments -> same frame.
+    """
+    rates = {**ANOMALY_RATES, **(anomaly_rates or {})}
+    rng = np.random.default_rng(seed)
+    n = int(n_tokens)
+    now = pd.Timestamp(now) if now is not None else pd.Timestamp.now().floor("s")
+    now_s = now.value // 10**9
+
+    # ---- who: beneficiaries -> families -> locations, issuers per location
+    n_aadhaar = max(1, int(n / tokens_per_aadhaar))
+    # small tables (the 20-row demo) still get a few families in a few locations: one family
+    # and one location for everybody would make every token look linked
+    n_family = min(n_aadhaar, max(3, n_aadhaar // 4))
+    n_issuer_per_loc = 5
+    aadhaar_ids = _unique_aadhaars(rng, n_aadhaar)
+    family_of_aadhaar = rng.integers(0, n_family, n_aadhaar)
+    location_of_family = rng.choice(len(LOCATIONS), n_family, p=_zipf_p(len(LOCATIONS), 1.0))
+    spread = min(3, n_family)
+    if len(np.unique(location_of_family)) < spread:
+        location_of_family[:spread] = np.arange(spread)
+
+    # heavy-tailed reuse: Pareto weights over beneficiaries
+    weights = rng.pareto(1.5, n_aadhaar) + 1
+    owner = rng.choice(n_aadhaar, n, p=weights / weights.sum())
+    family = family_of_aadhaar[owner]
+    location = location_of_family[family]
+    issuer = location * n_issuer_per_loc + rng.integers(0, n_issuer_per_loc, n)
+
+    # ---- when: daytime-weighted hours over `days` days, a few spike days
+    start_s = (now_s // _DAY - days) * _DAY  # midnight, so day/hour offsets are wall-clock
+    day_p = np.ones(days)
+    spike_days = rng.random(days) < rates["spike_days"]
+    if rates["spike_days"] > 0 and not spike_days.any():
+        spike_days[rng.integers(0, days)] = True
+    day_p[spike_days] *= 5
+    day = rng.choice(days, n, p=day_p / day_p.sum())
+    hour = rng.choice(24, n, p=_hour_p())
+    issued = start_s + day * _DAY + hour * 3600 + rng.integers(0, 3600, n)
+    expiry = issued + 30 * _DAY
+
+    # ---- what: amounts, categories, claims
+    amount = rng.choice(RATION_AMOUNTS, n, p=RATION_P)
+    category = rng.integers(0, len(CATEGORIES), n)
+    claimed = rng.random(n) < 0.7
+    delay = np.minimum(rng.exponential(24 * 3600, n), 29 * _DAY).astype(np.int64) + 60
+    claim = np.where(claimed, issued + delay, 0)
+
+    # ---- planted anomalies
+    labels = {}
+
+    def plant(name: str) -> np.ndarray:
+        mask = rng.random(n) < rates.get(name, 0.0)
+        labels[name] = mask
+        return mask
+
+    m = plant("odd_hour")
+    issued[m] = issued[m] - (issued[m] - start_s) % _DAY + rng.integers(0, 5 * 3600, m.sum())
+    expiry[m] = issued[m] + 30 * _DAY
+    claim[m & claimed] = issued[m & claimed] + delay[m & claimed]
+
+    m = plant("instant_claim")
+    claimed |= m
+    claim[m] = issued[m] + rng.integers(0, 60, m.sum())
+
+    m = plant("expired_claim")
+    # issued long enough ago to be expired, then claimed after expiry
+    issued[m] = now_s - 31 * _DAY - rng.integers(0, 5 * _DAY, m.sum())
+    expiry[m] = issued[m] + 30 * _DAY
+    claimed |= m
+    claim[m] = expiry[m] + rng.integers(60, _DAY, m.sum())
+
+    m = plant("high_ration")
+    amount[m] = rng.choice([60, 80, 100], m.sum())
+    m = plant("low_ration")
+    amount[m] = rng.choice([1, 2], m.sum())
+
+    invalid = plant("invalid_category")
+
+    # same Aadhaar seen under a second family / location: move one of its tokens elsewhere
+    m = plant("multi_family")
+    family[m] = (family[m] + 1 + rng.integers(0, max(1, n_family - 1), m.sum())) % n_family
+    m = plant("multi_location")
+    location[m] = (location[m] + 1 + rng.integers(0, len(LOCATIONS) - 1, m.sum())) % len(LOCATIONS)
+
+    m = plant("issuer_concentration")
+    issuer[m] = 0
+
+    # identity rings: every token of a ring member goes to one of its ring's 3 families
+    m = plant("identity_ring")
+    members = rng.permutation(np.unique(owner[m]))
+    if len(members):
+        ring_of = np.full(n_aadhaar, -1)
+        ring_of[members] = np.arange(len(members)) // 5
+        ring_families = rng.integers(0, n_family, (ring_of.max() + 1, 3))
+        rows = np.flatnonzero(ring_of[owner] >= 0)
+        family[rows] = ring_families[ring_of[owner[rows]], rng.integers(0, 3, len(rows))]
+        moved = ~labels["multi_location"][rows]
+        location[rows[moved]] = location_of_family[family[rows[moved]]]
+        labels["identity_ring"] = ring_of[owner] >= 0
+
+    labels["spike_day"] = spike_days[((issued - start_s) // _DAY).clip(0, days - 1)]
+    is_expired = (expiry < now_s) & (~claimed | (claim > expiry))
+    claim[~claimed] = 0
+
+    # ---- assemble with the same columns / dtypes as fetch_tokens_data
+    category_values = CATEGORIES[category]
+    category_values[invalid] = "UNKNOWN"
+    aadhaar_str = aadhaar_ids.astype(str).astype(object)
+    family_str = np.char.add("FAM", np.arange(n_family).astype(str)).astype(object)
+    issuer_str = np.char.add("ISSUER", np.arange(len(LOCATIONS) * n_issuer_per_loc).astype(str)).astype(object)
+
+    df = pd.DataFrame({
+        "tokenId": np.arange(1, n + 1, dtype=np.int64),
+        "aadhaar": aadhaar_str[owner],
+        "rationAmount": amount.astype(np.int64),
+        "issuedTime": _seconds_to_datetime(issued),
+        "expiryTime": _seconds_to_datetime(expiry),
+        "claimTime": _claim_times(claim, claimed),
+        "isClaimed": claimed,
+        "isExpired": is_expired,
+        "category": category_values,
+        "familyId": family_str[family],
+        "location": LOCATIONS[location],
+        "issuedBy": issuer_str[issuer],
+    })
+    if featurize:
+        df = engineer_features(df)
+    if return_labels:
+        return df, pd.DataFrame(labels)
+    return df
+
+
+def demo_tokens(seed: int = 42) -> pd.DataFrame:
+    """The 20-token demo table (main._create_sample_data): about one token per beneficiary, like a month of rations."""
+    return generate_tokens(20, seed=seed, tokens_per_aadhaar=1.0)
+
+
+# ------------------- HELPERS -------------------
+def _unique_aadhaars(rng: np.random.Generator, k: int) -> np.ndarray:
+    """k distinct 12-digit numbers (oversample + unique; the 9e11 space makes collisions rare)."""
+    out = np.unique(rng.integers(100000000000, 999999999999, int(k * 1.05) + 16))
+    while len(out) < k:
+        out = np.unique(np.concatenate([out, rng.integers(100000000000, 999999999999, k)]))
+    return rng.permutation(out)[:k]
+
+
+def _zipf_p(k: int, s: float) -> np.ndarray:
+    p = 1.0 / np.arange(1, k + 1) ** s
+    return p / p.sum()
+
+
+def _hour_p() -> np.ndarray:
+    """Issue-hour distribution: shop hours dominate, 0-5am is rare (planted separately)."""
+    p = np.full(24, 0.2)
+    p[5:8] = 1.0
+    p[8:20] = 4.0
+    p[20:23] = 1.0
+    p[:5] = 0.02
+    return p / p.sum()
+
+
+def _seconds_to_datetime(seconds: np.ndarray) -> np.ndarray:
+    return (seconds.astype(np.int64) * 10**9).astype("datetime64[ns]")
+
+
+def _claim_times(claim: np.ndarray, claimed: np.ndarray) -> np.ndarray:
+    out = _seconds_to_datetime(claim)
+    out[~claimed] = np.datetime64("NaT")
+    return out
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Generate synthetic tokens and report timing")
+    parser.add_argument("--tokens", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="", help="optional .parquet / .csv / .pkl output")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df, labels = generate_tokens(args.tokens, seed=args.seed, return_labels=True)
+    secs = time.perf_counter() - start
+    print(f"⚡ {len(df):,} tokens in {secs:.2f}s ({len(df) / secs:,.0f} tokens/s), "
+          f"{df['aadhaar'].nunique():,} beneficiaries, {df.memory_usage(deep=True).sum() / 2**20:,.0f} MiB")
+    print("🎯 Planted: " + ", ".join(f"{k}={int(v.sum()):,}" for k, v in labels.items()))
+    if args.out:
+        if args.out.endswith(".parquet"):
+            df.to_parquet(args.out)
+        elif args.out.endswith(".csv"):
+            df.to_csv(args.out, index=False)
+        else:
+            df.to_pickle(args.out)
+        print(f"💾 Wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+AI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the service is flat modules in ai/ (run as `python main.py`), not a package
+sys.path.insert(0, AI_DIR)
+
+
+@pytest.fixture(autouse=True)
+def _in_ai_dir(monkeypatch):
+    # DCVToken.json and friends are opened relative to the working directory
+    monkeypatch.chdir(AI_DIR)
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from incremental_rules import IncrementalRuleEvaluator
+from rules import DEFAULT_RULES, Reason, RuleEngine
+from synthetic import generate_tokens
+
+LINKED = ("familyId", "location", "issuedBy")
+
+
+def _ring(df: pd.DataFrame, aadhaars: int) -> pd.DataFrame:
+    """`aadhaars` identities rotating through three families, as new tokens after df's."""
+    tokens = [(900000000000 + i, f"FAM-R{(i + k) % 3}", "Hamlet", f"ISSUER-R{k}") for i in range(aadhaars)
+              for k in range(3)]
+    extra = df.iloc[:len(tokens)].copy()
+    extra["tokenId"] = df["tokenId"].max() + 1 + np.arange(len(tokens))
+    for column, values in zip(("aadhaar", *LINKED), zip(*tokens)):
+        extra[column] = np.array(values, dtype=df[column].dtype if column == "aadhaar" else object)
+    return extra
+
+
+def test_identity_clusters_relabelled_around_the_changed_tokens():
+    # over 5,000 Aadhaars: the hub limit no longer moves with the table size
+    base = generate_tokens(9000, seed=0, tokens_per_aadhaar=1.5).astype({c: object for c in LINKED})
+    engine = RuleEngine(DEFAULT_RULES)
+    evaluator = IncrementalRuleEvaluator(RuleEngine(DEFAULT_RULES))
+    evaluator.evaluate(base)
+
+    ring = _ring(base, 5)
+    frames = [pd.concat([base, ring], ignore_index=True),                    # a ring appears
+              pd.concat([base, ring.iloc[6:]], ignore_index=True),           # two of its Aadhaars burn out
+              pd.concat([base.iloc[100:], ring.iloc[6:]], ignore_index=True)]  # unrelated burns
+    for step, df in enumerate(frames):
+        out = evaluator.evaluate(df)
+        assert out == engine.evaluate(df)
+        assert evaluator.last_stats["mode"] == "incremental"
+        assert 0 < evaluator.last_stats["relinked"] < len(df) // 2  # not the whole table
+        if step == 0:
+            assert set(ring["tokenId"]) <= {a["tokenId"] for a in out if Reason.IDENTITY_RING in a["codes"]}
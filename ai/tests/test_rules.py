@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from rules import DEFAULT_RULES, Reason, RuleEngine
+from synthetic import generate_tokens
+
+LINKED = ("familyId", "location", "issuedBy")
+
+
+def _background(n: int = 3000) -> pd.DataFrame:
+    return generate_tokens(n, seed=0).astype({c: object for c in LINKED})
+
+
+def _with_group(df: pd.DataFrame, tokens) -> pd.DataFrame:
+    """df plus one token per (aadhaar, familyId, location, issuedBy) in `tokens`, copied from df's first rows."""
+    extra = df.iloc[:len(tokens)].copy()
+    extra["tokenId"] = df["tokenId"].max() + 1 + np.arange(len(tokens))
+    for column, values in zip(("aadhaar", *LINKED), zip(*tokens)):
+        extra[column] = np.array(values, dtype=df[column].dtype if column == "aadhaar" else object)
+    return pd.concat([df, extra], ignore_index=True)
+
+
+def _ring_hits(df: pd.DataFrame) -> set:
+    engine = RuleEngine([r for r in DEFAULT_RULES if r.name == "identity_ring"])
+    return {a["tokenId"] for a in engine.evaluate(df) if Reason.IDENTITY_RING in a["codes"]}
+
+
+def test_identity_ring_quiet_on_clean_background():
+    assert _ring_hits(_background()) == set()
+
+
+def test_identity_ring_ignores_one_shared_family():
+    # a household: four Aadhaars of one family, in one location, served by one issuer
+    household = [(900000000000 + i, "FAM-HOUSE", "Hamlet", "ISSUER-HAMLET") for i in range(4) for _ in range(2)]
+    assert _ring_hits(_with_group(_background(), household)) == set()
+
+
+def test_identity_ring_ignores_one_shared_location():
+    # four unrelated Aadhaars (own families) in one small location with its one issuer
+    neighbours = [(900000000000 + i, f"FAM-N{i}", "Hamlet", "ISSUER-HAMLET") for i in range(4) for _ in range(2)]
+    assert _ring_hits(_with_group(_background(), neighbours)) == set()
+
+
+def test_identity_ring_flags_identities_rotating_through_families():
+    # five Aadhaars rotating through the same three families
+    ring = [(900000000000 + i, f"FAM-R{(i + k) % 3}", "Hamlet", f"ISSUER-R{k}") for i in range(5) for k in range(3)]
+    df = _with_group(_background(), ring)
+    assert _ring_hits(df) == set(df["tokenId"].iloc[-len(ring):])
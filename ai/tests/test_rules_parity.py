@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from features import engineer_features
+from rules import DEFAULT_RULES, LEGACY_RULES, RuleEngine, _detect_rule_based_anomalies_loop, render_reasons
+from schema import compact_tokens
+from synthetic import generate_tokens
+
+# anomaly mixes that make every legacy rule fire somewhere (same as benchmark.py rules)
+RATES = [{}, {"issuer_concentration": 0.95}, {"odd_hour": 0.3, "spike_days": 0.2, "instant_claim": 0.1}]
+
+
+def _frame(seed: int, n: int = 300) -> pd.DataFrame:
+    df = generate_tokens(n, seed=seed, anomaly_rates=RATES[seed], tokens_per_aadhaar=1.5, featurize=False)
+    return engineer_features(df, compact=False)  # loose object dtypes, as the row loop saw them
+
+
+def _edge(df: pd.DataFrame, seed: int) -> pd.DataFrame:
+    """Missing / empty attributes, missing claim times and duplicated rows (same tokenId twice)."""
+    rng = np.random.default_rng(seed)
+    n = len(df)
+    edge = df.copy()
+    for col in ["familyId", "location", "issuedBy", "category"]:
+        edge.loc[rng.choice(n, n // 20, replace=False), col] = None
+        edge.loc[rng.choice(n, n // 50, replace=False), col] = ""
+    edge.loc[rng.choice(n, n // 20, replace=False), "claimTime"] = pd.NaT
+    return pd.concat([edge, edge.sample(n // 30, random_state=seed)], ignore_index=True)
+
+
+def _texts(anomalies):
+    """Rendered anomalies in the row loop's shape (reason text instead of codes / params)."""
+    keep = ("tokenId", "aadhaar", "issuedAt", "claimAt", "reasons")
+    return [{k: a[k] for k in keep} for a in render_reasons(anomalies)]
+
+
+@pytest.mark.parametrize("seed", range(len(RATES)))
+@pytest.mark.parametrize("edge", [False, True], ids=["clean", "edge"])
+def test_columnar_engine_matches_row_loop(seed, edge):
+    legacy = RuleEngine([r for r in DEFAULT_RULES if r.name in LEGACY_RULES])  # what the row loop implements
+    df = _frame(seed)
+    if edge:
+        df = _edge(df, seed)
+    ref = _detect_rule_based_anomalies_loop(df)
+    assert ref, "frame should trigger some rules"
+    assert _texts(legacy.evaluate(df)) == ref
+    assert _texts(legacy.evaluate(compact_tokens(df.copy()))) == ref
+
+    subset = df["tokenId"].sample(25, random_state=seed).tolist()
+    assert _texts(legacy.evaluate(df, subset)) == _detect_rule_based_anomalies_loop(df, subset)
@@ -0,0 +1,18 @@
+from rules import detect_rule_based_anomalies
+from synthetic import demo_tokens, generate_tokens
+
+
+def test_small_tables_get_several_families_and_locations():
+    for seed in range(10):
+        df = generate_tokens(20, seed=seed)
+        assert df["familyId"].nunique() >= 2
+        assert df["location"].nunique() >= 2
+
+
+def test_demo_data_has_a_realistic_anomaly_rate():
+    df = demo_tokens()
+    assert len(df) == 20
+    flagged = detect_rule_based_anomalies(df)
+    # the demo should show some anomalies, not flag (nearly) every token
+    assert 0 < len(flagged) <= len(df) // 2
+    assert not any(20 in a["codes"] for a in flagged)  # identity_ring
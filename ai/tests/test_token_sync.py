@@ -0,0 +1,76 @@
+from eth_abi import encode
+from eth_utils import encode_hex, keccak
+from web3 import Web3
+
+from ingestion import _fetch_sequential
+from rpc_replay import ReplayNode, _offline_contract, synthetic_fixture
+from token_store import TokenStore
+from token_sync import CLAIM_TIME, IS_CLAIMED, TokenSync
+
+FIRST_BLOCK = 1_000_000  # synthetic_fixture's first block
+TOKENS_PER_BLOCK = 5
+
+
+def _mint_block(tid: int) -> int:
+    return FIRST_BLOCK + (tid - 1) // TOKENS_PER_BLOCK
+
+
+def test_reorg_rolls_back_only_the_forked_blocks():
+    fixture = synthetic_fixture(100, claim_rate=1.0, tokens_per_block=TOKENS_PER_BLOCK)
+    _, offline = _offline_contract(fixture["contract"])
+    head = fixture["block_number"]
+    confirmations = 10
+    base = head - confirmations
+
+    with ReplayNode(fixture) as node:
+        # the replay node answers getAllTokens for the head; the bootstrap reads `base`
+        node.calls[offline.encodeABI(fn_name="getAllTokens").lower()] = encode_hex(
+            encode(["uint256[]"], [[tid for tid in range(1, 101) if _mint_block(tid) <= base]]))
+        contract = Web3(Web3.HTTPProvider(node.url)).eth.contract(address=fixture["contract"], abi=offline.abi)
+        fetched = []
+
+        def fetch(token_ids, block):
+            fetched.extend(token_ids)
+            return _fetch_sequential(contract, token_ids, block)
+
+        sync = TokenSync(contract, fetch, block_range=2000, confirmations=confirmations)
+        sync.sync()
+        assert sorted(sync.tokens) == list(range(1, 101))
+
+        # 3-block reorg: the last three blocks get new hashes and the new branch has no logs
+        fork = head - 3
+        for number in range(fork + 1, head + 1):
+            node.hashes[number] = encode_hex(keccak(b"fork" + number.to_bytes(32, "big")))
+        node.logs = [entry for entry in node.logs if int(entry["blockNumber"], 16) <= fork]
+        orphaned_mints = {tid for tid in range(1, 101) if _mint_block(tid) > fork}
+        # claims land one block after the mint: these tokens stay, their claim is orphaned
+        orphaned_claims = {tid for tid in range(1, 101) if _mint_block(tid) + 1 > fork} - orphaned_mints
+        assert orphaned_mints and orphaned_claims
+
+        fetched.clear()
+        sync.removed.clear()
+        stats = sync.sync()
+
+    assert stats["rolled_back"] == len(orphaned_mints | orphaned_claims)
+    assert sync.removed == orphaned_mints
+    assert set(sync.tokens) == set(range(1, 101)) - orphaned_mints
+    for tid in orphaned_claims:
+        assert sync.tokens[tid][IS_CLAIMED] is False and sync.tokens[tid][CLAIM_TIME] == 0
+    assert fetched == []  # nothing below the fork had to be read again
+    assert sync.last_block == head
+
+
+def test_save_sync_persists_changes_once(tmp_path):
+    fixture = synthetic_fixture(60, tokens_per_block=TOKENS_PER_BLOCK)
+    _, offline = _offline_contract(fixture["contract"])
+    with ReplayNode(fixture) as node:
+        contract = Web3(Web3.HTTPProvider(node.url)).eth.contract(address=fixture["contract"], abi=offline.abi)
+        sync = TokenSync(contract, lambda ids, block: _fetch_sequential(contract, ids, block), confirmations=5)
+        sync.sync()
+
+    store = TokenStore(str(tmp_path / "tokens.sqlite"))
+    assert store.save_sync(sync) == 60
+    assert store.save_sync(sync) == 0  # change sets were taken
+    rows, last_block, reorg_state = store.load_tokens()
+    assert rows == sync.records()
+    assert last_block == sync.last_block and reorg_state == sync.reorg_state()
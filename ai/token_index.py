@@ -0,0 +1,194 @@
+# =========================================================================================
+# token_index.py  —  Secondary indexes over the token table (Aadhaar, family, location,
+#                    issuer, issue day -> row positions)
+#
+# 🎯 Why
+#  Every Aadhaar-, family- or day-scoped question was answered with a full boolean mask
+#  (df[df["aadhaar"] == x], isin over the whole table) and every group rule re-hashed the
+#  same key columns with groupby. At 10^6 tokens that is milliseconds per question and
+#  hundreds of milliseconds per evaluation, for keys that do not change between refreshes.
+#
+#  TokenIndex keeps, per key column, a hash map key -> group number and the row positions
+#  sorted by group (CSR: `order` + `offsets`), plus the group code of every row:
+#    - rows("location", "Delhi")           -> positions, one dict lookup + one slice (µs)
+#    - rows_any("issuedBy", [...])         -> positions of several keys
+#    - codes("aadhaar")                    -> group code per row (-1 = missing), used by the
+#                                             rule engine instead of groupby hashing
+#  refresh(df) is called once per refresh. When the new frame only appends tokens to the
+#  previous one (new mints; claims do not touch key columns) the new rows go into a small
+#  tail CSR per column, merged at lookup; any removal, reorder or key edit, or a tail over
+#  `compact_ratio` of the table, rebuilds from scratch (vectorized factorize + argsort).
+# =========================================================================================
+import datetime
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from schema import python_values
+
+INDEX_COLUMNS = ["aadhaar", "familyId", "location", "issuedBy", "issueDay"]
+_EMPTY = np.zeros(0, dtype=np.int64)
+
+
+def _column_values(df: pd.DataFrame, column: str) -> pd.Series:
+    if column == "issueDay":  # issuedTime floored to midnight, on the int64 seconds (NaT stays NaT)
+        seconds = df["issuedTime"].to_numpy(dtype="datetime64[s]").view(np.int64)
+        nat = seconds == np.iinfo(np.int64).min
+        days = np.where(nat, seconds, seconds - seconds % 86400)
+        return pd.Series(days.view("datetime64[s]"), index=df.index)
+    return df[column]
+
+
+def _keys(uniques: Any) -> List[Any]:
+    """Distinct values as plain Python keys (int Aadhaar, str, datetime.date for days)."""
+    values = np.asarray(uniques)
+    if values.dtype.kind == "M":
+        return values.astype("datetime64[D]").tolist()
+    return python_values(pd.Series(values))
+
+
+def _csr(codes: np.ndarray, groups: int):
+    """Positions sorted by group (missing rows dropped) and each group's [start, end) in them."""
+    order = np.argsort(codes, kind="stable")
+    order = order[codes[order] >= 0]
+    offsets = np.zeros(groups + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes[order], minlength=groups), out=offsets[1:])
+    return order.astype(np.int64), offsets
+
+
+class _Postings:
+    """One indexed column: key -> group, rows per group (base CSR + appended tail CSR)."""
+
+    def __init__(self, values: pd.Series):
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, uniques = values.cat.codes.to_numpy().astype(np.int64), values.cat.categories
+        else:
+            codes, uniques = pd.factorize(values)
+            codes = codes.astype(np.int64)
+        self.codes = codes
+        self.keys: Dict[Any, int] = {k: i for i, k in enumerate(_keys(uniques))}
+        self.base_rows = len(codes)
+        self.order, self.offsets = _csr(codes, len(self.keys))
+        self.tail_order, self.tail_offsets = _EMPTY, np.zeros(1, dtype=np.int64)
+
+    def append(self, values: pd.Series) -> None:
+        """Rows appended at the end of the frame (new keys get new group numbers)."""
+        new = np.fromiter((-1 if k is None else self.keys.setdefault(k, len(self.keys))
+                           for k in _keys(values.to_numpy())), dtype=np.int64, count=len(values))
+        self.codes = np.concatenate([self.codes, new])
+        order, self.tail_offsets = _csr(self.codes[self.base_rows:], len(self.keys))
+        self.tail_order = order + self.base_rows
+
+    @property
+    def tail_rows(self) -> int:
+        return len(self.codes) - self.base_rows
+
+    def rows(self, key: Any) -> np.ndarray:
+        group = self.keys.get(key)
+        if group is None:
+            return _EMPTY
+        base = self.order[self.offsets[group]:self.offsets[group + 1]] if group + 1 < len(self.offsets) else _EMPTY
+        if group + 1 >= len(self.tail_offsets):
+            return base
+        tail = self.tail_order[self.tail_offsets[group]:self.tail_offsets[group + 1]]
+        return np.concatenate([base, tail]) if len(tail) else base
+
+
+class TokenIndex:
+    """Secondary indexes for one token frame; see module header."""
+
+    def __init__(self, compact_ratio: float = 0.1):
+        self.compact_ratio = compact_ratio  # rebuild once appended rows exceed this share of the table
+        self._lock = threading.Lock()
+        self._columns: Dict[str, _Postings] = {}
+        self._tids: Optional[np.ndarray] = None
+        self._hashes: Optional[np.ndarray] = None  # per-row hash of the key columns (detects edits)
+        self.last_stats: Optional[Dict[str, Any]] = None
+
+    # ------------------- BUILD -------------------
+    def refresh(self, df: pd.DataFrame) -> "TokenIndex":
+        """Bring the index in line with df (append-only changes incrementally, anything else by rebuild)."""
+        with self._lock:
+            start = time.perf_counter()
+            tids = df["tokenId"].to_numpy()
+            columns = [c for c in INDEX_COLUMNS if c in df.columns or (c == "issueDay" and "issuedTime" in df.columns)]
+            hashes = pd.util.hash_pandas_object(
+                pd.DataFrame({c: _column_values(df, c) for c in columns}), index=False).to_numpy()
+            m = 0 if self._tids is None else len(self._tids)
+            appended = len(tids) - m
+            appendable = (self._tids is not None and set(columns) == set(self._columns) and appended >= 0
+                          and np.array_equal(tids[:m], self._tids) and np.array_equal(hashes[:m], self._hashes))
+            base_rows = min((p.base_rows for p in self._columns.values()), default=0)
+            if appendable and (len(tids) - base_rows) <= self.compact_ratio * len(tids):
+                mode = "unchanged" if appended == 0 else "append"
+                if appended:
+                    for column, postings in self._columns.items():
+                        postings.append(_column_values(df, column).iloc[m:])
+            else:
+                mode = "full"
+                self._columns = {c: _Postings(_column_values(df, c)) for c in columns}
+            self._tids, self._hashes = tids.copy(), hashes
+            self.last_stats = {"mode": mode, "rows": len(tids), "appended": max(appended, 0) if mode != "full" else 0,
+                               "keys": {c: len(p.keys) for c, p in self._columns.items()},
+                               "ms": round((time.perf_counter() - start) * 1000, 3)}
+            return self
+
+    # ------------------- LOOKUPS -------------------
+    def covers(self, df: pd.DataFrame) -> bool:
+        """True when the index was built for exactly this frame's rows (same tokenIds, same order)."""
+        return self._tids is not None and len(df) == len(self._tids) and \
+            np.array_equal(df["tokenId"].to_numpy(), self._tids)
+
+    def has(self, column: str) -> bool:
+        return column in self._columns
+
+    def codes(self, column: str) -> np.ndarray:
+        """Group code per row (-1 = missing); equal codes <=> equal key."""
+        return self._columns[column].codes
+
+    def groups(self, column: str) -> int:
+        return len(self._columns[column].keys)
+
+    def rows(self, column: str, key: Any) -> np.ndarray:
+        """Row positions holding `key` in `column` (empty when unknown)."""
+        postings = self._columns[column]
+        return postings.rows(self._key(postings, column, key))
+
+    def rows_any(self, column: str, keys: Iterable[Any]) -> np.ndarray:
+        """Row positions holding any of `keys`, ascending."""
+        parts = [self.rows(column, k) for k in keys]
+        parts = [p for p in parts if len(p)]
+        return np.sort(np.concatenate(parts)) if parts else _EMPTY
+
+    def lookup(self, **filters: Any) -> np.ndarray:
+        """Row positions matching every column=value filter (None values are ignored), ascending."""
+        result: Optional[np.ndarray] = None
+        for column, key in filters.items():
+            if key is None:
+                continue
+            rows = np.sort(self.rows(column, key))
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+            if len(result) == 0:
+                break
+        return np.arange(len(self._tids)) if result is None else result
+
+    @staticmethod
+    def _key(postings: _Postings, column: str, key: Any) -> Any:
+        """API strings / timestamps -> the stored key type (Aadhaar digits -> int, day -> date)."""
+        if key in postings.keys:
+            return key
+        if column == "issueDay" and isinstance(key, datetime.datetime):  # also pd.Timestamp
+            return key.date()
+        if not isinstance(key, str):
+            return key
+        if column == "issueDay":
+            try:
+                return datetime.date.fromisoformat(key)
+            except ValueError:
+                return key
+        if key.isdigit():
+            return int(key)
+        return key
@@ -0,0 +1,162 @@
+# =========================================================================================
+# token_store.py  —  Persistent SQLite token store for warm starts
+#
+# 🎯 Why
+#  latest_df / the synced token table only ever lived in process memory, so every restart
+#  of main.py or app.py re-downloaded the whole chain before it could serve a request.
+#
+#  The store sits next to the service (TOKEN_STORE_PATH, default ./token_store.sqlite)
+#  and holds:
+#    - tokens    : raw getTokenData rows (what TokenSync keeps in memory)
+#    - features  : the engineered DataFrame from the last analysis run (latest_df)
+#    - meta      : sync checkpoint (last_block + reorg journal), last results JSON, features dtypes
+#    - models    : the last few fitted detectors (pickled) with their feature schema,
+#                  threshold and training window (see model_lifecycle.py)
+#
+#  Startup loads all of it so the API serves immediately. A background catch-up sync then
+#  applies whatever happened on-chain while the service was down.
+# =========================================================================================
+import json
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from schema import compact_tokens
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tokens (
+    tokenId      INTEGER PRIMARY KEY,
+    aadhaar      TEXT    NOT NULL,   -- uint256 on-chain, kept as text to avoid overflow
+    shopkeeper   TEXT,
+    rationAmount INTEGER,
+    issuedTime   INTEGER,
+    expiryTime   INTEGER,
+    claimTime    INTEGER,
+    isClaimed    INTEGER,
+    isExpired    INTEGER,
+    category     TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS models (
+    version  INTEGER PRIMARY KEY,
+    meta     TEXT NOT NULL,     -- JSON: features, threshold, training window, config
+    artifact BLOB NOT NULL      -- pickled fitted detector
+);
+"""
+
+
+def _json_default(o: Any) -> Any:
+    # numpy scalars (tokenId, counts, ...) -> plain python so they round-trip unchanged
+    return o.item() if hasattr(o, "item") else str(o)
+
+
+class TokenStore:
+    """SQLite-backed persistence for the token table, engineered features and sync checkpoint."""
+
+    def __init__(self, path: str = "token_store.sqlite"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    # ------------------- META -------------------
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: Optional[str]) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # ------------------- TOKENS + CHECKPOINT -------------------
+    def save_sync(self, token_sync) -> int:
+        """Persist rows changed since the last save plus the checkpoint, atomically. Returns rows written."""
+        changes = token_sync.take_changes()
+        rows = [
+            (int(d[0]), str(d[1]), d[2], int(d[3]), int(d[4]), int(d[5]), int(d[6]),
+             int(bool(d[7])), int(bool(d[8])), d[9])
+            for d in changes["rows"]
+        ]
+        removed = [(tid,) for tid in changes["removed"]]
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO tokens VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+                )
+                self._conn.executemany("DELETE FROM tokens WHERE tokenId = ?", removed)
+                last_block = changes["last_block"]
+                self._set_meta("last_block", None if last_block is None else str(last_block))
+                self._set_meta("sync_reorg", json.dumps(changes["reorg_state"]))
+        except Exception:
+            token_sync.restore_changes(changes)  # written next time
+            raise
+        return len(rows) + len(removed)
+
+    def load_tokens(self) -> Tuple[List[tuple], Optional[int], Optional[Dict[str, Any]]]:
+        """(getTokenData-shaped rows ordered by tokenId, last_block checkpoint, reorg journal)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM tokens ORDER BY tokenId").fetchall()
+            last_block = self._get_meta("last_block")
+            reorg_state = self._get_meta("sync_reorg")
+        tokens = [
+            (tid, int(aadhaar), shopkeeper, amount, issued, expiry, claim, bool(claimed), bool(expired), category)
+            for tid, aadhaar, shopkeeper, amount, issued, expiry, claim, claimed, expired, category in rows
+        ]
+        return (
+            tokens,
+            int(last_block) if last_block is not None else None,
+            json.loads(reorg_state) if reorg_state is not None else None,
+        )
+
+    # ------------------- FEATURES + RESULTS -------------------
+    def save_analysis(self, df: pd.DataFrame, results: Dict[str, Any]) -> None:
+        """Persist the engineered DataFrame (latest_df) and its analysis results (latest_results)."""
+        dtypes = {col: str(dtype) for col, dtype in df.dtypes.items()}
+        with self._lock, self._conn:
+            df.to_sql("features", self._conn, if_exists="replace", index=False)
+            self._set_meta("features_dtypes", json.dumps(dtypes))
+            self._set_meta("results", json.dumps(results, default=_json_default))
+
+    def load_analysis(self) -> Tuple[Optional[pd.DataFrame], Optional[Dict[str, Any]]]:
+        with self._lock:
+            dtypes = self._get_meta("features_dtypes")
+            results = self._get_meta("results")
+            if dtypes is None:
+                return None, None
+            df = pd.read_sql("SELECT * FROM features", self._conn)
+
+        # SQLite has no datetime/bool types: restore what the analysis code expects
+        for col, dtype in json.loads(dtypes).items():
+            if col not in df.columns:
+                continue
+            try:
+                if dtype.startswith("datetime64"):
+                    df[col] = pd.to_datetime(df[col])
+                elif dtype != "object":
+                    df[col] = df[col].astype(dtype)
+            except (TypeError, ValueError) as e:
+                logging.warning(f"[Store] Could not restore dtype {dtype} for column {col}: {e}")
+        return compact_tokens(df), (json.loads(results) if results is not None else None)
+
+    # ------------------- MODELS -------------------
+    def save_model(self, meta: Dict[str, Any], artifact: bytes, keep: int = 3) -> int:
+        """Persist a fitted detector under the next version number, keeping the `keep` newest. Returns the version."""
+        with self._lock, self._conn:
+            version = self._conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM models").fetchone()[0]
+            self._conn.execute("INSERT INTO models VALUES (?, ?, ?)",
+                               (version, json.dumps({**meta, "version": version}, default=_json_default),
+                                sqlite3.Binary(artifact)))
+            self._conn.execute("DELETE FROM models WHERE version <= ?", (version - keep,))
+        return version
+
+    def load_model(self) -> Tuple[Optional[Dict[str, Any]], Optional[bytes]]:
+        """(meta, pickled detector) of the newest model, or (None, None)."""
+        with self._lock:
+            row = self._conn.execute("SELECT meta, artifact FROM models ORDER BY version DESC LIMIT 1").fetchone()
+        return (json.loads(row[0]), bytes(row[1])) if row else (None, None)
@@ -0,0 +1,363 @@
+# =========================================================================================
+# token_sync.py  —  Event-sourced incremental sync of the DCVToken token table
+#
+# 🎯 Why
+#  A full refresh re-reads every token with getTokenData, so its cost grows with the total
+#  token count. DCVToken already tells us what changed:
+#
+#       TokenMinted(tokenId, aadhaar, rationAmount, expiryTime)  -> new row (category and
+#                                                                  shopkeeper are not in the
+#                                                                  event, so fetch the row)
+#       TokenClaimed(tokenId, aadhaar, claimedTime)              -> isClaimed=True, claimTime
+#       TokenExpired(tokenId, aadhaar)                           -> isExpired=True
+#
+#  TokenSync keeps the raw getTokenData tuples in memory plus a last-processed-block
+#  checkpoint. The first sync bootstraps with one full (batched) fetch pinned to the head
+#  block. Every later sync pulls only the new logs with eth_getLogs, in bounded block
+#  ranges, and upserts them. Refresh cost then scales with chain activity. Tokens changed
+#  by logs are also queued for online scoring between refreshes (drain_events, streaming.py).
+#  A minted token whose getTokenData fetch fails stays pending and is fetched again on every
+#  later sync until it succeeds, so moving the checkpoint past its log never loses it.
+#
+# 🔁 Reorgs (Polygon Amoy does reorg)
+#  Everything applied within the last `confirmations` blocks is journaled, at the block of
+#  the log that caused it, with the row it replaced, and the block hashes we relied on are
+#  remembered (window ends + log blocks). At the start of each sync the checkpoint block's
+#  hash is re-read. If it changed, we walk back through the remembered hashes to the newest
+#  block that is still canonical, undo only the journaled row changes above it, move the
+#  checkpoint back and re-apply the canonical logs from there. No full resync. The bootstrap reads state `confirmations`
+#  blocks behind head, so it never needs undoing.
+# =========================================================================================
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from eth_utils import encode_hex, event_abi_to_log_topic
+from web3.exceptions import BlockNotFound
+
+# getTokenData tuple positions (see RationTokenData in blockchain/src/DCVToken.sol)
+CLAIM_TIME, IS_CLAIMED, IS_EXPIRED = 6, 7, 8
+
+SYNC_EVENTS = ("TokenMinted", "TokenClaimed", "TokenExpired")
+
+
+class TokenSync:
+    """
+    In-memory token table kept current from DCVToken events.
+
+    fetch_many(token_ids, block_identifier) -> List[getTokenData tuple] is the ingestion
+    function used for the bootstrap and for newly minted tokens (see ingestion.py).
+    """
+
+    def __init__(
+        self,
+        contract,
+        fetch_many: Callable[[Sequence[int], Any], List[tuple]],
+        block_range: int = 2000,
+        confirmations: int = 64,
+    ):
+        self.contract = contract
+        self.w3 = contract.w3
+        self.fetch_many = fetch_many
+        self.block_range = max(1, int(block_range))
+        self.confirmations = max(0, int(confirmations))
+
+        self.tokens: Dict[int, list] = {}
+        self.last_block: Optional[int] = None
+        self.dirty: Set[int] = set()    # tokenIds changed since the last persist (see token_store.py)
+        self.removed: Set[int] = set()  # tokenIds dropped by a reorg rollback since the last persist
+        self.events: Set[int] = set()   # tokenIds changed by logs since the last drain_events() (online scoring)
+        self.pending: Dict[int, int] = {}  # minted tokenId -> block of its TokenMinted log, row not fetched yet
+        self._lock = threading.Lock()
+
+        # reorg bookkeeping for the unconfirmed window (final_block, last_block]
+        self.final_block: Optional[int] = None
+        self.block_hashes: Dict[int, str] = {}
+        # (state_block, log_block, tokenId, previous row or None if the row was new)
+        self.journal: List[Tuple[int, int, int, Optional[tuple]]] = []
+
+        self._events = {}
+        for entry in contract.abi:
+            if entry.get("type") == "event" and entry.get("name") in SYNC_EVENTS:
+                topic = encode_hex(event_abi_to_log_topic(entry))
+                self._events[topic] = getattr(contract.events, entry["name"])()
+
+    # ------------------- PUBLIC -------------------
+    def records(self) -> List[tuple]:
+        """Current token table as getTokenData tuples, ordered by tokenId (like getAllTokens)."""
+        with self._lock:
+            return [tuple(self.tokens[tid]) for tid in sorted(self.tokens)]
+
+    def load(self, rows: List[tuple], last_block: Optional[int], reorg_state: Optional[Dict[str, Any]] = None) -> None:
+        """Warm start from persisted rows + checkpoint; the next sync() only catches up."""
+        with self._lock:
+            self.tokens = {int(data[0]): list(data) for data in rows}
+            self.last_block = last_block
+            self.dirty.clear()
+            self.events.clear()
+            self.removed.clear()
+            reorg_state = reorg_state or {}
+            self.final_block = reorg_state.get("final_block", last_block)
+            self.pending = {int(tid): block for tid, block in reorg_state.get("pending", {}).items()}
+            self.block_hashes = {int(b): h for b, h in reorg_state.get("block_hashes", {}).items()}
+            self.journal = [
+                (sb, lb, tid, tuple(prev) if prev is not None else None)
+                for sb, lb, tid, prev in reorg_state.get("journal", [])
+            ]
+
+    def drain_events(self) -> List[tuple]:
+        """Rows minted / claimed / expired / rolled back by logs since the last call, ordered by tokenId."""
+        with self._lock:
+            rows = [tuple(self.tokens[tid]) for tid in sorted(self.events) if tid in self.tokens]
+            self.events.clear()
+            return rows
+
+    def take_changes(self) -> Dict[str, Any]:
+        """
+        Rows changed and tokenIds removed since the last call, with the matching checkpoint and
+        reorg state (one consistent snapshot for the token store); the change sets are cleared.
+        """
+        with self._lock:
+            changes = {
+                "rows": [tuple(self.tokens[tid]) for tid in sorted(self.dirty) if tid in self.tokens],
+                "removed": sorted(self.removed),
+                "last_block": self.last_block,
+                "reorg_state": self.reorg_state(),
+            }
+            self.dirty.clear()
+            self.removed.clear()
+            return changes
+
+    def restore_changes(self, changes: Dict[str, Any]) -> None:
+        """Mark a snapshot from take_changes() as unsaved again (its write failed)."""
+        with self._lock:
+            for row in changes["rows"]:
+                tid = int(row[0])
+                if tid not in self.removed:
+                    self.dirty.add(tid)
+            for tid in changes["removed"]:
+                if tid not in self.tokens:
+                    self.removed.add(tid)
+
+    def reorg_state(self) -> Dict[str, Any]:
+        """JSON-able reorg bookkeeping, persisted next to the checkpoint."""
+        return {
+            "final_block": self.final_block,
+            "block_hashes": {str(b): h for b, h in self.block_hashes.items()},
+            "journal": [[sb, lb, tid, list(prev) if prev is not None else None]
+                        for sb, lb, tid, prev in self.journal],
+            "pending": {str(tid): block for tid, block in self.pending.items()},
+        }
+
+    def sync(self) -> Dict[str, int]:
+        """Bring the table up to the chain head. Returns counts of what was applied."""
+        with self._lock:
+            head = self.w3.eth.block_number
+            if self.last_block is None:
+                boot = self._bootstrap(head)
+                stats = self._catch_up(head)
+                stats["minted"] += boot["minted"]
+                return stats
+            rolled_back = self._check_reorg()
+            stats = self._catch_up(head)
+            stats["rolled_back"] = rolled_back
+            return stats
+
+    # ------------------- INTERNALS -------------------
+    def _block_hash(self, number: int) -> Optional[str]:
+        try:
+            return encode_hex(self.w3.eth.get_block(number)["hash"])
+        except BlockNotFound:
+            return None  # canonical chain got shorter than `number`
+
+    def _set(self, tid: int, row: list, state_block: int, log_block: int) -> None:
+        """Replace one row, journaling the previous version while it is still reorg-able."""
+        prev = self.tokens.get(tid)
+        self.journal.append((state_block, log_block, tid, tuple(prev) if prev is not None else None))
+        self.tokens[tid] = row
+        self.dirty.add(tid)
+        self.removed.discard(tid)
+        self.events.add(tid)
+
+    @staticmethod
+    def _updated(row: list, ev) -> list:
+        """`row` after one TokenClaimed / TokenExpired event."""
+        row = list(row)
+        if ev["event"] == "TokenClaimed":
+            row[IS_CLAIMED] = True
+            row[CLAIM_TIME] = int(ev["args"]["claimedTime"])
+        else:
+            row[IS_EXPIRED] = True
+        return row
+
+    def _bootstrap(self, head: int) -> Dict[str, int]:
+        # read a block that is already `confirmations` deep, so the bootstrap is final
+        base = max(0, head - self.confirmations)
+        token_ids = self.contract.functions.getAllTokens().call(block_identifier=base)
+        for data in self.fetch_many(token_ids, base):
+            self.tokens[int(data[0])] = list(data)
+            self.dirty.add(int(data[0]))
+        # rows that failed to fetch are retried with the first catch-up window
+        self.pending = {int(tid): base for tid in token_ids if int(tid) not in self.tokens}
+        self.last_block = self.final_block = base
+        self.block_hashes = {base: self._block_hash(base)}
+        self.journal = []
+        logging.info(f"[Sync] Bootstrapped {len(self.tokens)} tokens at block {base}"
+                     + (f", {len(self.pending)} pending" if self.pending else ""))
+        return {"minted": len(self.tokens), "claimed": 0, "expired": 0, "logs": 0, "to_block": base}
+
+    def _check_reorg(self) -> int:
+        """Roll back if the checkpoint block is no longer canonical. Returns rows rolled back."""
+        stored = self.block_hashes.get(self.last_block)
+        if stored is None or self._block_hash(self.last_block) == stored:
+            return 0
+
+        fork = self.final_block
+        for number in sorted(self.block_hashes, reverse=True):
+            if number >= self.last_block or number <= self.final_block:
+                continue
+            if self._block_hash(number) == self.block_hashes[number]:
+                fork = number
+                break
+        return self._rollback(fork)
+
+    def _rollback(self, fork: int) -> int:
+        undone = [e for e in self.journal if e[0] > fork]
+        self.journal = [e for e in self.journal if e[0] <= fork]
+
+        # mints above the fork are seen again when the canonical logs are re-applied from there
+        self.pending = {tid: block for tid, block in self.pending.items() if block <= fork}
+        resume = fork
+        for state_block, log_block, tid, prev in reversed(undone):
+            if prev is None:
+                self.tokens.pop(tid, None)
+                self.dirty.discard(tid)
+                self.removed.add(tid)
+                self.events.discard(tid)
+                if log_block <= fork:
+                    # its TokenMinted log is still canonical, only the row read after it is not
+                    self.pending[tid] = log_block
+            else:
+                self.tokens[tid] = list(prev)
+                self.dirty.add(tid)
+                self.removed.discard(tid)
+                self.events.add(tid)
+
+        self.block_hashes = {b: h for b, h in self.block_hashes.items() if b <= resume}
+        if resume not in self.block_hashes:
+            self.block_hashes[resume] = self._block_hash(resume)
+        logging.warning(f"[Sync] Reorg detected at block {self.last_block}: canonical up to {fork}, "
+                        f"rolled back {len({e[2] for e in undone})} tokens, re-applying from block {resume + 1}")
+        self.last_block = resume
+        return len({e[2] for e in undone})
+
+    def _prune(self) -> None:
+        """Forget journal entries and hashes that are now `confirmations` deep (final)."""
+        final = self.last_block - self.confirmations
+        if final <= self.final_block:
+            return
+        self.final_block = final
+        self.journal = [e for e in self.journal if e[0] > final]
+        self.block_hashes = {b: h for b, h in self.block_hashes.items() if b >= final}
+
+    def _get_logs(self, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        return self.w3.eth.get_logs({
+            "address": self.contract.address,
+            "fromBlock": from_block,
+            "toBlock": to_block,
+            "topics": [list(self._events)],
+        })
+
+    def _catch_up(self, head: int) -> Dict[str, int]:
+        stats = {"minted": 0, "claimed": 0, "expired": 0, "logs": 0, "to_block": self.last_block}
+        if self.pending and self.last_block >= head:
+            self._fetch_minted({}, self.last_block, stats)  # no new window to retry them with
+        step = self.block_range
+        start = self.last_block + 1
+        while start <= head:
+            end = min(head, start + step - 1)
+            try:
+                # hash first: a reorg between these two calls then shows up on the next sync
+                end_hash = self._block_hash(end)
+                logs = self._get_logs(start, end)
+            except Exception as e:
+                if step > 1:
+                    # providers cap range/result size; retry the same window in smaller pieces
+                    step = max(1, step // 2)
+                    logging.warning(f"[Sync] eth_getLogs {start}-{end} failed ({e}); retrying with range {step}")
+                    continue
+                logging.error(f"[Sync] eth_getLogs {start}-{end} failed ({e}); stopping at block {self.last_block}")
+                break
+
+            self._apply(logs, end, stats)
+            self.last_block = end
+            self.block_hashes[end] = end_hash
+            stats["to_block"] = end
+            start = end + 1
+
+        self._prune()
+        stats["pending"] = len(self.pending)
+        if stats["logs"]:
+            logging.info(f"[Sync] Applied {stats['logs']} logs up to block {self.last_block}: "
+                         f"{stats['minted']} minted, {stats['claimed']} claimed, {stats['expired']} expired")
+        return stats
+
+    def _apply(self, logs: List[Dict[str, Any]], to_block: int, stats: Dict[str, int]) -> None:
+        minted: Dict[int, int] = {}  # tokenId -> block of its TokenMinted log
+        later: Dict[int, List[Tuple[int, Any]]] = {}  # tokenId minted here -> its (block, claim/expiry event)
+        for log in logs:
+            event = self._events.get(encode_hex(log["topics"][0]))
+            if event is None:
+                continue
+            ev = event.process_log(log)
+            tid = int(ev["args"]["tokenId"])
+            block = int(log["blockNumber"])
+            self.block_hashes[block] = encode_hex(log["blockHash"])
+            stats["logs"] += 1
+
+            if ev["event"] == "TokenMinted":
+                minted[tid] = block
+            elif tid in minted:
+                # minted in this same window: the row fetched below already reflects it
+                later.setdefault(tid, []).append((block, ev))
+            elif tid not in self.tokens:
+                continue
+            elif ev["event"] == "TokenClaimed":
+                self._set(tid, self._updated(self.tokens[tid], ev), block, block)
+                stats["claimed"] += 1
+            elif ev["event"] == "TokenExpired":
+                self._set(tid, self._updated(self.tokens[tid], ev), block, block)
+                stats["expired"] += 1
+
+        self._fetch_minted(minted, to_block, stats, later)
+
+    def _fetch_minted(self, minted: Dict[int, int], to_block: int, stats: Dict[str, int],
+                      later: Optional[Dict[int, List[Tuple[int, Any]]]] = None) -> None:
+        """Fetch new rows, plus earlier pending ones, as of `to_block`; rows that fail stay pending."""
+        wanted = {**self.pending, **minted}
+        if not wanted:
+            return
+        later = later or {}
+        # read new rows at the end of the window so later claims/expiries in it are included
+        for data in self.fetch_many(list(wanted), to_block):
+            tid = int(data[0])
+            block = wanted.pop(tid)
+            if tid not in self.tokens:
+                stats["minted"] += 1  # rows actually stored, each once
+            if tid not in minted:
+                # pending from an earlier window: the row is only known as of to_block
+                self._set(tid, list(data), to_block, block)
+                continue
+            # journal the mint and each claim/expiry at the block of its own log, so a reorg
+            # undoes only what happened above the fork
+            row = list(data)
+            row[CLAIM_TIME], row[IS_CLAIMED], row[IS_EXPIRED] = 0, False, False  # as minted
+            self._set(tid, row, block, block)
+            for log_block, ev in later.get(tid, ()):
+                row = self._updated(row, ev)
+                self._set(tid, row, log_block, log_block)
+            self.tokens[tid] = list(data)
+        if wanted:
+            logging.warning(f"[Sync] Could not fetch {len(wanted)} minted tokens up to block {to_block}; "
+                            f"retrying on the next sync")
+        self.pending = wanted
@@ -0,0 +1,124 @@
+# =========================================================================================
+# windows.py  —  Sliding time windows over a sorted (key, time) index
+#
+# 🎯 Why
+#  The only temporal rules were the calendar-day spike and the calendar-month duplicate,
+#  both bucketed: 3 tokens at 23:50, 00:05 and 00:20 fall into two days / possibly two
+#  months and are never seen together. Velocity fraud ("N tokens for one Aadhaar within any
+#  24h", an issuer or a location suddenly issuing far above its own rate) needs windows that
+#  slide over every token, per key.
+#
+#  TimeIndex sorts the tokens once by (key, time) — O(n log n) — and packs both into one
+#  int64; it is shared by every window over that key. window_peaks() then finds every window
+#  boundary with a single vectorized searchsorted over the whole table (O(n log n) total, no
+#  per-key Python loop):
+#    - count[j]  = tokens of j's key in (t_j - window, t_j]   (the window ending at token j)
+#    - a window qualifies when count >= min_count (and, with `factor`, when it is more than
+#      factor x the key's own average per window over its time span)
+#    - every token inside a qualifying window is flagged with the largest qualifying count
+#      covering it (a range max over the sorted order, by doubling: O(n log window) with
+#      O(n) memory)
+#  Results only depend on the rows of the same key, so a subset holding whole key groups
+#  gives the same values for its rows (incremental_rules.py re-computes touched keys only).
+# =========================================================================================
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+def key_codes(col: pd.Series) -> np.ndarray:
+    """Integer code per row for the window key (-1 = missing, never windowed)."""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return col.cat.codes.to_numpy().astype(np.int64)
+    return pd.factorize(col)[0].astype(np.int64)
+
+
+def epoch_seconds(col: pd.Series) -> np.ndarray:
+    """datetime column -> int64 epoch seconds (NaT -> int64 min)."""
+    return col.to_numpy(dtype="datetime64[s]").astype(np.int64)
+
+
+class TimeIndex:
+    """Rows sorted by (key, time), packed into one int64 per row; built once, shared by every window size."""
+
+    def __init__(self, keys: np.ndarray, times: np.ndarray):
+        self.n = len(keys)
+        self.rows = np.flatnonzero((keys >= 0) & (times != np.iinfo(np.int64).min))  # windowed rows
+        k, t = keys[self.rows], times[self.rows]
+        order = np.lexsort((t, k))
+        self.rows, k, t = self.rows[order], k[order], t[order]
+        self.times = t - t.min() if len(t) else t
+        span = int(self.times.max()) + 1 if len(t) else 1
+        if len(k) and (int(k.max()) + 1) * span >= np.iinfo(np.int64).max:
+            raise ValueError("TimeIndex: key x time range does not fit in int64")
+        self.packed = k * span + self.times
+        # first sorted position of each row's key: window starts are clamped to it
+        new_key = np.r_[True, k[1:] != k[:-1]] if len(k) else np.zeros(0, dtype=bool)
+        self.first = np.flatnonzero(new_key)
+        self.sizes = np.diff(np.r_[self.first, len(k)])
+        self.group_start = np.repeat(self.first, self.sizes)
+
+    @classmethod
+    def from_columns(cls, key: pd.Series, time: pd.Series) -> "TimeIndex":
+        return cls(key_codes(key), epoch_seconds(time))
+
+
+def window_peaks(index: TimeIndex, window: int, min_count: int, factor: Optional[float] = None) -> np.ndarray:
+    """
+    Per row: the largest count of a qualifying window (same key, `window` seconds wide) that
+    contains the row, 0 when none does.
+    """
+    peaks = np.zeros(index.n, dtype=np.int64)
+    if len(index.rows) == 0:
+        return peaks
+    end = np.arange(len(index.packed))
+    start = np.maximum(np.searchsorted(index.packed, index.packed - window + 1, side="left"), index.group_start)
+    count = end - start + 1
+
+    qualifies = count >= min_count
+    if factor is not None:
+        # the key's own average tokens per window over the time it has been active
+        t, first, sizes = index.times, index.first, index.sizes
+        active = np.maximum(t[np.r_[first[1:], len(t)] - 1] - t[first], window)
+        qualifies &= count > factor * np.repeat(sizes * window / active, sizes)
+    if not qualifies.any():
+        return peaks
+
+    # row i lies in the windows ending at j = i .. last(i), last(i) = last j with start[j] <= i
+    values = np.where(qualifies, count, 0)
+    last = np.searchsorted(start, end, side="right") - 1
+    peaks[index.rows] = _range_max(values, end, last)
+    return peaks
+
+
+def _range_max(values: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """max(values[lo[i]..hi[i]]) for every i (lo <= hi), by doubling: two overlapping 2^k blocks per query."""
+    level = np.log2(hi - lo + 1).astype(np.int64)
+    out = np.zeros(len(lo), dtype=values.dtype)
+    block = values.copy()  # block[i] = max(values[i .. i + 2^k - 1]) after step k
+    for k in range(int(level.max()) + 1):
+        if k:
+            half = 1 << (k - 1)
+            block[:-half] = np.maximum(block[:-half], block[half:])
+        q = np.flatnonzero(level == k)
+        if len(q):
+            out[q] = np.maximum(block[lo[q]], block[hi[q] - (1 << k) + 1])
+    return out
+
+
+# ------------------- REFERENCE (per-key loop) -------------------
+def _window_peaks_loop(keys: np.ndarray, times: np.ndarray, window: int, min_count: int,
+                       factor: Optional[float] = None) -> np.ndarray:
+    """The same definition written out per key and per window end; parity reference for window_peaks."""
+    peaks = np.zeros(len(keys), dtype=np.int64)
+    valid = (keys >= 0) & (times != np.iinfo(np.int64).min)
+    for key in np.unique(keys[valid]):
+        rows = np.flatnonzero(valid & (keys == key))
+        t = times[rows]
+        expected = len(rows) * window / max(int(t.max() - t.min()), window)
+        for end in t:
+            inside = rows[(t > end - window) & (t <= end)]
+            if len(inside) >= min_count and (factor is None or len(inside) > factor * expected):
+                peaks[inside] = np.maximum(peaks[inside], len(inside))
+    return peaks